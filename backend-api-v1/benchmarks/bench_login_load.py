@@ -0,0 +1,110 @@
+"""
+Mixed load against a running auth service: a login burst on /users/auth
+while other clients keep calling /users/verify-token.
+
+Reports logins/sec (and how many were shed with 503 by the password pool)
+and the verify-token p50/p99 latency during the burst, which should stay
+flat now that Argon2 runs on its own process pool.
+
+    python benchmarks/bench_login_load.py --url http://localhost:8000/users \
+        [--users 50] [--login-clients 32] [--verify-clients 8] [--duration 30]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+PASSWORD = "bench-password-1234"
+
+
+def post(url: str, body: dict) -> tuple:
+    request = urllib.request.Request(url, data=json.dumps(body).encode(), headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status, payload = response.status, response.read()
+    except urllib.error.HTTPError as e:
+        status, payload = e.code, e.read()
+    return status, payload, (time.perf_counter() - start) * 1000
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000/users")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--login-clients", type=int, default=32)
+    parser.add_argument("--verify-clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    args = parser.parse_args()
+
+    emails = [f"bench-{i}@bench.local" for i in range(args.users)]
+    for email in emails:
+        post(f"{args.url}/add", {"email": email, "password": PASSWORD})
+    status, payload, _ = post(f"{args.url}/auth", {"email": emails[0], "password": PASSWORD})
+    if status != 200:
+        raise SystemExit(f"Login failed ({status}): {payload[:200]}")
+    token = json.loads(payload)["token"]
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    logins = {"ok": 0, "shed": 0, "failed": 0}
+    login_latencies, verify_latencies = [], []
+
+    def login_client(n: int):
+        i = n
+        while not stop.is_set():
+            status, _, elapsed = post(f"{args.url}/auth", {"email": emails[i % len(emails)], "password": PASSWORD})
+            i += 1
+            with lock:
+                if status == 200:
+                    logins["ok"] += 1
+                    login_latencies.append(elapsed)
+                elif status == 503:
+                    logins["shed"] += 1
+                else:
+                    logins["failed"] += 1
+            if status == 503:
+                time.sleep(0.1)
+
+    def verify_client(_):
+        while not stop.is_set():
+            status, _, elapsed = post(f"{args.url}/verify-token", {"token": token})
+            if status == 200:
+                with lock:
+                    verify_latencies.append(elapsed)
+
+    # Baseline verify-token latency without the login burst
+    with ThreadPoolExecutor(args.verify_clients) as pool:
+        for n in range(args.verify_clients):
+            pool.submit(verify_client, n)
+        time.sleep(min(5.0, args.duration / 3))
+        stop.set()
+    baseline = list(verify_latencies)
+    verify_latencies.clear()
+    stop.clear()
+
+    with ThreadPoolExecutor(args.login_clients + args.verify_clients) as pool:
+        for n in range(args.login_clients):
+            pool.submit(login_client, n)
+        for n in range(args.verify_clients):
+            pool.submit(verify_client, n)
+        time.sleep(args.duration)
+        stop.set()
+
+    print(f"logins/sec:          {logins['ok'] / args.duration:8.1f}  (shed 503: {logins['shed']}, failed: {logins['failed']})")
+    print(f"login p50/p99:       {statistics.median(login_latencies) if login_latencies else float('nan'):8.1f} / {percentile(login_latencies, 0.99):8.1f} ms")
+    print(f"verify-token idle:   {statistics.median(baseline) if baseline else float('nan'):8.1f} / {percentile(baseline, 0.99):8.1f} ms (p50/p99)")
+    print(f"verify-token burst:  {statistics.median(verify_latencies) if verify_latencies else float('nan'):8.1f} / {percentile(verify_latencies, 0.99):8.1f} ms (p50/p99)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Token blacklist: Redis memory per million revocations and check latency,
+previous layout (one SETEX key per raw JWT, EXISTS on every check) vs the
+`revoked_tokens` sorted set of sha256 hashes behind a local Bloom filter.
+
+Uses a scratch Redis database (flushed!), so point it at a local instance:
+
+    REDIS_HOST=localhost REDIS_BENCH_DB=15 python benchmarks/bench_token_blacklist.py \
+        [--revocations 1000000] [--checks 100000] [--lifetime 216000]
+"""
+import argparse
+import hashlib
+import os
+import secrets
+import statistics
+import sys
+import time
+
+import redis
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.makedirs(os.path.join(ROOT, "logs"), exist_ok=True)
+os.chdir(ROOT)
+
+from helpers.token_blacklist import RotatingBloomFilter  # noqa: E402
+
+BENCH_DB = int(os.getenv("REDIS_BENCH_DB", 15))
+ZSET_KEY = "revoked_tokens"
+
+
+def fake_jwt() -> str:
+    # Same length as the tokens issued by create_token (header.claims.signature)
+    return f"eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.{secrets.token_urlsafe(120)}.{secrets.token_urlsafe(32)}"
+
+
+def sha(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def used_memory(client: redis.Redis) -> int:
+    return int(client.info("memory")["used_memory"])
+
+
+def fill(client: redis.Redis, tokens, exp: int, mode: str, batch: int = 10000):
+    for i in range(0, len(tokens), batch):
+        pipe = client.pipeline(transaction=False)
+        for token in tokens[i:i + batch]:
+            if mode == "raw":
+                pipe.setex(token, 3600, "true")
+            else:
+                pipe.zadd(ZSET_KEY, {sha(token): exp})
+        pipe.execute()
+
+
+def latency(fn, items) -> tuple:
+    samples = []
+    for item in items:
+        start = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--revocations", type=int, default=1_000_000)
+    parser.add_argument("--checks", type=int, default=100_000)
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    parser.add_argument("--lifetime", type=float, default=216000, help="token lifetime in seconds (k8s: 3600 min)")
+    parser.add_argument("--max-windows", type=int, default=8)
+    args = parser.parse_args()
+
+    client = redis.Redis(host=os.getenv("REDIS_HOST", "localhost"), port=int(os.getenv("REDIS_PORT", 6379)),
+                         db=BENCH_DB, decode_responses=True)
+    revoked = [fake_jwt() for _ in range(args.revocations)]
+    exp = int(time.time()) + 3600
+    per_million = 1_000_000 / args.revocations
+
+    client.flushdb()
+    base = used_memory(client)
+    fill(client, revoked, exp, "raw")
+    raw_bytes = used_memory(client) - base
+
+    client.flushdb()
+    base = used_memory(client)
+    fill(client, revoked, exp, "zset")
+    zset_bytes = used_memory(client) - base
+
+    bloom = RotatingBloomFilter(window_seconds=3600, capacity=args.revocations, error_rate=args.error_rate,
+                                lifetime_seconds=args.lifetime, max_windows=args.max_windows)
+    # Live revocations expire anywhere within the token lifetime
+    now = time.time()
+    for i, token in enumerate(revoked):
+        bloom.add(sha(token), now + args.lifetime * i / len(revoked))
+
+    print(f"Redis memory per 1M revocations: raw JWT keys {raw_bytes * per_million / 2**20:8.1f} MiB, "
+          f"hash sorted set {zset_bytes * per_million / 2**20:8.1f} MiB")
+    print(f"Local Bloom filter ({args.error_rate:.2%} FP, {bloom.windows} windows): "
+          f"{bloom.nbytes * per_million / 2**20:8.1f} MiB per 1M revocations")
+
+    # Checks: almost every token seen in production is not revoked
+    valid = [fake_jwt() for _ in range(args.checks)]
+    false_positives = sum(1 for token in valid if sha(token) in bloom)
+
+    def bloom_check(token):
+        key = sha(token)
+        if key in bloom:
+            client.zscore(ZSET_KEY, key)
+
+    old_p50, old_p99 = latency(lambda token: client.exists(token), valid)
+    neg_p50, neg_p99 = latency(bloom_check, valid)
+    pos_p50, pos_p99 = latency(bloom_check, revoked[:args.checks])
+    print(f"not revoked, EXISTS raw key:        p50 {old_p50:7.1f} us  p99 {old_p99:7.1f} us")
+    print(f"not revoked, Bloom (local):         p50 {neg_p50:7.1f} us  p99 {neg_p99:7.1f} us  "
+          f"({false_positives} false positives went to Redis)")
+    print(f"revoked, Bloom + ZSCORE confirm:    p50 {pos_p50:7.1f} us  p99 {pos_p99:7.1f} us")
+    client.flushdb()
+
+
+if __name__ == "__main__":
+    main()
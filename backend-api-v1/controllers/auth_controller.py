@@ -1,20 +1,24 @@
-from datetime import datetime
-from fastapi import APIRouter,Depends,HTTPException,Security,Request,Response
+from fastapi import APIRouter,Depends,HTTPException,Security,Response
 from fastapi.security import HTTPBearer,HTTPAuthorizationCredentials
 
 from helpers.config import session_factory
 from dal.user_dao import get_all_users,create_user,authenticate
-from dto.users_dto import UserResponse,UserRequest,TokenResponse,TokenRequest
+from dto.users_dto import UserResponse,UserRequest,TokenResponse,TokenRequest,TokenBatchRequest,TokenBatchItem,TokenBatchResponse
 from entities.user import User
-from helpers.utils import create_token,decode_token,hash_pwd
-from helpers.config import logger
-from dal.black_listed_dao import add_token_to_blacklist,is_blacklist_token
+from helpers.utils import create_token,decode_token_cached,hash_pwd,token_cache
+from helpers.config import logger,VERIFY_BATCH_MAX
+from dal.black_listed_dao import add_token_to_blacklist,is_blacklist_token,are_blacklisted_tokens
+from helpers.password_pool import PasswordPoolBusy
 router=APIRouter(prefix="/users",tags=["users"])  
 http_bearer=HTTPBearer()
 
+def _busy():
+    # Password pool saturated: shed the request instead of queueing it
+    return HTTPException(status_code=503,detail="Too many login attempts, retry later",headers={"Retry-After":"1"})
+
 def check_token(token:HTTPAuthorizationCredentials=Security(http_bearer)):
     credentials=token.credentials
-    payload=decode_token(credentials)
+    payload=decode_token_cached(credentials)
     if is_blacklist_token(credentials):
         raise HTTPException(status_code=401,detail='Token is blacklisted')
     if not payload :
@@ -40,9 +44,13 @@ def get_all(session=Depends(session_factory),
     return results
 @router.post("/add",response_model=UserResponse)
 def register_user(userRequest:UserRequest,session=Depends(session_factory)):
+    try:
+        hash_password=hash_pwd(userRequest.password)
+    except PasswordPoolBusy:
+        raise _busy()
     user_entity=User(
         email=userRequest.email,
-        password=hash_pwd(userRequest.password)
+        password=hash_password
     )
     add_ok=create_user(session,user_entity)
     if add_ok :
@@ -65,7 +73,10 @@ def authenticate_user(userRequest:UserRequest,
         email=userRequest.email,
         password=userRequest.password
     )
-    auth_user=authenticate(session,user_entity)
+    try:
+        auth_user=authenticate(session,user_entity)
+    except PasswordPoolBusy:
+        raise _busy()
     if auth_user != False :
         claims:dict={
                 "sub":auth_user.email,
@@ -80,9 +91,8 @@ def authenticate_user(userRequest:UserRequest,
     raise HTTPException(status_code=401,detail="Authentication faild")
 @router.post("/verify-token",response_model=TokenResponse)
 def verify_token(tokenRequest:TokenRequest):
-    print(f"[DEBUG] Verifying token starting with: {tokenRequest.token[:15]}")
-    # 1. Decode and basic validation
-    payload=decode_token(token=tokenRequest.token)
+    # 1. Decode and basic validation (decoded-token cache, bounded by exp)
+    payload=decode_token_cached(tokenRequest.token)
     if not payload :
         raise HTTPException(status_code=404,detail="Invalid token")
         
@@ -93,11 +103,38 @@ def verify_token(tokenRequest:TokenRequest):
         
     return TokenResponse(token=tokenRequest.token,payload=payload)
 
+@router.post("/verify-token/batch",response_model=TokenBatchResponse)
+def verify_token_batch(batchRequest:TokenBatchRequest):
+    """Verifies many tokens at once: results in request order, one Redis round trip."""
+    if len(batchRequest.tokens)>VERIFY_BATCH_MAX:
+        raise HTTPException(status_code=413,detail=f"At most {VERIFY_BATCH_MAX} tokens per batch")
+    results:list[TokenBatchItem]=[]
+    decoded:list[tuple]=[]
+    for index,token in enumerate(batchRequest.tokens):
+        payload=decode_token_cached(token)
+        if not payload:
+            results.append(TokenBatchItem(index=index,valid=False,detail="Invalid token"))
+        else:
+            decoded.append((index,token,payload))
+    if decoded:
+        blacklisted=are_blacklisted_tokens([token for _,token,_ in decoded])
+        for (index,_,payload),revoked in zip(decoded,blacklisted):
+            if revoked:
+                results.append(TokenBatchItem(index=index,valid=False,detail="Token is blacklisted"))
+            else:
+                results.append(TokenBatchItem(index=index,valid=True,payload=payload))
+    results.sort(key=lambda item:item.index)
+    return TokenBatchResponse(results=results)
+
 @router.post("/logout")
-def logout_user(token:HTTPAuthorizationCredentials=Security(http_bearer)):
+def logout_user(token:HTTPAuthorizationCredentials=Security(http_bearer),
+                payload=Depends(check_token)
+                ):
+    # check_token: only a valid, not yet revoked token of this service can be revoked
     credentials=token.credentials
     
     add_ok=add_token_to_blacklist(credentials)
+    token_cache.discard(credentials)
     if add_ok :
         logger.info('user logged out')
         return Response(status_code=200,content="logout successful")
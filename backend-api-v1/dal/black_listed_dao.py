@@ -1,11 +1,59 @@
-from helpers.config import redis_client
+import time
+from helpers.config import redis_client,REVOKED_TOKENS_KEY,REVOKED_TOKENS_CHANNEL,EXPIRE_TIME,logger
+from helpers.token_blacklist import revocation_filter
+from helpers.token_cache import token_hash
 from jose import jwt
 from datetime import datetime, timezone
 
+# Revoked tokens live only in the `revoked_tokens` sorted set (sha256 -> exp),
+# the same set the device/monitoring services mirror. The local Bloom filter
+# answers "not revoked" without Redis; only candidates are confirmed with ZSCORE.
+
+def _is_revoked(score) -> bool:
+    return score is not None and float(score) > time.time()
+
 def is_blacklist_token(token: str):
-    exists = redis_client.exists(token) > 0
-    print(f"[REDIS] Checking token exists: {exists}")
-    return exists
+    key = token_hash(token)
+    if not revocation_filter.might_be_revoked(key):
+        return False
+    return _is_revoked(redis_client.zscore(REVOKED_TOKENS_KEY, key))
+
+def are_blacklisted_tokens(tokens: list[str]) -> list[bool]:
+    keys = [token_hash(token) for token in tokens]
+    candidates = [i for i, key in enumerate(keys) if revocation_filter.might_be_revoked(key)]
+    results = [False] * len(tokens)
+    if candidates:
+        # One round trip for all the Bloom-positive tokens
+        pipe = redis_client.pipeline(transaction=False)
+        for i in candidates:
+            pipe.zscore(REVOKED_TOKENS_KEY, keys[i])
+        for i, score in zip(candidates, pipe.execute()):
+            results[i] = _is_revoked(score)
+    return results
+
+def migrate_legacy_blacklist(page: int = 1000) -> int:
+    """
+    Copies the revocations written by older releases (one SETEX key per raw JWT,
+    so the key starts with the base64 JWT header "eyJ") into the revocation set,
+    with the key's remaining TTL as exp. The old keys are left to expire on their own.
+    Idempotent: every replica runs it at startup, before its filter is built.
+    """
+    tokens = list(redis_client.scan_iter(match="eyJ*", count=page))
+    if not tokens:
+        return 0
+    now = int(time.time())
+    pipe = redis_client.pipeline(transaction=False)
+    for token in tokens:
+        pipe.ttl(token)
+    revoked = {token_hash(token): now + ttl for token, ttl in zip(tokens, pipe.execute()) if ttl > 0}
+    if revoked:
+        pipe = redis_client.pipeline()
+        pipe.zadd(REVOKED_TOKENS_KEY, revoked)
+        for key, exp in revoked.items():
+            # Replicas already running this release pick them up without waiting for a sync
+            pipe.publish(REVOKED_TOKENS_CHANNEL, f"{key}:{exp}")
+        pipe.execute()
+    return len(revoked)
 
 def add_token_to_blacklist(token: str):
     try:
@@ -16,20 +64,29 @@ def add_token_to_blacklist(token: str):
         exp = payload.get("exp")
         
         if exp:
-            # Calculate remaining seconds for TTL
+            # Calculate remaining seconds for TTL, never beyond the lifetime of
+            # the tokens this service issues
             current_time = int(datetime.now(timezone.utc).timestamp())
-            ttl = int(exp) - current_time
+            exp = min(int(exp), current_time + int(EXPIRE_TIME) * 60)
+            ttl = exp - current_time
             
             if ttl > 0:
-                # Store in redis with the remaining TTL
-                redis_client.setex(token, ttl, "true")
-                print(f"[REDIS] Token blacklisted for {ttl} seconds")
+                # Add the token hash to the revocation set and publish it to the
+                # Bloom filters of the auth replicas and the device/monitoring mirrors
+                key = token_hash(token)
+                pipe = redis_client.pipeline()
+                pipe.zadd(REVOKED_TOKENS_KEY, {key: int(exp)})
+                pipe.zremrangebyscore(REVOKED_TOKENS_KEY, "-inf", current_time)
+                pipe.publish(REVOKED_TOKENS_CHANNEL, f"{key}:{int(exp)}")
+                pipe.execute()
+                revocation_filter.add(key, int(exp))
+                logger.info(f"Token blacklisted for {ttl} seconds")
                 return True
             else:
-                print(f"[REDIS] Token already expired, no need to blacklist (TTL: {ttl})")
+                logger.info(f"Token already expired, no need to blacklist (TTL: {ttl})")
                 return True # Consider it processed
-        print(f"[REDIS] Token has no exp claim")
+        logger.warning("Token has no exp claim")
         return False
     except Exception as e:
-        print(f"[REDIS] Error blacklisting token: {e}")
+        logger.error(f"Error blacklisting token: {e}")
         return False
@@ -1,7 +1,7 @@
-from typing import Optional
 from entities.user import User
 from sqlalchemy.orm import Session
 from helpers.utils import verify_pwd
+from helpers.password_pool import PasswordPoolBusy
 
 def create_user(session:Session,user:User):
     # Fix: correct filter syntax
@@ -26,10 +26,20 @@ def authenticate(session:Session,user:User):
     # Use verify_pwd to check the hashed password
     if filtred_user:
         try:
-            if verify_pwd(filtred_user.password, user.password):
-                return filtred_user
+            valid,new_hash=verify_pwd(filtred_user.password, user.password)
+        except PasswordPoolBusy:
+            # Saturated or broken pool (PasswordPoolUnavailable): a 503, not a wrong password
+            raise
         except Exception:
             # Handle potential verification errors (e.g., malformed hash)
             return False
+        if not valid:
+            return False
+        if new_hash:
+            # Stored hash weaker than the current parameters: upgrade it
+            filtred_user.password=new_hash
+            session.commit()
+            session.refresh(filtred_user)
+        return filtred_user
             
     return False
\ No newline at end of file
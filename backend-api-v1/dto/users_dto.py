@@ -1,5 +1,5 @@
 from pydantic import BaseModel,EmailStr,Field
-from datetime import datetime
+from typing import Optional
 
 class UserRequest(BaseModel):
     email:EmailStr
@@ -14,4 +14,13 @@ class TokenResponse(BaseModel):
     token:str
     payload:dict
 class TokenRequest(BaseModel):
-    token:str
\ No newline at end of file
+    token:str
+class TokenBatchRequest(BaseModel):
+    tokens:list[str]=Field(min_length=1)
+class TokenBatchItem(BaseModel):
+    index:int
+    valid:bool
+    payload:Optional[dict]=None
+    detail:Optional[str]=None
+class TokenBatchResponse(BaseModel):
+    results:list[TokenBatchItem]
@@ -18,7 +18,41 @@ URL_DB:Final[str]='postgresql+psycopg2://'+USER_DB+':'+PASSWORD_DB+'@'+SERVER_DB
 # Redis configuration
 REDIS_HOST:Final[str] = os.getenv('REDIS_HOST', 'localhost')
 REDIS_PORT:Final[int] = int(os.getenv('REDIS_PORT', 6379))
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+REDIS_MAX_CONNECTIONS:Final[int] = int(os.getenv('REDIS_MAX_CONNECTIONS', 50))
+# Bounded, shared connection pool: request threads wait for a free connection
+# instead of opening new ones under load
+redis_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST, port=REDIS_PORT, decode_responses=True,
+    max_connections=REDIS_MAX_CONNECTIONS, timeout=2, socket_timeout=2, socket_keepalive=True
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+# Revocation set mirrored by the other services for local token verification
+REVOKED_TOKENS_KEY:Final[str] = os.getenv('REVOKED_TOKENS_KEY', 'revoked_tokens')
+REVOKED_TOKENS_CHANNEL:Final[str] = os.getenv('REVOKED_TOKENS_CHANNEL', 'revoked_tokens')
+
+# Decoded-token cache of /users/verify-token (entries expire with the token)
+VERIFY_CACHE_SIZE:Final[int] = int(os.getenv('VERIFY_CACHE_SIZE', 50000))
+# Max tokens per /users/verify-token/batch call
+VERIFY_BATCH_MAX:Final[int] = int(os.getenv('VERIFY_BATCH_MAX', 500))
+
+# Argon2 parameters (OWASP: m=19 MiB, t=2, p=1); only hashes weaker than these are upgraded on login
+ARGON2_TIME_COST:Final[int] = int(os.getenv('ARGON2_TIME_COST', 2))
+ARGON2_MEMORY_COST:Final[int] = int(os.getenv('ARGON2_MEMORY_COST', 19456))  # KiB
+ARGON2_PARALLELISM:Final[int] = int(os.getenv('ARGON2_PARALLELISM', 1))
+# Password hashing process pool and admission control
+PASSWORD_POOL_WORKERS:Final[int] = int(os.getenv('PASSWORD_POOL_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_POOL_MAX_PENDING:Final[int] = int(os.getenv('PASSWORD_POOL_MAX_PENDING', 4 * PASSWORD_POOL_WORKERS))
+PASSWORD_POOL_ADMISSION_TIMEOUT:Final[float] = float(os.getenv('PASSWORD_POOL_ADMISSION_TIMEOUT', 0.5))
+
+# Local Bloom filter in front of the revocation set (one filter per expiry window).
+# Capacity and error rate are totals over all the live windows; the window is
+# widened so a token lifetime (EXPIRE_TIME) spans at most MAX_WINDOWS filters
+BLACKLIST_BLOOM_WINDOW:Final[float] = float(os.getenv('BLACKLIST_BLOOM_WINDOW', 3600))
+BLACKLIST_BLOOM_MAX_WINDOWS:Final[int] = int(os.getenv('BLACKLIST_BLOOM_MAX_WINDOWS', 8))
+BLACKLIST_BLOOM_CAPACITY:Final[int] = int(os.getenv('BLACKLIST_BLOOM_CAPACITY', 1000000))
+BLACKLIST_BLOOM_ERROR_RATE:Final[float] = float(os.getenv('BLACKLIST_BLOOM_ERROR_RATE', 0.001))
+BLACKLIST_SYNC_INTERVAL:Final[float] = float(os.getenv('BLACKLIST_SYNC_INTERVAL', 300))
+BLACKLIST_MAX_STALENESS:Final[float] = float(os.getenv('BLACKLIST_MAX_STALENESS', 600))
 
 #sqlalchemy
 engine=create_engine(URL_DB,pool_size=10)
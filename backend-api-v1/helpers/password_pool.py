@@ -0,0 +1,152 @@
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+from argon2 import PasswordHasher, extract_parameters
+from argon2.exceptions import InvalidHashError, VerificationError
+from prometheus_client import Counter, Gauge
+
+# Kept free of helpers.config imports: the worker processes are spawned and
+# only need argon2.
+
+PASSWORD_POOL_PENDING = Gauge("password_pool_pending", "Password hash/verify jobs admitted and not finished")
+PASSWORD_POOL_REJECTED = Counter("password_pool_rejected_total", "Password jobs rejected by admission control")
+PASSWORD_POOL_RESTARTS = Counter("password_pool_restarts_total", "Process pools replaced after a worker died")
+
+_hasher: Optional[PasswordHasher] = None
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the pool already has `max_pending` jobs: the caller answers 503."""
+
+
+class PasswordPoolUnavailable(PasswordPoolBusy):
+    """Raised when the pool broke again after being replaced: also a 503, never a credential failure."""
+
+
+def _init_worker(time_cost: int, memory_cost: int, parallelism: int):
+    global _hasher
+    _hasher = PasswordHasher(time_cost=time_cost, memory_cost=memory_cost, parallelism=parallelism)
+
+
+def _hash(password: str) -> str:
+    return _hasher.hash(password)
+
+
+def _is_weaker(hash_password: str) -> bool:
+    """
+    True when the stored hash is cheaper to attack than the configured parameters.
+    check_needs_rehash() is true on any difference, which would downgrade the
+    hashes made with higher costs (the previous m=64 MiB, t=3, p=4 defaults).
+    Parallelism is not compared: it changes the hash, not its strength.
+    """
+    stored = extract_parameters(hash_password)
+    return (
+        stored.type != _hasher.type
+        or stored.memory_cost < _hasher.memory_cost
+        or stored.time_cost < _hasher.time_cost
+        or stored.hash_len < _hasher.hash_len
+        or stored.salt_len < _hasher.salt_len
+    )
+
+
+def _verify(hash_password: str, password: str) -> Tuple[bool, Optional[str]]:
+    """(valid, new hash when the stored one is weaker than the configured parameters)."""
+    try:
+        _hasher.verify(hash_password, password)
+    except (VerificationError, InvalidHashError):
+        return False, None
+    if _is_weaker(hash_password):
+        return True, _hasher.hash(password)
+    return True, None
+
+
+class PasswordPool:
+    """
+    Argon2 on a dedicated, size-limited process pool.
+
+    Hashing never runs on the request threads, and at most `max_pending` jobs
+    are admitted (running + queued): above that, callers get PasswordPoolBusy
+    after `admission_timeout` instead of piling up. A login burst therefore
+    holds at most `max_pending` request threads, leaving the rest of the
+    threadpool to /users/verify-token.
+
+    A worker that dies (e.g. OOM-killed) breaks the whole ProcessPoolExecutor:
+    the broken pool is replaced and the job retried once.
+    """
+
+    def __init__(self, workers: int, max_pending: int, admission_timeout: float, time_cost: int, memory_cost: int, parallelism: int):
+        self._workers = workers
+        self._admission = threading.BoundedSemaphore(max_pending)
+        self._admission_timeout = admission_timeout
+        self._params = (time_cost, memory_cost, parallelism)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=self._params,
+                )
+
+    def stop(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
+    def _replace(self, broken: ProcessPoolExecutor):
+        """Drops `broken` unless another thread already replaced it; start() builds the new pool."""
+        with self._lock:
+            if self._executor is not broken:
+                return
+            self._executor = None
+        PASSWORD_POOL_RESTARTS.inc()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args) -> Tuple[ProcessPoolExecutor, Future]:
+        if not self._admission.acquire(timeout=self._admission_timeout):
+            PASSWORD_POOL_REJECTED.inc()
+            raise PasswordPoolBusy()
+        executor = None
+        try:
+            self.start()
+            executor = self._executor
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._admission.release()
+            self._replace(executor)
+            raise
+        except Exception:
+            self._admission.release()
+            raise
+        PASSWORD_POOL_PENDING.inc()
+
+        def _done(_):
+            PASSWORD_POOL_PENDING.dec()
+            self._admission.release()
+        future.add_done_callback(_done)
+        return executor, future
+
+    def _run(self, fn, *args):
+        for _ in range(2):
+            try:
+                executor, future = self._submit(fn, *args)
+            except BrokenProcessPool:
+                continue
+            try:
+                return future.result()
+            except BrokenProcessPool:
+                self._replace(executor)
+        raise PasswordPoolUnavailable()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password)
+
+    def verify(self, hash_password: str, password: str) -> Tuple[bool, Optional[str]]:
+        return self._run(_verify, hash_password, password)
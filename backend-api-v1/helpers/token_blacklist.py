@@ -0,0 +1,225 @@
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+import redis
+from prometheus_client import Counter
+from helpers.config import (
+    redis_client, REVOKED_TOKENS_KEY, REVOKED_TOKENS_CHANNEL, EXPIRE_TIME, BLACKLIST_BLOOM_WINDOW,
+    BLACKLIST_BLOOM_MAX_WINDOWS, BLACKLIST_BLOOM_CAPACITY, BLACKLIST_BLOOM_ERROR_RATE, BLACKLIST_SYNC_INTERVAL, BLACKLIST_MAX_STALENESS, logger
+)
+
+BLOOM_CHECKS = Counter("token_blacklist_checks_total", "Blacklist checks by outcome", ["result"])
+
+
+class BloomFilter:
+    """Plain Bloom filter over token hashes (hex sha256, already uniformly distributed)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> Iterable[int]:
+        # Double hashing on two 64-bit halves of the sha256
+        h1, h2 = int(key[:16], 16), int(key[16:32], 16) | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+
+class RotatingBloomFilter:
+    """
+    One Bloom filter per expiry window: a revoked token goes into the filter of
+    the window containing its `exp`, and a whole filter is dropped once its
+    window has passed (every token in it is expired anyway), so the filters
+    never fill up with dead entries.
+
+    Live revocations expire within `lifetime_seconds` (the token lifetime), so
+    they spread over at most `windows` filters: the window is widened to keep
+    that count under `max_windows`, and `capacity` / `error_rate` are split
+    between the windows so the whole filter keeps the configured totals.
+    """
+
+    def __init__(self, window_seconds: float, capacity: int, error_rate: float,
+                 lifetime_seconds: float, max_windows: int):
+        self._lifetime = lifetime_seconds
+        self._window = max(window_seconds, lifetime_seconds / max(1, max_windows - 1))
+        self.windows = math.ceil(lifetime_seconds / self._window) + 1
+        self._capacity = max(1, math.ceil(capacity / self.windows))
+        self._error_rate = error_rate / self.windows
+        self._filters: Dict[int, BloomFilter] = {}
+
+    def add(self, key: str, exp: float):
+        """
+        No token issued by this service outlives now + lifetime: a later `exp`
+        (forged or unverified claims, from Redis or pub/sub) is clamped so it cannot
+        open windows beyond the bound; an `exp` already past needs no entry.
+        """
+        now = time.time()
+        if exp <= now:
+            return
+        generation = int(min(exp, now + self._lifetime) // self._window)
+        bloom = self._filters.get(generation)
+        if bloom is None:
+            bloom = self._filters[generation] = BloomFilter(self._capacity, self._error_rate)
+        bloom.add(key)
+
+    def rotate(self, now: float):
+        for generation in [g for g in self._filters if (g + 1) * self._window <= now]:
+            del self._filters[generation]
+
+    def __contains__(self, key: str) -> bool:
+        return any(key in bloom for bloom in self._filters.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(bloom.nbytes for bloom in self._filters.values())
+
+
+class RevocationFilter:
+    """
+    Local negative cache of the revocation set (`revoked_tokens` sorted set,
+    hash -> exp), kept current from the `revoked_tokens` pub/sub channel and
+    rebuilt from Redis every `sync_interval` seconds.
+
+    might_be_revoked() answers False without leaving the process for almost
+    every token; a True is only a candidate to confirm in Redis. While the
+    filter is stale (Redis unreachable), every token is a candidate.
+    """
+
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        revoked_key: str,
+        revoked_channel: str,
+        window_seconds: float,
+        capacity: int,
+        error_rate: float,
+        lifetime_seconds: float,
+        max_windows: int,
+        sync_interval: float,
+        max_staleness: float,
+    ):
+        self._redis = redis_client
+        self._revoked_key = revoked_key
+        self._revoked_channel = revoked_channel
+        self._params = (window_seconds, capacity, error_rate, lifetime_seconds, max_windows)
+        self._sync_interval = sync_interval
+        self._max_staleness = max_staleness
+        self._bloom = RotatingBloomFilter(*self._params)
+        self._lock = threading.Lock()
+        self._last_sync: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-blacklist-bloom", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def is_fresh(self) -> bool:
+        return self._last_sync is not None and time.monotonic() - self._last_sync <= self._max_staleness
+
+    def might_be_revoked(self, key: str) -> bool:
+        if not self.is_fresh():
+            BLOOM_CHECKS.labels(result="stale").inc()
+            return True
+        with self._lock:
+            candidate = key in self._bloom
+        BLOOM_CHECKS.labels(result="candidate" if candidate else "negative").inc()
+        return candidate
+
+    def add(self, key: str, exp: float):
+        with self._lock:
+            self._bloom.add(key, exp)
+
+    def _entries(self, now: float, page: int = 10000) -> Iterable[Tuple[str, float]]:
+        offset = 0
+        while True:
+            entries = self._redis.zrangebyscore(self._revoked_key, now, "+inf", start=offset, num=page, withscores=True)
+            yield from entries
+            if len(entries) < page:
+                return
+            offset += page
+
+    def _sync(self):
+        now = time.time()
+        bloom = RotatingBloomFilter(*self._params)
+        count = 0
+        for key, exp in self._entries(now):
+            bloom.add(key, exp)
+            count += 1
+        with self._lock:
+            self._bloom = bloom
+        self._last_sync = time.monotonic()
+        return count
+
+    def _run(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._revoked_channel)
+                # Subscribe first, then rebuild: revocations published meanwhile
+                # are queued and applied to the new filter right after
+                count = self._sync()
+                logger.info(f"Token blacklist Bloom filter rebuilt ({count} tokens)")
+                next_sync = time.monotonic() + self._sync_interval
+
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        key, _, exp = message["data"].partition(":")
+                        # exp is clamped by the filter; malformed entries are ignored
+                        if len(key) == 64 and exp:
+                            self.add(key, float(exp))
+                    if time.monotonic() >= next_sync:
+                        self._sync()
+                        next_sync = time.monotonic() + self._sync_interval
+                    else:
+                        with self._lock:
+                            self._bloom.rotate(time.time())
+            except Exception as e:
+                logger.error(f"Token blacklist sync error, retrying in 5s: {e}")
+                self._stop.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+
+
+# Singleton filter, started/stopped by the app lifespan
+revocation_filter = RevocationFilter(
+    redis_client,
+    REVOKED_TOKENS_KEY,
+    REVOKED_TOKENS_CHANNEL,
+    window_seconds=BLACKLIST_BLOOM_WINDOW,
+    capacity=BLACKLIST_BLOOM_CAPACITY,
+    error_rate=BLACKLIST_BLOOM_ERROR_RATE,
+    lifetime_seconds=int(EXPIRE_TIME) * 60,
+    max_windows=BLACKLIST_BLOOM_MAX_WINDOWS,
+    sync_interval=BLACKLIST_SYNC_INTERVAL,
+    max_staleness=BLACKLIST_MAX_STALENESS,
+)
@@ -0,0 +1,55 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from prometheus_client import Counter
+
+TOKEN_CACHE_HITS = Counter("verify_token_cache_hits_total", "Token verifications served from the decoded-token cache")
+TOKEN_CACHE_MISSES = Counter("verify_token_cache_misses_total", "Token verifications that decoded the JWT")
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    """
+    LRU of decoded, signature-checked JWT payloads keyed by token hash.
+    An entry never outlives the token's `exp`, so a hit is always a token
+    that is still valid cryptographically; revocation is checked separately.
+    """
+
+    def __init__(self, max_size: int):
+        self._max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_hash(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                exp, payload = entry
+                if exp > time.time():
+                    self._entries.move_to_end(key)
+                    TOKEN_CACHE_HITS.inc()
+                    return payload
+                del self._entries[key]
+        TOKEN_CACHE_MISSES.inc()
+        return None
+
+    def put(self, token: str, payload: dict):
+        exp = payload.get("exp")
+        if not exp:
+            return
+        key = token_hash(token)
+        with self._lock:
+            self._entries[key] = (float(exp), payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._entries.pop(token_hash(token), None)
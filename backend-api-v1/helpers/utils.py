@@ -1,14 +1,28 @@
-from argon2 import PasswordHasher
-
+from typing import Optional,Tuple
 from jose import jwt,JWTError
 from datetime import datetime,timedelta,timezone
-from helpers.config import EXPIRE_TIME,SECRET_KEY
-pwd_hash=PasswordHasher()
+from helpers.config import (EXPIRE_TIME,SECRET_KEY,VERIFY_CACHE_SIZE,ARGON2_TIME_COST,ARGON2_MEMORY_COST,ARGON2_PARALLELISM,
+                            PASSWORD_POOL_WORKERS,PASSWORD_POOL_MAX_PENDING,PASSWORD_POOL_ADMISSION_TIMEOUT)
+from helpers.password_pool import PasswordPool
+from helpers.token_cache import TokenCache
+
+# Singleton pool, started/stopped by the app lifespan
+password_pool=PasswordPool(
+    workers=PASSWORD_POOL_WORKERS,
+    max_pending=PASSWORD_POOL_MAX_PENDING,
+    admission_timeout=PASSWORD_POOL_ADMISSION_TIMEOUT,
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM
+)
+
+token_cache=TokenCache(VERIFY_CACHE_SIZE)
 
 def hash_pwd(password:str):
-    return pwd_hash.hash(password)
-def verify_pwd(hash_password:str,password:str):
-    return pwd_hash.verify(hash_password,password)
+    return password_pool.hash(password)
+def verify_pwd(hash_password:str,password:str)->Tuple[bool,Optional[str]]:
+    """(valid, new hash if the stored one must be upgraded to the current parameters)"""
+    return password_pool.verify(hash_password,password)
 
 def create_token(data:dict):
     payload=data.copy()
@@ -22,14 +36,23 @@ def decode_token(token:str):
         payload:dict=jwt.decode(token,SECRET_KEY,algorithms=['HS256'])
         if payload :return payload
     except JWTError as e :
-        print("Faild token decoding")
         return False
+
+def decode_token_cached(token:str):
+    """decode_token behind the decoded-token cache (skips the HMAC + claims checks on a hit)."""
+    payload=token_cache.get(token)
+    if payload is None:
+        payload=decode_token(token)
+        if payload:
+            token_cache.put(token,payload)
+    return payload
     
    
 if __name__ =='__main__':
     hash=hash_pwd('1234')
     print(hash)
     print(verify_pwd(hash,'1234'))
+    password_pool.stop()
     token=create_token({"sub":'m.lahmer@esisa.ac.ma'})+'1'
     print(decode_token(token))
     
@@ -1,13 +1,32 @@
 import uvicorn
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from controllers.auth_controller import router
-from helpers.config import Base,engine
+from helpers.config import Base,engine,logger
+from helpers.utils import password_pool
+from helpers.token_blacklist import revocation_filter
+from dal.black_listed_dao import migrate_legacy_blacklist
 from prometheus_fastapi_instrumentator import Instrumentator
 
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    # Argon2 worker processes (spawned on first use), shut down with the app
+    password_pool.start()
+    # Revocations of older releases must be in the revocation set before the filter is built
+    try:
+        logger.info(f"Legacy blacklist keys migrated: {migrate_legacy_blacklist()}")
+    except Exception as e:
+        logger.error(f"Legacy blacklist migration failed: {e}")
+    revocation_filter.start()
+    yield
+    revocation_filter.stop()
+    password_pool.stop()
+
 app=FastAPI(
 title="Authentication app",
-description="Micro service signing app "
+description="Micro service signing app ",
+lifespan=lifespan
 )
 
 Instrumentator().instrument(app).expose(app)
@@ -0,0 +1,107 @@
+"""
+Load test of the device read path: sync DAO on Starlette's threadpool
+(previous `def` routes) vs async DAO on the event loop (`async def` routes).
+
+Each simulated request runs what GET /devices/{id} + /my-devices?limit=50 run:
+a primary-key lookup and one keyset page. The sync path goes through
+anyio.to_thread.run_sync with the default 40-token limiter, exactly like a
+sync FastAPI route; the async path awaits the asyncpg engine directly.
+
+Seeds a throwaway table in a local Postgres, then reports p50/p99 per
+concurrency level.
+
+    USER_DB=admin PASSWORD_DB=1234 SERVER_DB=localhost NAME_DB=db_devices_bench \\
+        python benchmarks/bench_async_db.py [--devices 20000] [--owners 200] \\
+        [--requests 2000] [--concurrency 10,40,100,200] [--no-seed]
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import anyio
+import anyio.to_thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.config import NAME_DB, Base, LocalSession, AsyncLocalSession, engine, async_engine  # noqa: E402
+from entities.device import Device, DeviceCategory, DeviceStatus, IoTType  # noqa: E402
+from dal import device_dao, async_device_dao  # noqa: E402
+
+def seed(devices: int, owners: int):
+    if not NAME_DB.endswith("_bench"):
+        sys.exit(f"Refusing to seed {NAME_DB}: point NAME_DB at a *_bench database")
+    Base.metadata.create_all(bind=engine, tables=[Device.__table__])
+    with LocalSession() as session:
+        session.query(Device).delete()
+        session.bulk_insert_mappings(Device, [{
+            "name": f"bench-{i}",
+            "category": DeviceCategory.IOT_DEVICE,
+            "type": IoTType.TEMPERATURE,
+            "status": DeviceStatus.ONLINE,
+            "owner_id": i % owners + 1,
+        } for i in range(devices)])
+        session.commit()
+    print(f"Seeded {devices} devices for {owners} owners")
+
+def sync_request(device_id: int, owner_id: int):
+    with LocalSession() as session:
+        device_dao.get_device(session, device_id)
+        device_dao.get_user_devices(session, owner_id, limit=50)
+
+async def async_request(device_id: int, owner_id: int):
+    async with AsyncLocalSession() as session:
+        await async_device_dao.get_device(session, device_id)
+        await async_device_dao.get_user_devices(session, owner_id, limit=50)
+
+async def run(mode: str, ids, owners: int, requests: int, concurrency: int, report: bool = True):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        device_id, owner_id = random.choice(ids), random.randint(1, owners)
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "sync":
+                await anyio.to_thread.run_sync(sync_request, device_id, owner_id)
+            else:
+                await async_request(device_id, owner_id)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    if not report:
+        return
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{mode:>5} c={concurrency:<4} p50={statistics.median(latencies):8.2f}ms p99={p99:8.2f}ms "
+          f"throughput={requests / elapsed:8.0f} req/s")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=20000)
+    parser.add_argument("--owners", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", default="10,40,100,200")
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    if not args.no_seed:
+        seed(args.devices, args.owners)
+    with LocalSession() as session:
+        ids = [row[0] for row in session.query(Device.id).all()]
+
+    for concurrency in (int(c) for c in args.concurrency.split(",")):
+        for mode in ("sync", "async"):
+            # Warm-up so both pools are filled before measuring
+            await run(mode, ids, args.owners, min(200, args.requests), concurrency, report=False)
+            await run(mode, ids, args.owners, args.requests, concurrency)
+
+    await async_engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,166 @@
+"""
+EXPLAIN ANALYZE of every device DAO query, before and after the index
+migration (migrations/versions/0002_device_query_indexes.py).
+
+Seeds a throwaway Postgres database at migration 0001 with `--devices` rows,
+records planning/execution time and the plan of each query, upgrades to head
+and records them again. Write queries run in a rolled-back transaction.
+
+    NAME_DB=db_devices_bench SERVER_DB=localhost \\
+        python benchmarks/bench_device_queries.py [--devices 1000000] [--owners 10000] \\
+        [--online-ratio 0.2] [--runs 5] [--output explain_report.json] [--no-seed]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+from datetime import datetime, timedelta
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import delete, insert, select, text, update
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.config import NAME_DB, engine  # noqa: E402
+from entities.device import Device, DeviceCategory, DeviceStatus, IoTType  # noqa: E402
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+SEED_DAYS = 365
+
+
+def alembic_config() -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    return config
+
+
+def seed(devices: int, owners: int, online_ratio: float):
+    config = alembic_config()
+    command.downgrade(config, "base")
+    command.upgrade(config, "0001")
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO t_devices (name, category, type, status, owner_id, created_at, last_seen, updated_at)
+            SELECT
+                'bench-' || g,
+                (CASE WHEN g % 5 = 0 THEN 'END_DEVICE' ELSE 'IOT_DEVICE' END)::devicecategory,
+                (ARRAY['TEMPERATURE','HUMIDITY','LIGHT','PRESSURE','SERVER','WORKSTATION','GATEWAY','OTHER'])[1 + g % 8]::iottype,
+                (CASE WHEN random() < :online THEN 'ONLINE'
+                      WHEN random() < 0.5 THEN 'OFFLINE' ELSE 'MAINTENANCE' END)::devicestatus,
+                1 + (random() * (:owners - 1))::int,
+                now() - random() * make_interval(days => :days),
+                now(), now()
+            FROM generate_series(1, :devices) AS g
+        """), {"devices": devices, "owners": owners, "online": online_ratio, "days": SEED_DAYS})
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM ANALYZE t_devices"))
+    print(f"Seeded {devices} devices for {owners} owners ({online_ratio:.0%} online)")
+
+
+def dao_queries(owners: int, max_id: int):
+    """The statements issued by dal/device_dao.py and dal/async_device_dao.py."""
+    owner_id = random.randint(1, owners)
+    device_id = random.randint(1, max_id)
+    some_ids = random.sample(range(1, max_id + 1), 500)
+    end = datetime.utcnow()
+    start = end - timedelta(days=30)
+    by_owner = select(Device).where(Device.owner_id == owner_id)
+    return {
+        "get_device": (select(Device).where(Device.id == device_id), False),
+        "get_user_devices (page)": (by_owner.order_by(Device.id).limit(50), False),
+        "get_user_devices (cursor)": (by_owner.where(Device.id > device_id // 2).order_by(Device.id).limit(50), False),
+        "iter_devices (owner)": (by_owner.order_by(Device.id), False),
+        "get_all_devices (cursor)": (select(Device).where(Device.id > device_id).order_by(Device.id).limit(50), False),
+        "get_devices_by_date": (by_owner.where(Device.created_at >= start, Device.created_at <= end), False),
+        "get_online_devices (reload)": (select(Device).where(Device.status == DeviceStatus.ONLINE), False),
+        "get_online_devices (500 ids)": (select(Device).where(Device.status == DeviceStatus.ONLINE, Device.id.in_(some_ids)), False),
+        "update_status": (update(Device).where(Device.id == device_id).values(status=DeviceStatus.OFFLINE).returning(Device.id), True),
+        "update_statuses (500 ids)": (
+            update(Device).where(Device.id.in_(some_ids), Device.owner_id == owner_id)
+            .values(status=DeviceStatus.MAINTENANCE).returning(Device.id), True
+        ),
+        "delete_device": (delete(Device).where(Device.id == device_id), True),
+        "create_devices (1000 rows)": (insert(Device).values([{
+            "name": f"bench-new-{i}", "category": DeviceCategory.IOT_DEVICE, "type": IoTType.TEMPERATURE,
+            "status": DeviceStatus.ONLINE, "owner_id": owner_id
+        } for i in range(1000)]).returning(Device.id), True),
+    }
+
+
+def _indexes(plan: dict) -> list:
+    found = [plan["Index Name"]] if "Index Name" in plan else []
+    for child in plan.get("Plans", []):
+        found.extend(_indexes(child))
+    return found
+
+
+def explain(statement) -> dict:
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    with engine.connect() as conn:
+        result = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar()
+        conn.rollback()
+    report = result[0] if isinstance(result, list) else json.loads(result)[0]
+    return {
+        "planning_ms": report["Planning Time"],
+        "execution_ms": report["Execution Time"],
+        "node": report["Plan"]["Node Type"],
+        "indexes": sorted(set(_indexes(report["Plan"]))),
+    }
+
+
+def run_phase(label: str, owners: int, runs: int) -> dict:
+    with engine.connect() as conn:
+        max_id = conn.execute(text("SELECT max(id) FROM t_devices")).scalar()
+    samples = {}
+    for _ in range(runs):
+        for name, (statement, _) in dao_queries(owners, max_id).items():
+            samples.setdefault(name, []).append(explain(statement))
+
+    results = {}
+    print(f"\n== {label} ==")
+    print(f"{'query':<30} {'exec p50 ms':>12} {'plan ms':>8}  plan")
+    for name, runs_of_query in samples.items():
+        execution = statistics.median(r["execution_ms"] for r in runs_of_query)
+        planning = statistics.median(r["planning_ms"] for r in runs_of_query)
+        last = runs_of_query[-1]
+        results[name] = {"execution_ms_p50": execution, "planning_ms_p50": planning, "node": last["node"], "indexes": last["indexes"]}
+        print(f"{name:<30} {execution:12.2f} {planning:8.2f}  {last['node']} {', '.join(last['indexes'])}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--devices", type=int, default=1_000_000)
+    parser.add_argument("--owners", type=int, default=10_000)
+    parser.add_argument("--online-ratio", type=float, default=0.2)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="explain_report.json")
+    parser.add_argument("--no-seed", action="store_true")
+    args = parser.parse_args()
+
+    if not NAME_DB.endswith("_bench"):
+        sys.exit(f"Refusing to run against {NAME_DB}: point NAME_DB at a *_bench database")
+
+    config = alembic_config()
+    if not args.no_seed:
+        seed(args.devices, args.owners, args.online_ratio)
+    else:
+        command.downgrade(config, "0001")
+
+    report = {"devices": args.devices, "owners": args.owners, "online_ratio": args.online_ratio}
+    report["before"] = run_phase("migration 0001 (id, owner_id indexes)", args.owners, args.runs)
+    command.upgrade(config, "head")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE t_devices"))
+    report["after"] = run_phase("head (composite + partial indexes)", args.owners, args.runs)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,148 +1,273 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from helpers.config import session_factory, logger
+from pydantic import ValidationError
+from helpers.config import session_factory, async_session_factory, AsyncLocalSession, DEVICE_BULK_MAX_ITEMS, logger
 from helpers.auth_helper import get_current_user
-from helpers.rabbitmq_helper import publish_device_event
-from dto.device_dto import DeviceCreate, DeviceResponse, DeviceUpdate
-from dal import device_dao
-from entities.device import DeviceCategory, DeviceStatus
-from typing import List, Any
+from helpers.device_cache import device_cache
+from dto.device_dto import DeviceCreate, DeviceResponse, DeviceUpdate, DeviceStatusItem, BulkItemResult, BulkResult
+from dal import async_device_dao, outbox_dao
+from entities.device import DeviceStatus
+from typing import AsyncIterator, Dict, List, Any, Optional
 from datetime import datetime
 
 router = APIRouter(prefix="/devices", tags=["devices"])
 
 @router.post("/add", response_model=DeviceResponse)
-def create_new_device(
+async def create_new_device(
     device_in: DeviceCreate,
-    session: Session = Depends(session_factory),
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
     user_id = user["user_id"]
     try:
-        new_device = device_dao.create_device(session, device_in, owner_id=user_id)
-        
-        # RabbitMQ Topic Specification:
-        # For IoT: device/iot/temperature, device/iot/humidity, etc.
-        # For End: device/end/system
-        if device_in.category == DeviceCategory.IOT_DEVICE:
-            routing_key = f"device/iot/{device_in.type.value}"
-        else:
-            routing_key = "device/end/system"
-            
-        publish_device_event(routing_key, {
-            "action": "create",
-            "device_id": new_device.id,
-            "name": new_device.name,
-            "type": new_device.type.value,
-            "owner_id": user_id
-        })
-        
-        return new_device
+        # The "create" event is written to the outbox in the same transaction
+        device = DeviceResponse.model_validate(await async_device_dao.create_device(session, device_in, owner_id=user_id))
+        await device_cache.put(device)
+        return device
     except Exception as e:
         logger.error(f"Error creating device: {str(e)}")
         raise HTTPException(status_code=400, detail="Could not create device")
 
+def _validate_items(items: List[Any], model):
+    """Validates each item on its own so one bad entry does not reject the batch."""
+    if len(items) > DEVICE_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {DEVICE_BULK_MAX_ITEMS} items per request")
+    valid, invalid = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, model.model_validate(item)))
+        except ValidationError as e:
+            error = e.errors()[0]
+            invalid.append(BulkItemResult(
+                index=index, status="invalid",
+                error=f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}"
+            ))
+    return valid, invalid
+
+def _bulk_result(results: List[BulkItemResult]) -> BulkResult:
+    results.sort(key=lambda result: result.index)
+    succeeded = sum(1 for result in results if result.status in ("created", "updated"))
+    return BulkResult(succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+@router.post("/bulk", response_model=BulkResult)
+async def create_devices_bulk(
+    items: List[Any] = Body(...),
+    session: AsyncSession = Depends(async_session_factory),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Provisions a list of devices (DeviceCreate) in one transaction.
+    Invalid items are reported per index and skipped; the valid ones are
+    inserted together with their "create" events.
+    """
+    valid, results = _validate_items(items, DeviceCreate)
+    if valid:
+        try:
+            db_devices = await async_device_dao.create_devices(session, [device_in for _, device_in in valid], owner_id=user["user_id"])
+        except Exception as e:
+            logger.error(f"Error creating devices in bulk: {str(e)}")
+            raise HTTPException(status_code=400, detail="Could not create devices")
+        results.extend(
+            BulkItemResult(index=index, status="created", device_id=db_device.id)
+            for (index, _), db_device in zip(valid, db_devices)
+        )
+    logger.info(f"Bulk provisioning: {len(valid)} devices created, {len(items) - len(valid)} invalid")
+    return _bulk_result(results)
+
+@router.put("/bulk/status", response_model=BulkResult)
+async def update_status_bulk(
+    items: List[Any] = Body(...),
+    session: AsyncSession = Depends(async_session_factory),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Changes the status of a list of devices ({"device_id", "status"} items).
+    Devices that do not exist or belong to another user are reported as not_found.
+    """
+    valid, results = _validate_items(items, DeviceStatusItem)
+    # The last item wins if a device is listed twice
+    updates: Dict[int, DeviceStatus] = {item.device_id: item.status for _, item in valid}
+    updated = set()
+    if updates:
+        owner_id = None if user["is_admin"] else user["user_id"]
+        try:
+            updated = set(await async_device_dao.update_statuses(session, updates, owner_id))
+        except Exception as e:
+            logger.error(f"Error updating device statuses in bulk: {str(e)}")
+            raise HTTPException(status_code=400, detail="Could not update devices")
+        await device_cache.invalidate_many(list(updated))
+    results.extend(
+        BulkItemResult(index=index, status="updated" if item.device_id in updated else "not_found", device_id=item.device_id)
+        for index, item in valid
+    )
+    return _bulk_result(results)
+
+async def _stream_devices(owner_id: Optional[int], after_id: Optional[int], chunk_size: int = 500) -> AsyncIterator[str]:
+    """
+    NDJSON export read through a server-side cursor. Uses its own session since
+    the response body is produced after the request dependencies are closed.
+    """
+    async with AsyncLocalSession() as session:
+        chunk = []
+        async for device in async_device_dao.iter_devices(session, owner_id=owner_id, after_id=after_id, batch_size=chunk_size):
+            chunk.append(DeviceResponse.model_validate(device).model_dump_json())
+            if len(chunk) >= chunk_size:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+
+def _set_next_cursor(response: Response, devices: List[Any], limit: Optional[int]):
+    if limit is not None and len(devices) == limit:
+        response.headers["X-Next-Cursor"] = str(devices[-1].id)
+
 @router.get("/my-devices", response_model=List[DeviceResponse])
-def list_my_devices(
-    session: Session = Depends(session_factory),
+async def list_my_devices(
+    response: Response,
+    limit: Optional[int] = Query(None, gt=0),
+    cursor: Optional[int] = None,
+    stream: bool = False,
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
-    return device_dao.get_user_devices(session, owner_id=user["user_id"])
+    """
+    Pagination: `limit` + `cursor` (X-Next-Cursor of the previous page).
+    stream=true returns NDJSON.
+    """
+    if stream:
+        return StreamingResponse(_stream_devices(user["user_id"], cursor), media_type="application/x-ndjson")
+    devices = await async_device_dao.get_user_devices(session, owner_id=user["user_id"], after_id=cursor, limit=limit)
+    _set_next_cursor(response, devices, limit)
+    return devices
 
 @router.get("/admin/all", response_model=List[DeviceResponse])
-def list_all_devices(
-    session: Session = Depends(session_factory),
+async def list_all_devices(
+    response: Response,
+    limit: Optional[int] = Query(None, gt=0),
+    cursor: Optional[int] = None,
+    stream: bool = False,
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
+    """
+    Pagination: `limit` + `cursor` (X-Next-Cursor of the previous page).
+    stream=true returns NDJSON in constant memory (full export).
+    """
     # Only Admin can see everything
     if not user["is_admin"]:
         raise HTTPException(status_code=403, detail="Forbidden: Admin access required")
-    return device_dao.get_all_devices(session)
+    if stream:
+        return StreamingResponse(_stream_devices(None, cursor), media_type="application/x-ndjson")
+    devices = await async_device_dao.get_all_devices(session, after_id=cursor, limit=limit)
+    _set_next_cursor(response, devices, limit)
+    return devices
+
+@router.post("/admin/outbox/replay")
+def replay_device_events(
+    since: str,
+    session: Session = Depends(session_factory),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Re-publishes (in order) every device event created since `since` (ISO date)
+    that is still in the outbox retention window. Rare admin operation: stays
+    on the sync outbox DAO shared with the relay.
+    """
+    if not user["is_admin"]:
+        raise HTTPException(status_code=403, detail="Forbidden: Admin access required")
+    try:
+        since_dt = datetime.fromisoformat(since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format. Use ISO format (YYYY-MM-DD)")
+    count = outbox_dao.replay_since(session, since_dt)
+    logger.info(f"Outbox replay requested since {since}: {count} events")
+    return {"message": "Replay scheduled", "events": count}
+
+async def _owned_device(device_id: int, user: dict, session: AsyncSession) -> DeviceResponse:
+    """Ownership check served from the device cache (read-through on a miss)."""
+    device = await device_cache.get(device_id)
+    if device is None:
+        generation = await device_cache.generation(device_id)
+        db_device = await async_device_dao.get_device(session, device_id)
+        if db_device is not None:
+            device = DeviceResponse.model_validate(db_device)
+            await device_cache.fill(device, generation)
+    if not device or (device.owner_id != user["user_id"] and not user["is_admin"]):
+        raise HTTPException(status_code=404, detail="Device not found")
+    return device
 
 @router.put("/{device_id}/status")
-def update_status(
+async def update_status(
     device_id: int,
     status: DeviceStatus,
-    session: Session = Depends(session_factory),
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
-    db_device = device_dao.get_device(session, device_id)
-    if not db_device or (db_device.owner_id != user["user_id"] and not user["is_admin"]):
+    await _owned_device(device_id, user, session)
+
+    # Status change + outbox event in one transaction
+    db_device = await async_device_dao.update_status(session, device_id, status)
+    if db_device is None:
+        await device_cache.invalidate(device_id)
         raise HTTPException(status_code=404, detail="Device not found")
-        
-    updated_device = device_dao.update_status(session, device_id, status)
-        
-    # RabbitMQ: Notification de changement de statut
-    publish_device_event(f"device/status/{device_id}", {
-        "device_id": device_id,
-        "new_status": status,
-        "action": "status_update"
-    })
-    
+    await device_cache.put(DeviceResponse.model_validate(db_device))
+
     return {"message": "Status updated"}
+
 @router.get("/{device_id}", response_model=DeviceResponse)
-def get_device(
+async def get_device(
     device_id: int,
-    session: Session = Depends(session_factory),
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
-    device = device_dao.get_device(session, device_id)
-    if not device or (device.owner_id != user["user_id"] and not user["is_admin"]):
-        raise HTTPException(status_code=404, detail="Device not found")
-    return device
+    return await _owned_device(device_id, user, session)
 
 @router.put("/{device_id}", response_model=DeviceResponse)
-def update_device(
+async def update_device(
     device_id: int,
     device_update: DeviceUpdate,
-    session: Session = Depends(session_factory),
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
-    db_device = device_dao.get_device(session, device_id)
-    if not db_device or (db_device.owner_id != user["user_id"] and not user["is_admin"]):
+    await _owned_device(device_id, user, session)
+
+    # Property changes + outbox event in one transaction
+    db_device = await async_device_dao.update_device(session, device_id, device_update)
+    if db_device is None:
+        await device_cache.invalidate(device_id)
         raise HTTPException(status_code=404, detail="Device not found")
-        
-    updated = device_dao.update_device(session, db_device, device_update)
-    
-    # Notify RabbitMQ/MQTT of property changes
-    publish_device_event(f"device/update/{device_id}", {
-        "device_id": device_id,
-        "action": "update",
-        "changes": device_update.model_dump(exclude_unset=True)
-    })
-    
-    return updated
+    device = DeviceResponse.model_validate(db_device)
+    await device_cache.put(device)
+    return device
 
 @router.delete("/{device_id}")
-def delete_device(
+async def delete_device(
     device_id: int,
-    session: Session = Depends(session_factory),
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
-    db_device = device_dao.get_device(session, device_id)
-    if not db_device or (db_device.owner_id != user["user_id"] and not user["is_admin"]):
+    await _owned_device(device_id, user, session)
+
+    # Deletion + outbox event in one transaction
+    deleted = await async_device_dao.delete_device(session, device_id)
+    await device_cache.invalidate(device_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Device not found")
-        
-    device_dao.delete_device(session, device_id)
-    
-    # Notify deletion
-    publish_device_event(f"device/delete/{device_id}", {
-        "device_id": device_id,
-        "action": "delete"
-    })
-    
+
     return {"message": "Device deleted successfully"}
 
 @router.get("/filter/by-date", response_model=List[DeviceResponse])
-def filter_devices_by_date(
+async def filter_devices_by_date(
     start: str,
     end: str,
-    session: Session = Depends(session_factory),
+    session: AsyncSession = Depends(async_session_factory),
     user: dict = Depends(get_current_user)
 ):
     try:
         start_dt = datetime.fromisoformat(start)
         end_dt = datetime.fromisoformat(end)
-        return device_dao.get_devices_by_date(session, user["user_id"], start_dt, end_dt)
+        return await async_device_dao.get_devices_by_date(session, user["user_id"], start_dt, end_dt)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid date format. Use ISO format (YYYY-MM-DD)")
@@ -0,0 +1,169 @@
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from entities.device import Device, DeviceStatus
+from dto.device_dto import DeviceCreate, DeviceUpdate
+from dal import outbox_dao
+from helpers.device_events import created_event, status_event, update_event, delete_event
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from datetime import datetime
+
+# Async (asyncpg) counterpart of device_dao used by the API routes.
+# device_dao stays the sync DAO of the background threads (relay, simulator).
+
+async def create_device(session: AsyncSession, device_in: DeviceCreate, owner_id: int) -> Device:
+    db_device = Device(
+        name=device_in.name,
+        category=device_in.category,
+        type=device_in.type,
+        status=device_in.status,
+        configuration=device_in.configuration,
+        owner_id=owner_id
+    )
+    session.add(db_device)
+    try:
+        # Flush to get the id, then stage the event in the same transaction
+        await session.flush()
+        outbox_dao.add_event(session, created_event(db_device))
+        await session.commit()
+        await session.refresh(db_device)
+        return db_device
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+async def create_devices(session: AsyncSession, devices_in: List[DeviceCreate], owner_id: int) -> List[Device]:
+    """
+    Bulk provisioning in one transaction: a multi-row INSERT ... RETURNING
+    (batched by SQLAlchemy's insertmanyvalues), rows returned in input order,
+    and all "create" events staged together.
+    """
+    rows = [{
+        "name": device_in.name,
+        "category": device_in.category,
+        "type": device_in.type,
+        "status": device_in.status,
+        "configuration": device_in.configuration,
+        "owner_id": owner_id
+    } for device_in in devices_in]
+    try:
+        result = await session.scalars(insert(Device).returning(Device, sort_by_parameter_order=True), rows)
+        db_devices = list(result)
+        outbox_dao.add_events(session, [created_event(device) for device in db_devices])
+        await session.commit()
+        return db_devices
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+async def update_statuses(session: AsyncSession, updates: Dict[int, DeviceStatus], owner_id: Optional[int]) -> List[int]:
+    """
+    Bulk status change: one UPDATE per target status (at most 3 statements).
+    owner_id restricts the rows to that owner (None for admins).
+    Returns the ids actually updated.
+    """
+    by_status: Dict[DeviceStatus, List[int]] = {}
+    for device_id, status in updates.items():
+        by_status.setdefault(status, []).append(device_id)
+
+    updated: List[Tuple[int, DeviceStatus]] = []
+    try:
+        for status, device_ids in by_status.items():
+            query = update(Device).where(Device.id.in_(device_ids))
+            if owner_id is not None:
+                query = query.where(Device.owner_id == owner_id)
+            result = await session.scalars(
+                query.values(status=status).returning(Device.id),
+                execution_options={"synchronize_session": False}
+            )
+            updated.extend((device_id, status) for device_id in result)
+        outbox_dao.add_events(session, [status_event(device_id, status) for device_id, status in updated])
+        await session.commit()
+        return [device_id for device_id, _ in updated]
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+async def get_device(session: AsyncSession, device_id: int) -> Optional[Device]:
+    return await session.get(Device, device_id)
+
+def _page(query, after_id: Optional[int], limit: Optional[int]):
+    """Keyset pagination on the primary key: rows with id > after_id, in id order."""
+    query = query.order_by(Device.id)
+    if after_id is not None:
+        query = query.where(Device.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+async def get_user_devices(session: AsyncSession, owner_id: int, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Device]:
+    result = await session.scalars(_page(select(Device).where(Device.owner_id == owner_id), after_id, limit))
+    return list(result)
+
+async def get_all_devices(session: AsyncSession, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Device]:
+    result = await session.scalars(_page(select(Device), after_id, limit))
+    return list(result)
+
+async def _update_returning(session: AsyncSession, device_id: int, values: dict) -> Optional[Device]:
+    """Single UPDATE ... RETURNING: no prior SELECT of the row."""
+    result = await session.scalars(
+        update(Device).where(Device.id == device_id).values(**values).returning(Device),
+        execution_options={"synchronize_session": False, "populate_existing": True}
+    )
+    return result.first()
+
+async def update_device(session: AsyncSession, device_id: int, device_update: DeviceUpdate) -> Optional[Device]:
+    """Returns the updated device, or None if it does not exist."""
+    update_data = device_update.model_dump(exclude_unset=True)
+    if not update_data:
+        return await get_device(session, device_id)
+
+    try:
+        db_device = await _update_returning(session, device_id, update_data)
+        if db_device is None:
+            await session.rollback()
+            return None
+        outbox_dao.add_event(session, update_event(device_id, device_update.model_dump(mode="json", exclude_unset=True)))
+        await session.commit()
+        return db_device
+    except Exception as e:
+        await session.rollback()
+        raise e
+
+async def delete_device(session: AsyncSession, device_id: int) -> bool:
+    result = await session.execute(delete(Device).where(Device.id == device_id))
+    if result.rowcount == 0:
+        await session.rollback()
+        return False
+    outbox_dao.add_event(session, delete_event(device_id))
+    await session.commit()
+    return True
+
+async def update_status(session: AsyncSession, device_id: int, status: DeviceStatus) -> Optional[Device]:
+    db_device = await _update_returning(session, device_id, {"status": status})
+    if db_device is None:
+        await session.rollback()
+        return None
+    outbox_dao.add_event(session, status_event(device_id, status))
+    await session.commit()
+    return db_device
+
+async def get_devices_by_date(session: AsyncSession, owner_id: int, start_date: datetime, end_date: datetime) -> List[Device]:
+    result = await session.scalars(select(Device).where(
+        Device.owner_id == owner_id,
+        Device.created_at >= start_date,
+        Device.created_at <= end_date
+    ))
+    return list(result)
+
+async def iter_devices(session: AsyncSession, owner_id: Optional[int] = None, after_id: Optional[int] = None, batch_size: int = 1000) -> AsyncIterator[Device]:
+    """
+    Streams devices in id order through a server-side cursor,
+    so only `batch_size` rows are held in memory at a time.
+    """
+    query = select(Device)
+    if owner_id is not None:
+        query = query.where(Device.owner_id == owner_id)
+    query = _page(query, after_id, None).execution_options(yield_per=batch_size)
+    result = await session.stream_scalars(query)
+    async for device in result:
+        yield device
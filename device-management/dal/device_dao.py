@@ -1,63 +1,25 @@
 from sqlalchemy.orm import Session
 from entities.device import Device, DeviceStatus
-from dto.device_dto import DeviceCreate, DeviceUpdate
-from typing import List, Optional
+from typing import Iterator, List, Optional
 from datetime import datetime
 
-def create_device(session: Session, device_in: DeviceCreate, owner_id: int) -> Device:
-    db_device = Device(
-        name=device_in.name,
-        category=device_in.category,
-        type=device_in.type,
-        status=device_in.status,
-        configuration=device_in.configuration,
-        owner_id=owner_id
-    )
-    session.add(db_device)
-    try:
-        session.commit()
-        session.refresh(db_device)
-        return db_device
-    except Exception as e:
-        session.rollback()
-        raise e
+# Sync reads for the background threads (simulator registry) and benchmarks.
+# The API routes use dal/async_device_dao.
 
 def get_device(session: Session, device_id: int) -> Optional[Device]:
     return session.query(Device).filter(Device.id == device_id).first()
 
-def get_user_devices(session: Session, owner_id: int) -> List[Device]:
-    return session.query(Device).filter(Device.owner_id == owner_id).all()
+def _page(query, after_id: Optional[int], limit: Optional[int]):
+    """Keyset pagination on the primary key: rows with id > after_id, in id order."""
+    query = query.order_by(Device.id)
+    if after_id is not None:
+        query = query.filter(Device.id > after_id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
 
-def update_device(session: Session, db_device: Device, device_update: DeviceUpdate) -> Device:
-    update_data = device_update.model_dump(exclude_unset=True)
-    
-    for field in update_data:
-        setattr(db_device, field, update_data[field])
-    
-    try:
-        session.commit()
-        session.refresh(db_device)
-        return db_device
-    except Exception as e:
-        session.rollback()
-        raise e
-
-def delete_device(session: Session, device_id: int) -> bool:
-    db_device = get_device(session, device_id)
-    if db_device:
-        session.delete(db_device)
-        session.commit()
-        return True
-    return False
-
-def update_status(session: Session, device_id: int, status: DeviceStatus) -> Optional[Device]:
-    db_device = get_device(session, device_id)
-    if db_device:
-        db_device.status = status
-        session.commit()
-        session.refresh(db_device)
-        return db_device
-    return None
+def get_user_devices(session: Session, owner_id: int, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Device]:
+    return _page(session.query(Device).filter(Device.owner_id == owner_id), after_id, limit).all()
 
 def get_devices_by_date(session: Session, owner_id: int, start_date: datetime, end_date: datetime) -> List[Device]:
     return session.query(Device).filter(
@@ -66,5 +28,21 @@ def get_devices_by_date(session: Session, owner_id: int, start_date: datetime, e
         Device.created_at <= end_date
     ).all()
 
-def get_all_devices(session: Session) -> List[Device]:
-    return session.query(Device).all()
+def get_online_devices(session: Session, device_ids: Optional[List[int]] = None) -> List[Device]:
+    query = session.query(Device).filter(Device.status == DeviceStatus.ONLINE)
+    if device_ids is not None:
+        query = query.filter(Device.id.in_(device_ids))
+    return query.all()
+
+def get_all_devices(session: Session, after_id: Optional[int] = None, limit: Optional[int] = None) -> List[Device]:
+    return _page(session.query(Device), after_id, limit).all()
+
+def iter_devices(session: Session, owner_id: Optional[int] = None, after_id: Optional[int] = None, batch_size: int = 1000) -> Iterator[Device]:
+    """
+    Streams devices in id order through a server-side cursor (yield_per),
+    so only `batch_size` rows are held in memory at a time.
+    """
+    query = session.query(Device)
+    if owner_id is not None:
+        query = query.filter(Device.owner_id == owner_id)
+    return iter(_page(query, after_id, None).yield_per(batch_size))
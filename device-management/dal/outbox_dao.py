@@ -0,0 +1,75 @@
+from sqlalchemy import text, func
+from sqlalchemy.orm import Session
+from entities.outbox import OutboxEvent
+from typing import List, Tuple
+from datetime import datetime, timedelta
+
+def add_event(session: Session, event: Tuple[str, dict]):
+    """
+    Stages an event in the caller's transaction (no commit):
+    it is only visible to the relay if the device change commits.
+    """
+    topic, payload = event
+    session.add(OutboxEvent(topic=topic, payload=payload))
+
+def add_events(session: Session, events: List[Tuple[str, dict]]):
+    """Stages a batch of events in the caller's transaction, flushed as multi-row inserts."""
+    session.add_all([OutboxEvent(topic=topic, payload=payload) for topic, payload in events])
+
+def try_lock_relay(session: Session, lock_key: int) -> bool:
+    """
+    Transaction-scoped advisory lock so a single replica relays at a time
+    and events leave in id order.
+    """
+    return bool(session.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": lock_key}).scalar())
+
+def get_pending_events(session: Session, limit: int) -> List[OutboxEvent]:
+    return session.query(OutboxEvent).filter(
+        OutboxEvent.published_at.is_(None)
+    ).order_by(OutboxEvent.id).limit(limit).all()
+
+def get_last_event_id(session: Session) -> int:
+    return session.query(func.coalesce(func.max(OutboxEvent.id), 0)).scalar()
+
+def get_events_after(session: Session, last_id: int, limit: int, settle_seconds: float = 5) -> List[OutboxEvent]:
+    """
+    Events with id > last_id, in id order. Events younger than `settle_seconds`
+    are left for the next call so a transaction that took a lower id but commits
+    later is not skipped.
+    """
+    return session.query(OutboxEvent).filter(
+        OutboxEvent.id > last_id,
+        OutboxEvent.created_at <= func.now() - timedelta(seconds=settle_seconds)
+    ).order_by(OutboxEvent.id).limit(limit).all()
+
+def mark_published(session: Session, event_ids: List[int]):
+    session.query(OutboxEvent).filter(OutboxEvent.id.in_(event_ids)).update(
+        {OutboxEvent.published_at: datetime.utcnow(), OutboxEvent.attempts: OutboxEvent.attempts + 1},
+        synchronize_session=False
+    )
+
+def record_failure(session: Session, event_ids: List[int]):
+    session.query(OutboxEvent).filter(OutboxEvent.id.in_(event_ids)).update(
+        {OutboxEvent.attempts: OutboxEvent.attempts + 1},
+        synchronize_session=False
+    )
+
+def count_pending(session: Session) -> int:
+    return session.query(OutboxEvent).filter(OutboxEvent.published_at.is_(None)).count()
+
+def replay_since(session: Session, since: datetime) -> int:
+    """Marks already published events created after `since` as pending again."""
+    count = session.query(OutboxEvent).filter(
+        OutboxEvent.created_at >= since,
+        OutboxEvent.published_at.isnot(None)
+    ).update({OutboxEvent.published_at: None}, synchronize_session=False)
+    session.commit()
+    return count
+
+def purge_published(session: Session, older_than: datetime) -> int:
+    count = session.query(OutboxEvent).filter(
+        OutboxEvent.published_at.isnot(None),
+        OutboxEvent.published_at < older_than
+    ).delete(synchronize_session=False)
+    session.commit()
+    return count
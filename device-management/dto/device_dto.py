@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict, field_validator
-from typing import Optional, Any
+from typing import List, Literal, Optional, Any
 from datetime import datetime
 from entities.device import DeviceCategory, DeviceStatus, IoTType
 
@@ -38,3 +38,18 @@ class DeviceResponse(DeviceBase):
     updated_at: datetime
 
     model_config = ConfigDict(from_attributes=True)
+
+class DeviceStatusItem(BaseModel):
+    device_id: int
+    status: DeviceStatus
+
+class BulkItemResult(BaseModel):
+    index: int
+    status: Literal["created", "updated", "invalid", "not_found"]
+    device_id: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
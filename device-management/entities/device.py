@@ -1,5 +1,5 @@
 import enum
-from sqlalchemy import Column, String, Integer, DateTime, func, Boolean, JSON, Enum
+from sqlalchemy import Column, String, Integer, DateTime, func, Boolean, JSON, Enum, Index
 from helpers.config import Base
 
 class DeviceCategory(enum.Enum):
@@ -24,7 +24,7 @@ class IoTType(enum.Enum):
 class Device(Base):
     __tablename__ = 't_devices'
     
-    id = Column(Integer, primary_key=True, autoincrement=True, nullable=False, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True, nullable=False)
     name = Column(String, nullable=False)
     
     # Category: End Device vs IoT Device
@@ -42,7 +42,17 @@ class Device(Base):
     last_seen = Column(DateTime, server_default=func.now(), onupdate=func.now())
     
     # Owner identifier (Using ID from Auth service)
-    owner_id = Column(Integer, nullable=False, index=True) 
+    owner_id = Column(Integer, nullable=False)
     
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), server_onupdate=func.now())
+
+    # Schema changes go through Alembic (migrations/versions), keep both in sync
+    __table_args__ = (
+        # Owner listings paginated by id
+        Index('ix_devices_owner_id_id', 'owner_id', 'id'),
+        # get_devices_by_date
+        Index('ix_devices_owner_id_created_at', 'owner_id', 'created_at'),
+        # Simulator registry: only ONLINE devices
+        Index('ix_devices_online', 'id', postgresql_where=(status == DeviceStatus.ONLINE)),
+    )
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, func, JSON, Index
+from helpers.config import Base
+
+class OutboxEvent(Base):
+    """
+    Device lifecycle event written in the same transaction as the device change
+    and published to the broker by the outbox relay, in id order.
+    """
+    __tablename__ = 't_device_outbox'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    topic = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
+
+    # NULL until the broker acknowledged the event
+    published_at = Column(DateTime, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Small partial index: the relay only ever scans pending events
+        Index('ix_device_outbox_pending', 'id', postgresql_where=published_at.is_(None)),
+    )
@@ -0,0 +1,76 @@
+"""
+Standalone metrics generator: runs the simulator outside the API process.
+
+    python generator.py                   # one worker, sharding from SIM_SHARDING
+    python generator.py --processes 4     # 4 worker processes sharing the fleet via Redis
+    python generator.py --shard 1/4       # static shard 1 of 4, no Redis coordination
+
+Workers split the device ids on a consistent hash ring, so adding or removing
+a worker (process or pod) only moves ~1/N of the devices.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+from typing import Optional, Tuple
+
+
+def _parse_shard(value: str) -> Tuple[int, int]:
+    index, count = (int(part) for part in value.split("/"))
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard must be i/N with 0 <= i < N")
+    return index, count
+
+
+def run_worker(worker_id: Optional[str], shard: Optional[Tuple[int, int]]):
+    # Imported here so each spawned process builds its own engine and MQTT client
+    from helpers.config import logger
+    from helpers.mqtt_sender import create_simulator
+
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    simulator = create_simulator(worker_id=worker_id, shard=shard)
+    simulator.start()
+    logger.info(f"Metrics generator worker {worker_id or shard} started")
+    stop.wait()
+    simulator.stop()
+    logger.info(f"Metrics generator worker {worker_id or shard} stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded device metrics generator")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes on this host (Redis sharding)")
+    parser.add_argument("--shard", type=_parse_shard, help="static shard i/N, disables Redis sharding")
+    args = parser.parse_args()
+
+    base_id = f"{socket.gethostname()}-{os.getpid()}"
+    if args.shard or args.processes <= 1:
+        run_worker(base_id, args.shard)
+        return
+
+    os.environ["SIM_SHARDING"] = "redis"
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=run_worker, args=(f"{base_id}-{n}", None), name=f"generator-{n}")
+        for n in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def shutdown(*_):
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()  # SIGTERM: each worker leaves the shard group
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for worker in workers:
+        worker.join()
+
+
+if __name__ == "__main__":
+    main()
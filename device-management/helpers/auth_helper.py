@@ -1,37 +1,66 @@
 import requests
 from fastapi import Security, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from helpers.config import AUTH_SERVICE_URL, logger
+from helpers.config import (
+    AUTH_SERVICE_URL, AUTH_MODE, SECRET_KEY, REDIS_HOST, REDIS_PORT,
+    TOKEN_CACHE_SIZE, REVOCATION_SYNC_INTERVAL, REVOCATION_MAX_STALENESS, logger
+)
+from helpers.token_verifier import TokenVerifier
 
 http_bearer = HTTPBearer()
 
-def get_current_user(token: HTTPAuthorizationCredentials = Security(http_bearer)) -> dict:
-    credentials = token.credentials
-    
+# Fail at startup rather than verify tokens against a guessed key
+if AUTH_MODE == "local" and not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY is not set: AUTH_MODE=local needs the auth service signing key")
+
+# Singleton verifier, started/stopped by the app lifespan
+token_verifier = TokenVerifier(
+    SECRET_KEY,
+    REDIS_HOST,
+    REDIS_PORT,
+    cache_size=TOKEN_CACHE_SIZE,
+    sync_interval=REVOCATION_SYNC_INTERVAL,
+    max_staleness=REVOCATION_MAX_STALENESS,
+)
+
+def _to_user(payload: dict) -> dict:
+    user_id = payload.get("user_id")
+    is_admin = payload.get("role", False) # "role" contains is_admin in Auth service
+
+    if user_id is None:
+        user_id = payload.get("sub") # fallback
+
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token response")
+
+    return {"user_id": user_id, "is_admin": is_admin}
+
+def _verify_remote(credentials: str) -> dict:
     try:
         response = requests.post(
-            f"{AUTH_SERVICE_URL}/users/verify-token", 
+            f"{AUTH_SERVICE_URL}/users/verify-token",
             json={"token": credentials},
             timeout=5
         )
-        
-        if response.status_code == 200:
-            data = response.json()
-            payload = data.get("payload", {})
-            
-            user_id = payload.get("user_id")
-            is_admin = payload.get("role", False) # "role" contains is_admin in Auth service
-            
-            if user_id is None:
-                user_id = payload.get("sub") # fallback
-                
-            if user_id is None:
-                raise HTTPException(status_code=401, detail="Invalid token response")
-                
-            return {"user_id": user_id, "is_admin": is_admin}
-        else:
-            raise HTTPException(status_code=401, detail="Unauthorized")
-            
     except Exception as e:
         logger.error(f"Auth error: {str(e)}")
         raise HTTPException(status_code=503, detail="Auth Service Error")
+
+    if response.status_code == 200:
+        return _to_user(response.json().get("payload", {}))
+    raise HTTPException(status_code=401, detail="Unauthorized")
+
+async def get_current_user(token: HTTPAuthorizationCredentials = Security(http_bearer)) -> dict:
+    # Async so the common (local) path never takes a threadpool slot
+    credentials = token.credentials
+
+    # Local verification while the revocation set is in sync,
+    # otherwise fall back to the auth service
+    if AUTH_MODE == "local" and token_verifier.is_fresh():
+        payload = token_verifier.verify(credentials)
+        if payload is None:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        return _to_user(payload)
+
+    return await run_in_threadpool(_verify_remote, credentials)
@@ -1,6 +1,7 @@
 from typing import Final
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 import logging
 import pika
@@ -12,11 +13,64 @@ NAME_DB: Final[str] = os.getenv('NAME_DB', 'db_devices')
 SERVER_DB: Final[str] = os.getenv('SERVER_DB', 'localhost')
 AUTH_SERVICE_URL: Final[str] = os.getenv('AUTH_SERVICE_URL', 'http://auth-ms:8000')
 URL_DB: Final[str] = f'postgresql+psycopg2://{USER_DB}:{PASSWORD_DB}@{SERVER_DB}:5432/{NAME_DB}'
+ASYNC_URL_DB: Final[str] = f'postgresql+asyncpg://{USER_DB}:{PASSWORD_DB}@{SERVER_DB}:5432/{NAME_DB}'
+
+# Connection pools (async engine for the API routes, sync engine for the background threads)
+DB_POOL_SIZE: Final[int] = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW: Final[int] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+DB_POOL_TIMEOUT: Final[float] = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE: Final[int] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING: Final[bool] = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+SYNC_DB_POOL_SIZE: Final[int] = int(os.getenv('SYNC_DB_POOL_SIZE', 5))
+
+# Local JWT verification (must match the auth service SECRET_KEY; no default, see auth_helper)
+SECRET_KEY: Final[str] = os.getenv("SECRET_KEY", "")
+AUTH_MODE: Final[str] = os.getenv('AUTH_MODE', 'local')  # "local" or "remote"
+TOKEN_CACHE_SIZE: Final[int] = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+REVOCATION_SYNC_INTERVAL: Final[float] = float(os.getenv('REVOCATION_SYNC_INTERVAL', 30))
+REVOCATION_MAX_STALENESS: Final[float] = float(os.getenv('REVOCATION_MAX_STALENESS', 120))
+
+# Redis configuration (auth service token revocation set)
+REDIS_HOST: Final[str] = os.getenv('REDIS_HOST', 'localhost')
+REDIS_PORT: Final[int] = int(os.getenv('REDIS_PORT', 6379))
 
 # MQTT configuration
 MQTT_HOST: Final[str] = os.getenv('MQTT_HOST', 'localhost')
 MQTT_PORT: Final[int] = int(os.getenv('MQTT_PORT', 1883))
 
+# Device read-through cache (in-process LRU, optionally backed by Redis)
+DEVICE_CACHE_SIZE: Final[int] = int(os.getenv('DEVICE_CACHE_SIZE', 10000))
+DEVICE_CACHE_TTL: Final[float] = float(os.getenv('DEVICE_CACHE_TTL', 30))
+DEVICE_CACHE_REDIS: Final[bool] = os.getenv('DEVICE_CACHE_REDIS', 'false').lower() == 'true'
+DEVICE_CACHE_REDIS_TTL: Final[int] = int(os.getenv('DEVICE_CACHE_REDIS_TTL', 300))
+
+# Bulk provisioning: max items per request
+DEVICE_BULK_MAX_ITEMS: Final[int] = int(os.getenv('DEVICE_BULK_MAX_ITEMS', 10000))
+
+# Device event publisher
+MQTT_EVENT_QOS: Final[int] = int(os.getenv('MQTT_EVENT_QOS', 1))
+
+# Transactional outbox relay
+OUTBOX_BATCH_SIZE: Final[int] = int(os.getenv('OUTBOX_BATCH_SIZE', 500))
+OUTBOX_POLL_INTERVAL: Final[float] = float(os.getenv('OUTBOX_POLL_INTERVAL', 0.5))
+OUTBOX_MAX_BACKOFF: Final[float] = float(os.getenv('OUTBOX_MAX_BACKOFF', 30))
+OUTBOX_RETENTION_HOURS: Final[float] = float(os.getenv('OUTBOX_RETENTION_HOURS', 24))
+OUTBOX_LOCK_KEY: Final[int] = int(os.getenv('OUTBOX_LOCK_KEY', 4242001))
+
+# Metrics simulator (tick interval, max messages/s, bursts per tick, registry full reload period)
+SIM_INTERVAL: Final[float] = float(os.getenv('SIM_INTERVAL', 2))
+SIM_MAX_RATE: Final[float] = float(os.getenv('SIM_MAX_RATE', 5000))
+SIM_SLICES: Final[int] = int(os.getenv('SIM_SLICES', 10))
+SIM_FULL_RELOAD_INTERVAL: Final[float] = float(os.getenv('SIM_FULL_RELOAD_INTERVAL', 300))
+SIM_EVENT_SETTLE: Final[float] = float(os.getenv('SIM_EVENT_SETTLE', 5))
+# "embedded": the API process runs a simulator, "off": only standalone generator.py workers
+SIM_MODE: Final[str] = os.getenv('SIM_MODE', 'embedded')
+# "none": publish every device, "redis": split devices across all live simulators
+SIM_SHARDING: Final[str] = os.getenv('SIM_SHARDING', 'none')
+SIM_SHARD_TTL: Final[float] = float(os.getenv('SIM_SHARD_TTL', 15))
+# "json" (readable, default) or "binary": compact v1 records of helpers/wire_format.py
+SIM_WIRE_FORMAT: Final[str] = os.getenv('SIM_WIRE_FORMAT', 'json')
+
 # RabbitMQ configuration
 RABBIT_HOST: Final[str] = os.getenv('RABBIT_HOST', 'localhost')
 
@@ -25,10 +79,28 @@ MQTT_HOST: Final[str] = os.getenv('MQTT_HOST', 'localhost')
 MQTT_PORT: Final[int] = int(os.getenv('MQTT_PORT', 1883))
 
 # SQLAlchemy
-engine = create_engine(URL_DB, pool_size=10)
+engine = create_engine(
+    URL_DB,
+    pool_size=SYNC_DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING
+)
 LocalSession = sessionmaker(bind=engine)
 Base = declarative_base()
 
+async_engine = create_async_engine(
+    ASYNC_URL_DB,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING
+)
+# expire_on_commit=False: returned devices stay readable after commit without lazy IO
+AsyncLocalSession = async_sessionmaker(async_engine, expire_on_commit=False)
+
 def session_factory():
     session = LocalSession()
     try:
@@ -36,6 +108,10 @@ def session_factory():
     finally:
         session.close()
 
+async def async_session_factory():
+    async with AsyncLocalSession() as session:
+        yield session
+
 # Logs
 if not os.path.exists('./logs'):
     os.makedirs('./logs')
@@ -0,0 +1,221 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import paho.mqtt.client as mqtt
+import redis.asyncio as aioredis
+from prometheus_client import Counter
+from dto.device_dto import DeviceResponse
+from helpers.config import (
+    DEVICE_CACHE_SIZE, DEVICE_CACHE_TTL, DEVICE_CACHE_REDIS, DEVICE_CACHE_REDIS_TTL,
+    REDIS_HOST, REDIS_PORT, MQTT_HOST, MQTT_PORT, logger
+)
+
+DEVICE_CACHE_HITS = Counter("device_cache_hits_total", "Device lookups served from the cache", ["tier"])
+DEVICE_CACHE_MISSES = Counter("device_cache_misses_total", "Device lookups that went to Postgres")
+
+# Lifecycle events that change or remove an existing device (subset of device/#;
+# the high-rate device/iot|end metric topics are deliberately not subscribed)
+INVALIDATION_TOPICS = ["device/status/+", "device/update/+", "device/delete/+"]
+
+# Read-through fill: writes the device only if its generation did not change
+# since it was read, i.e. no write or invalidation happened during the DB read
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+class DeviceCache:
+    """
+    Read-through cache of devices by id, used for ownership checks and
+    GET /devices/{id}.
+
+    - L1: in-process LRU with a short TTL,
+    - L2 (optional): Redis, shared by the replicas,
+    - the request that writes a device refreshes or drops it in both tiers and
+      bumps its generation in Redis; a read-through fill only reaches L2 if the
+      generation is the one read before the DB read, so a row read before a
+      write cannot overwrite it,
+    - other replicas drop their L1 copy when the outbox relay publishes the
+      device event (device/status|update|delete/{id}); the TTL bounds staleness
+      if an event is missed.
+    """
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        redis_client: Optional[aioredis.Redis] = None,
+        redis_ttl: int = 300,
+        mqtt_host: Optional[str] = None,
+        mqtt_port: int = 1883,
+    ):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._redis = redis_client
+        self._redis_ttl = redis_ttl
+        self._mqtt_host = mqtt_host
+        self._mqtt_port = mqtt_port
+        self._client: Optional[mqtt.Client] = None
+        self._fill = redis_client.register_script(FILL_SCRIPT) if redis_client is not None else None
+        self._entries: "OrderedDict[int, Tuple[float, DeviceResponse]]" = OrderedDict()
+        # Guards the L1 dict: written by the event loop and the MQTT network thread
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(device_id: int) -> str:
+        return f"device:{device_id}"
+
+    @staticmethod
+    def _generation_key(device_id: int) -> str:
+        return f"device:{device_id}:gen"
+
+    def start(self):
+        if not self._mqtt_host:
+            return
+        self._client = mqtt.Client()
+        self._client.username_pw_set("guest", "guest")
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self._client.connect_async(self._mqtt_host, self._mqtt_port, 60)
+        self._client.loop_start()
+
+    def stop(self):
+        if self._client:
+            self._client.disconnect()
+            self._client.loop_stop()
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logger.error(f"Device cache MQTT connection failed with code {rc}")
+            return
+        for topic in INVALIDATION_TOPICS:
+            client.subscribe(topic, qos=1)
+        # Events may have been missed while disconnected
+        self.clear_local()
+
+    def _on_message(self, client, userdata, msg):
+        try:
+            self.invalidate_local(int(msg.topic.rsplit("/", 1)[-1]))
+        except ValueError:
+            pass
+
+    def _get_local(self, device_id: int) -> Optional[DeviceResponse]:
+        with self._lock:
+            entry = self._entries.get(device_id)
+            if entry is None:
+                return None
+            expires, device = entry
+            if expires < time.monotonic():
+                del self._entries[device_id]
+                return None
+            self._entries.move_to_end(device_id)
+            return device
+
+    def _put_local(self, device: DeviceResponse):
+        with self._lock:
+            self._entries[device.id] = (time.monotonic() + self._ttl, device)
+            self._entries.move_to_end(device.id)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_local(self, device_id: int):
+        with self._lock:
+            self._entries.pop(device_id, None)
+
+    def clear_local(self):
+        with self._lock:
+            self._entries.clear()
+
+    async def get(self, device_id: int) -> Optional[DeviceResponse]:
+        device = self._get_local(device_id)
+        if device is not None:
+            DEVICE_CACHE_HITS.labels(tier="memory").inc()
+            return device
+        if self._redis is not None:
+            try:
+                raw = await self._redis.get(self._key(device_id))
+            except Exception as e:
+                logger.warning(f"Device cache Redis read failed: {e}")
+                raw = None
+            if raw is not None:
+                device = DeviceResponse.model_validate_json(raw)
+                self._put_local(device)
+                DEVICE_CACHE_HITS.labels(tier="redis").inc()
+                return device
+        DEVICE_CACHE_MISSES.inc()
+        return None
+
+    async def generation(self, device_id: int) -> Optional[bytes]:
+        """Generation to pass to fill(), read before the DB read (None: no L2 fill)."""
+        if self._redis is None:
+            return None
+        try:
+            return await self._redis.get(self._generation_key(device_id)) or b""
+        except Exception as e:
+            logger.warning(f"Device cache Redis read failed: {e}")
+            return None
+
+    async def fill(self, device: DeviceResponse, generation: Optional[bytes]):
+        """Read-through fill with a row read after generation(device.id)."""
+        self._put_local(device)
+        if self._fill is None or generation is None:
+            return
+        try:
+            await self._fill(
+                keys=[self._key(device.id), self._generation_key(device.id)],
+                args=[generation, device.model_dump_json(), self._redis_ttl],
+            )
+        except Exception as e:
+            logger.warning(f"Device cache Redis write failed: {e}")
+
+    def _bump(self, pipe, device_id: int):
+        # Outlives any read-through in flight, so an expired counter cannot match again
+        pipe.incr(self._generation_key(device_id))
+        pipe.expire(self._generation_key(device_id), self._redis_ttl)
+
+    async def put(self, device: DeviceResponse):
+        """Stores a device the caller just wrote."""
+        self._put_local(device)
+        if self._redis is not None:
+            try:
+                pipe = self._redis.pipeline(transaction=True)
+                pipe.set(self._key(device.id), device.model_dump_json(), ex=self._redis_ttl)
+                self._bump(pipe, device.id)
+                await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Device cache Redis write failed: {e}")
+
+    async def invalidate_many(self, device_ids: List[int], chunk_size: int = 1000):
+        for device_id in device_ids:
+            self.invalidate_local(device_id)
+        if self._redis is not None:
+            try:
+                for i in range(0, len(device_ids), chunk_size):
+                    chunk = device_ids[i:i + chunk_size]
+                    pipe = self._redis.pipeline(transaction=False)
+                    pipe.delete(*(self._key(d) for d in chunk))
+                    for device_id in chunk:
+                        self._bump(pipe, device_id)
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Device cache Redis invalidation failed: {e}")
+
+    async def invalidate(self, device_id: int):
+        await self.invalidate_many([device_id])
+
+
+# Singleton cache, started/stopped by the app lifespan
+device_cache = DeviceCache(
+    max_size=DEVICE_CACHE_SIZE,
+    ttl=DEVICE_CACHE_TTL,
+    redis_client=aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, socket_timeout=1) if DEVICE_CACHE_REDIS else None,
+    redis_ttl=DEVICE_CACHE_REDIS_TTL,
+    mqtt_host=MQTT_HOST,
+    mqtt_port=MQTT_PORT,
+)
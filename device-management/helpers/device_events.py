@@ -0,0 +1,42 @@
+from typing import Tuple
+from entities.device import Device, DeviceCategory, DeviceStatus
+
+# Topic + payload builders for the device lifecycle events stored in the outbox.
+
+def created_event(device: Device) -> Tuple[str, dict]:
+    # RabbitMQ Topic Specification:
+    # For IoT: device/iot/temperature, device/iot/humidity, etc.
+    # For End: device/end/system
+    if device.category == DeviceCategory.IOT_DEVICE:
+        topic = f"device/iot/{device.type.value}"
+    else:
+        topic = "device/end/system"
+    return topic, {
+        "action": "create",
+        "device_id": device.id,
+        "name": device.name,
+        "category": device.category.value,
+        "type": device.type.value,
+        "status": device.status.value,
+        "owner_id": device.owner_id
+    }
+
+def status_event(device_id: int, status: DeviceStatus) -> Tuple[str, dict]:
+    return f"device/status/{device_id}", {
+        "device_id": device_id,
+        "new_status": status.value,
+        "action": "status_update"
+    }
+
+def update_event(device_id: int, changes: dict) -> Tuple[str, dict]:
+    return f"device/update/{device_id}", {
+        "device_id": device_id,
+        "action": "update",
+        "changes": changes
+    }
+
+def delete_event(device_id: int) -> Tuple[str, dict]:
+    return f"device/delete/{device_id}", {
+        "device_id": device_id,
+        "action": "delete"
+    }
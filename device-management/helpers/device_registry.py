@@ -0,0 +1,140 @@
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from entities.device import Device, DeviceCategory, IoTType
+from dal import device_dao, outbox_dao
+from helpers.config import logger
+
+
+@dataclass
+class DeviceGroup:
+    """ONLINE devices sharing a (category, type): one topic, one value generator."""
+    category: DeviceCategory
+    type: IoTType
+    topic: str
+    ids: np.ndarray
+    owners: np.ndarray
+    # Pre-encoded static part of each payload: '{"device_id": 1, "name": "...", "owner_id": 2'
+    prefixes: List[str] = field(default_factory=list)
+
+
+def _topic(category: DeviceCategory, device_type: IoTType) -> str:
+    if category == DeviceCategory.IOT_DEVICE:
+        return f"device/iot/{device_type.value}"
+    return f"device/end/{device_type.value}"
+
+
+class DeviceRegistry:
+    """
+    In-memory set of ONLINE devices for the metrics simulator.
+
+    Loaded once from t_devices, then kept current incrementally by replaying the
+    device lifecycle events of the outbox (id > last seen event), so a tick never
+    has to scan the device table. A full reload runs periodically as a safety net.
+    """
+
+    def __init__(self, settle_seconds: float = 5, sync_batch: int = 5000):
+        self._settle_seconds = settle_seconds
+        self._sync_batch = sync_batch
+        self._devices: Dict[int, Tuple[DeviceCategory, IoTType, int, str]] = {}
+        self._last_event_id = 0
+        self._groups: List[DeviceGroup] = []
+        self._owns: Optional[Callable[[int], bool]] = None
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._devices)
+
+    @staticmethod
+    def _prefix(device: Device) -> str:
+        return json.dumps({"device_id": device.id, "name": device.name, "owner_id": device.owner_id})[:-1]
+
+    def _add(self, device: Device):
+        self._devices[device.id] = (device.category, device.type, device.owner_id, self._prefix(device))
+        self._dirty = True
+
+    def _remove(self, device_id: int):
+        if self._devices.pop(device_id, None) is not None:
+            self._dirty = True
+
+    def load(self, session: Session):
+        """Full reload of the ONLINE devices."""
+        last_event_id = outbox_dao.get_last_event_id(session)
+        devices = device_dao.get_online_devices(session)
+        with self._lock:
+            self._devices = {}
+            for device in devices:
+                self._add(device)
+            self._last_event_id = last_event_id
+            self._dirty = True
+        logger.info(f"Simulator registry loaded: {len(devices)} online devices")
+
+    def sync(self, session: Session) -> int:
+        """Applies the outbox events written since the last call. Returns the number applied."""
+        applied = 0
+        while True:
+            events = outbox_dao.get_events_after(session, self._last_event_id, self._sync_batch, self._settle_seconds)
+            if not events:
+                return applied
+
+            # Devices whose row must be (re)read: created, back online, or renamed
+            refresh, removed = set(), set()
+            for event in events:
+                payload = event.payload or {}
+                device_id = payload.get("device_id")
+                action = payload.get("action")
+                if device_id is None:
+                    continue
+                if action == "delete":
+                    removed.add(device_id)
+                    refresh.discard(device_id)
+                elif action in ("create", "status_update", "update"):
+                    refresh.add(device_id)
+                    removed.discard(device_id)
+
+            online = {d.id: d for d in device_dao.get_online_devices(session, list(refresh))} if refresh else {}
+            with self._lock:
+                for device_id in removed:
+                    self._remove(device_id)
+                for device_id in refresh:
+                    if device_id in online:
+                        self._add(online[device_id])
+                    else:
+                        self._remove(device_id)
+                self._last_event_id = events[-1].id
+            applied += len(events)
+            if len(events) < self._sync_batch:
+                return applied
+
+    def set_owner_filter(self, owns: Optional[Callable[[int], bool]]):
+        """Restricts groups() to the devices of this shard (None = all devices)."""
+        with self._lock:
+            self._owns = owns
+            self._dirty = True
+
+    def groups(self) -> List[DeviceGroup]:
+        """Devices grouped by (category, type), rebuilt only after a change."""
+        with self._lock:
+            if self._dirty:
+                grouped: Dict[Tuple[DeviceCategory, IoTType], List[Tuple[int, int, str]]] = {}
+                for device_id, (category, device_type, owner_id, prefix) in sorted(self._devices.items()):
+                    if self._owns is not None and not self._owns(device_id):
+                        continue
+                    grouped.setdefault((category, device_type), []).append((device_id, owner_id, prefix))
+                self._groups = [
+                    DeviceGroup(
+                        category=category,
+                        type=device_type,
+                        topic=_topic(category, device_type),
+                        ids=np.fromiter((device_id for device_id, _, _ in members), dtype=np.int64, count=len(members)),
+                        owners=np.fromiter((owner_id for _, owner_id, _ in members), dtype=np.int64, count=len(members)),
+                        prefixes=[prefix for _, _, prefix in members],
+                    )
+                    for (category, device_type), members in grouped.items()
+                ]
+                self._dirty = False
+            return self._groups
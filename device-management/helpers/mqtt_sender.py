@@ -1,11 +1,35 @@
-import asyncio
 import json
-import random
+import os
+import socket
+import threading
 import time
+from typing import List, Optional, Tuple, Union
+import numpy as np
 import paho.mqtt.client as mqtt
 import psutil
-from helpers.config import MQTT_HOST, MQTT_PORT, LocalSession, logger
-from entities.device import Device, DeviceStatus, DeviceCategory, IoTType
+import redis
+from prometheus_client import Counter, Gauge, Histogram
+from helpers.config import (
+    MQTT_HOST, MQTT_PORT, LocalSession, SIM_INTERVAL, SIM_MAX_RATE, SIM_SLICES,
+    SIM_FULL_RELOAD_INTERVAL, SIM_EVENT_SETTLE, SIM_SHARDING, SIM_SHARD_TTL, SIM_WIRE_FORMAT,
+    REDIS_HOST, REDIS_PORT, logger
+)
+from helpers.device_registry import DeviceGroup, DeviceRegistry
+from helpers.wire_format import encode_records, record_layout
+from helpers.sharding import RedisMembership, StaticMembership
+from entities.device import DeviceCategory, IoTType
+
+SIM_DEVICES = Gauge("simulator_devices", "ONLINE devices known to the metrics simulator")
+SIM_PUBLISHED = Counter("simulator_messages_published_total", "Simulated metric messages published")
+SIM_TICK_SECONDS = Histogram("simulator_tick_build_seconds", "Time to build the messages of one tick")
+
+# IoT value ranges and units: (low, high, unit). Other IoT types send a 0/1 state.
+IOT_RANGES = {
+    IoTType.TEMPERATURE: (15.0, 35.0, "°C"),
+    IoTType.HUMIDITY: (30.0, 80.0, "%"),
+    IoTType.LIGHT: (0.0, 1000.0, "lux"),
+    IoTType.PRESSURE: (980.0, 1050.0, "hPa"),
+}
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
@@ -13,89 +37,218 @@ def on_connect(client, userdata, flags, rc):
     else:
         logger.error(f"MQTT Connection failed with code {rc}")
 
-async def start_mqtt_metrics_sender():
+
+class MetricsSimulator:
     """
-    Background task that sends metrics for all ONLINE devices every 2 seconds.
+    Generates metrics for every ONLINE device, off the event loop.
+
+    - devices come from an in-memory registry synced from the outbox events,
+    - IoT values are drawn for a whole (category, type) group in one NumPy call,
+    - host metrics (cpu/ram/storage) for end devices are sampled once per tick,
+    - at most `max_rate` messages/s are published: larger fleets are served
+      round-robin over several ticks, and each tick is spread over `slices`
+      evenly spaced bursts instead of one spike.
+
+    With a `membership` (helpers/sharding.py) only the devices this worker owns
+    on the consistent hash ring are published, so N workers split the fleet.
+
+    wire_format="binary" publishes the fixed-size records of helpers/wire_format.py
+    (a whole group is encoded in one NumPy pass) instead of JSON.
     """
-    client = mqtt.Client()
-    client.username_pw_set("guest", "guest")
-    client.on_connect = on_connect
-    
-    # Simple retry logic for MQTT connection
-    while True:
+
+    def __init__(
+        self,
+        interval: float,
+        max_rate: float,
+        slices: int,
+        full_reload_interval: float,
+        settle_seconds: float,
+        membership=None,
+        wire_format: str = "json",
+    ):
+        self._interval = interval
+        self._budget = max(1, int(max_rate * interval))
+        self._slices = max(1, slices)
+        self._full_reload_interval = full_reload_interval
+        self._registry = DeviceRegistry(settle_seconds=settle_seconds)
+        self._rng = np.random.default_rng()
+        self._offset = 0
+        self._membership = membership
+        self._membership_ok: Optional[float] = None
+        self._binary = wire_format == "binary"
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._client: Optional[mqtt.Client] = None
+
+    def start(self):
+        self._stop.clear()
+        self._client = mqtt.Client()
+        self._client.username_pw_set("guest", "guest")
+        self._client.on_connect = on_connect
+        self._client.reconnect_delay_set(min_delay=1, max_delay=30)
+        self._client.connect_async(MQTT_HOST, MQTT_PORT, 60)
+        self._client.loop_start()
+        self._thread = threading.Thread(target=self._run, name="metrics-simulator", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self._interval * 2)
+        if self._membership:
+            self._membership.leave()
+        if self._client:
+            self._client.disconnect()
+            self._client.loop_stop()
+
+    def _refresh_registry(self, full: bool):
+        with LocalSession() as session:
+            if full:
+                self._registry.load(session)
+            else:
+                self._registry.sync(session)
+        SIM_DEVICES.set(len(self._registry))
+
+    def _check_membership(self) -> bool:
+        """
+        Heartbeats the shard group and rebalances on membership changes.
+        Returns False while this worker cannot prove it is still a member
+        (its devices may already have been taken over by the others).
+        """
+        if self._membership is None:
+            return True
         try:
-            client.connect(MQTT_HOST, MQTT_PORT, 60)
-            client.loop_start()
-            break
+            if self._membership.heartbeat():
+                self._registry.set_owner_filter(self._membership.owns)
+            self._membership_ok = time.monotonic()
         except Exception as e:
-            logger.error(f"MQTT Connection failed, retrying in 5s: {e}")
-            await asyncio.sleep(5)
+            logger.error(f"Simulator shard heartbeat failed: {e}")
+        return self._membership_ok is not None and time.monotonic() - self._membership_ok < SIM_SHARD_TTL
 
-    while True:
-        try:
-            # Create a new session for each loop iteration
-            with LocalSession() as session:
-                # Query all ONLINE devices
-                active_devices = session.query(Device).filter(Device.status == DeviceStatus.ONLINE).all()
-                if len(active_devices) > 0:
-                    logger.info(f"Found {len(active_devices)} online devices. Sending metrics...")
-                
-                for device in active_devices:
-                    # Define topic and generate realistic values based on type
-                    if device.category == DeviceCategory.IOT_DEVICE:
-                        topic = f"device/iot/{device.type.value}"
-                        if device.type == IoTType.TEMPERATURE:
-                            value = round(random.uniform(15.0, 35.0), 2)
-                            unit = "°C"
-                        elif device.type == IoTType.HUMIDITY:
-                            value = round(random.uniform(30.0, 80.0), 2)
-                            unit = "%"
-                        elif device.type == IoTType.LIGHT:
-                            value = round(random.uniform(0.0, 1000.0), 2)
-                            unit = "lux"
-                        elif device.type == IoTType.PRESSURE:
-                            value = round(random.uniform(980.0, 1050.0), 2)
-                            unit = "hPa"
-                        else:
-                            value = random.randint(0, 1)
-                            unit = "binary"
-                            
-                        payload = {
-                            "device_id": device.id,
-                            "name": device.name,
-                            "value": value,
-                            "unit": unit,
-                            "timestamp": time.time(),
-                            "owner_id": device.owner_id
-                        }
-                    else:
-                        # End Device: Sending REAL CPU, RAM and Storage using psutil
-                        topic = f"device/end/{device.type.value}"
-                        
-                        # Get real system metrics
-                        cpu_usage = psutil.cpu_percent(interval=0.1)
-                        ram_usage = psutil.virtual_memory().percent
-                        storage_usage = psutil.disk_usage('/').percent
-
-                        payload = {
-                            "device_id": device.id,
-                            "name": device.name,
-                            "metrics": {
-                                "cpu": cpu_usage,
-                                "ram": ram_usage,
-                                "storage": storage_usage
-                            },
-                            "unit": "%",
-                            "timestamp": time.time(),
-                            "owner_id": device.owner_id
-                        }
-
-                    # Publish metrics
-                    client.publish(topic, json.dumps(payload))
-                    # logger.info(f"Published metrics for device {device.id} to {topic}")
+    @staticmethod
+    def _host_metrics() -> dict:
+        # Real system metrics, sampled once for all end devices of the tick
+        return {
+            "cpu": psutil.cpu_percent(interval=None),
+            "ram": psutil.virtual_memory().percent,
+            "storage": psutil.disk_usage('/').percent
+        }
 
-        except Exception as e:
-            logger.error(f"Error in MQTT metrics sender loop: {e}")
-        
-        # Wait 2 seconds before next round
-        await asyncio.sleep(2)
+    def _binary_messages(self, group: DeviceGroup, positions: np.ndarray, ts: float, host: dict) -> List[Tuple[str, bytes]]:
+        if group.category != DeviceCategory.IOT_DEVICE:
+            values = host
+        elif group.type in IOT_RANGES:
+            low, high, _ = IOT_RANGES[group.type]
+            values = {"value": np.round(self._rng.uniform(low, high, size=len(positions)), 2)}
+        else:
+            values = {"value": self._rng.integers(0, 2, size=len(positions))}
+        layout = record_layout(group.category, group.type)
+        payloads = encode_records(layout, group.ids[positions], group.owners[positions], ts, values)
+        return [(group.topic, payload) for payload in payloads]
+
+    def _group_messages(self, group: DeviceGroup, positions: np.ndarray, ts: float, host_suffix: str) -> List[Tuple[str, str]]:
+        if group.category != DeviceCategory.IOT_DEVICE:
+            return [(group.topic, group.prefixes[i] + host_suffix) for i in positions.tolist()]
+
+        if group.type in IOT_RANGES:
+            low, high, unit = IOT_RANGES[group.type]
+            values = np.round(self._rng.uniform(low, high, size=len(positions)), 2).tolist()
+        else:
+            unit = "binary"
+            values = self._rng.integers(0, 2, size=len(positions)).tolist()
+        tail = f', "unit": {json.dumps(unit)}, "timestamp": {ts}}}'
+        prefixes = group.prefixes
+        return [
+            (group.topic, f'{prefixes[i]}, "value": {value}{tail}')
+            for i, value in zip(positions.tolist(), values)
+        ]
+
+    def build_tick(self, ts: float) -> List[Tuple[str, Union[str, bytes]]]:
+        """
+        Messages for this tick: the next `budget` devices in round-robin order
+        (every device when the fleet fits in the budget).
+        """
+        groups = self._registry.groups()
+        total = sum(len(group.ids) for group in groups)
+        if total == 0:
+            return []
+
+        count = min(total, self._budget)
+        start = self._offset % total
+        self._offset = (start + count) % total
+        host = self._host_metrics() if any(g.category != DeviceCategory.IOT_DEVICE for g in groups) else {}
+        host_suffix = f', "metrics": {json.dumps(host)}, "unit": "%", "timestamp": {ts}}}'
+
+        messages = []
+        base = 0
+        for group in groups:
+            size = len(group.ids)
+            # Global window [start, start+count) wraps around: map it onto this group
+            local = np.arange(base, base + size)
+            selected = ((local - start) % total) < count
+            positions = np.nonzero(selected)[0]
+            if len(positions) and self._binary:
+                messages.extend(self._binary_messages(group, positions, ts, host))
+            elif len(positions):
+                messages.extend(self._group_messages(group, positions, ts, host_suffix))
+            base += size
+        return messages
+
+    def _run(self):
+        next_full_reload = 0.0
+        psutil.cpu_percent(interval=None)  # prime the non-blocking cpu counter
+        while not self._stop.is_set():
+            tick_start = time.monotonic()
+            try:
+                full = tick_start >= next_full_reload
+                self._refresh_registry(full)
+                if full:
+                    next_full_reload = tick_start + self._full_reload_interval
+
+                if not self._check_membership():
+                    self._stop.wait(self._interval)
+                    continue
+
+                with SIM_TICK_SECONDS.time():
+                    messages = self.build_tick(time.time())
+
+                # Spread the tick over evenly spaced slices
+                slice_size = -(-len(messages) // self._slices) if messages else 0
+                for n in range(self._slices):
+                    chunk = messages[n * slice_size:(n + 1) * slice_size]
+                    if not chunk:
+                        break
+                    for topic, payload in chunk:
+                        self._client.publish(topic, payload)
+                    SIM_PUBLISHED.inc(len(chunk))
+                    slice_deadline = tick_start + (n + 1) * self._interval / self._slices
+                    self._stop.wait(max(0.0, slice_deadline - time.monotonic()))
+            except Exception as e:
+                logger.error(f"Error in MQTT metrics sender loop: {e}")
+
+            # Wait for the next tick
+            self._stop.wait(max(0.0, tick_start + self._interval - time.monotonic()))
+
+
+def create_simulator(worker_id: Optional[str] = None, shard: Optional[Tuple[int, int]] = None) -> MetricsSimulator:
+    """
+    shard=(index, count) pins a static shard; otherwise SIM_SHARDING=redis joins
+    the dynamic shard group as `worker_id`, and "none" publishes every device.
+    """
+    membership = None
+    if shard is not None:
+        membership = StaticMembership(*shard)
+    elif SIM_SHARDING == "redis":
+        client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True, socket_timeout=5)
+        membership = RedisMembership(
+            worker_id or f"{socket.gethostname()}-{os.getpid()}", client, ttl=SIM_SHARD_TTL
+        )
+    return MetricsSimulator(
+        interval=SIM_INTERVAL,
+        max_rate=SIM_MAX_RATE,
+        slices=SIM_SLICES,
+        full_reload_interval=SIM_FULL_RELOAD_INTERVAL,
+        settle_seconds=SIM_EVENT_SETTLE,
+        membership=membership,
+        wire_format=SIM_WIRE_FORMAT,
+    )
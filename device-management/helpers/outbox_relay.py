@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from prometheus_client import Gauge
+from helpers.config import (
+    LocalSession, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_BACKOFF,
+    OUTBOX_RETENTION_HOURS, OUTBOX_LOCK_KEY, logger
+)
+from helpers.rabbitmq_helper import event_publisher
+from dal import outbox_dao
+
+OUTBOX_PENDING = Gauge("device_outbox_pending", "Outbox events not yet published (sampled by the relay)")
+
+
+class OutboxRelay:
+    """
+    Background thread that drains t_device_outbox to the broker.
+
+    Each round takes the relay advisory lock (one relay across replicas), reads
+    up to `batch_size` pending events in id order, publishes them as one batch
+    and marks them published in the same transaction. A failed batch is retried
+    as a whole with exponential backoff, so ordering is preserved and delivery
+    is at-least-once.
+    """
+
+    def __init__(self, batch_size: int, poll_interval: float, max_backoff: float, retention_hours: float, lock_key: int):
+        self._batch_size = batch_size
+        self._poll_interval = poll_interval
+        self._max_backoff = max_backoff
+        self._retention = timedelta(hours=retention_hours)
+        self._lock_key = lock_key
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="device-outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _relay_batch(self) -> Optional[int]:
+        """Returns the number of events published, 0 if idle, None on failure."""
+        with LocalSession() as session:
+            if not outbox_dao.try_lock_relay(session, self._lock_key):
+                session.rollback()
+                return 0
+            events = outbox_dao.get_pending_events(session, self._batch_size)
+            if not events:
+                session.commit()
+                return 0
+
+            event_ids = [event.id for event in events]
+            messages = [(event.topic, json.dumps(event.payload)) for event in events]
+            if event_publisher.publish_batch(messages):
+                outbox_dao.mark_published(session, event_ids)
+                session.commit()
+                return len(events)
+
+            outbox_dao.record_failure(session, event_ids)
+            session.commit()
+            return None
+
+    def _housekeeping(self):
+        with LocalSession() as session:
+            OUTBOX_PENDING.set(outbox_dao.count_pending(session))
+            purged = outbox_dao.purge_published(session, datetime.utcnow() - self._retention)
+            if purged:
+                logger.info(f"Outbox: purged {purged} published events")
+
+    def _run(self):
+        backoff = self._poll_interval
+        next_housekeeping = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() >= next_housekeeping:
+                    self._housekeeping()
+                    next_housekeeping = time.monotonic() + 60
+
+                published = self._relay_batch()
+                if published is None:
+                    logger.warning(f"Outbox: publish failed, retrying in {backoff:.1f}s")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, self._max_backoff)
+                    continue
+                backoff = self._poll_interval
+                # A full batch means more is waiting: loop right away
+                if published < self._batch_size:
+                    self._stop.wait(self._poll_interval)
+            except Exception as e:
+                logger.error(f"Outbox relay error: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self._max_backoff)
+
+
+# Singleton relay, started/stopped by the app lifespan
+outbox_relay = OutboxRelay(
+    batch_size=OUTBOX_BATCH_SIZE,
+    poll_interval=OUTBOX_POLL_INTERVAL,
+    max_backoff=OUTBOX_MAX_BACKOFF,
+    retention_hours=OUTBOX_RETENTION_HOURS,
+    lock_key=OUTBOX_LOCK_KEY,
+)
@@ -1,25 +1,77 @@
-import json
+import threading
+from typing import List, Tuple
 import paho.mqtt.client as mqtt
-from helpers.config import MQTT_HOST, MQTT_PORT, logger
+from prometheus_client import Counter
+from helpers.config import MQTT_HOST, MQTT_PORT, MQTT_EVENT_QOS, logger
 
-def publish_device_event(topic: str, payload: dict):
+EVENTS_PUBLISHED = Counter("device_events_published_total", "Device events acknowledged by the MQTT broker")
+EVENTS_PUBLISH_FAILURES = Counter("device_events_publish_failures_total", "Device event batches that could not be published")
+
+
+class MqttPublisher:
     """
-    Publish a device event (creation, status update, etc.) using MQTT (Paho)
-    instead of AMQP (Pika).
+    Long-lived, auto-reconnecting MQTT connection for device lifecycle events.
+    Events are written to the outbox table by the request handlers and handed
+    to this publisher in batches by the outbox relay (helpers/outbox_relay.py).
     """
-    try:
-        # Create a temporary client for publishing or use a singleton
-        client = mqtt.Client()
-        client.connect(MQTT_HOST, MQTT_PORT, 60)
-        
-        # Publish the message
-        result = client.publish(topic, json.dumps(payload))
-        
-        # Wait for completion (optional but safer for events)
-        result.wait_for_publish()
-        
-        client.disconnect()
-        # logger.info(f"Event published to topic {topic} via MQTT")
-        
-    except Exception as e:
-        logger.error(f"Failed to publish MQTT event: {e}")
+
+    def __init__(self, host: str, port: int, qos: int = 1):
+        self._host = host
+        self._port = port
+        self._qos = qos
+        self._connected = threading.Event()
+
+        self._client = mqtt.Client()
+        self._client.username_pw_set("guest", "guest")
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.reconnect_delay_set(min_delay=1, max_delay=30)
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            logger.info("MQTT event publisher connected to Broker")
+            self._connected.set()
+        else:
+            logger.error(f"MQTT event publisher connection failed with code {rc}")
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._connected.clear()
+        if rc != 0:
+            logger.warning(f"MQTT event publisher disconnected (rc={rc}), reconnecting...")
+
+    def start(self):
+        # connect_async + loop_start: the network thread keeps reconnecting on its own
+        self._client.connect_async(self._host, self._port, 60)
+        self._client.loop_start()
+
+    def stop(self):
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def publish_batch(self, messages: List[Tuple[str, str]], timeout: float = 10) -> bool:
+        """
+        Publishes (topic, json payload) pairs in order and waits until the broker
+        has acknowledged all of them (QoS >= 1). Returns False if any failed;
+        the caller retries the whole batch (at-least-once delivery).
+        """
+        if not self._connected.wait(timeout=timeout):
+            EVENTS_PUBLISH_FAILURES.inc()
+            return False
+        try:
+            infos = [self._client.publish(topic, payload, qos=self._qos) for topic, payload in messages]
+            for info in infos:
+                if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                    raise RuntimeError(f"publish rc={info.rc}")
+                info.wait_for_publish(timeout=timeout)
+                if not info.is_published():
+                    raise RuntimeError("publish not acknowledged in time")
+        except Exception as e:
+            logger.error(f"Failed to publish MQTT event batch: {e}")
+            EVENTS_PUBLISH_FAILURES.inc()
+            return False
+        EVENTS_PUBLISHED.inc(len(messages))
+        return True
+
+
+# Singleton publisher, started/stopped by the app lifespan
+event_publisher = MqttPublisher(MQTT_HOST, MQTT_PORT, qos=MQTT_EVENT_QOS)
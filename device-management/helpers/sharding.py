@@ -0,0 +1,88 @@
+import bisect
+import hashlib
+import time
+from typing import List, Optional
+import redis
+from helpers.config import logger
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Consistent hash ring with virtual nodes: when a member joins or leaves,
+    only ~1/N of the device ids move to another member.
+    """
+
+    def __init__(self, members: List[str], vnodes: int = 100):
+        self.members = sorted(members)
+        points = sorted((_hash(f"{member}#{i}"), member) for member in self.members for i in range(vnodes))
+        self._keys = [point for point, _ in points]
+        self._owners = [member for _, member in points]
+
+    def owner(self, key: int) -> Optional[str]:
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(str(key))) % len(self._keys)
+        return self._owners[index]
+
+
+class StaticMembership:
+    """Fixed shard `index` out of `count` (no coordination, e.g. --shard 0/4)."""
+
+    def __init__(self, index: int, count: int):
+        self.worker_id = f"shard-{index}"
+        self._ring = HashRing([f"shard-{i}" for i in range(count)])
+        self._announced = False
+
+    def heartbeat(self) -> bool:
+        changed = not self._announced
+        self._announced = True
+        return changed
+
+    def owns(self, device_id: int) -> bool:
+        return self._ring.owner(device_id) == self.worker_id
+
+    def leave(self):
+        pass
+
+
+class RedisMembership:
+    """
+    Dynamic shard group: every worker heartbeats into a Redis sorted set
+    (member -> last heartbeat). Members silent for `ttl` seconds are dropped,
+    and every worker rebuilds the same ring from the live members, so the
+    device space is rebalanced whenever the worker count changes.
+    """
+
+    def __init__(self, worker_id: str, redis_client: redis.Redis, key: str = "simulator:workers", ttl: float = 15):
+        self.worker_id = worker_id
+        self._redis = redis_client
+        self._key = key
+        self._ttl = ttl
+        self._ring: Optional[HashRing] = None
+
+    def heartbeat(self) -> bool:
+        """Refreshes our heartbeat; returns True when the member set changed."""
+        now = time.time()
+        pipe = self._redis.pipeline()
+        pipe.zadd(self._key, {self.worker_id: now})
+        pipe.zremrangebyscore(self._key, "-inf", now - self._ttl)
+        pipe.zrange(self._key, 0, -1)
+        members = pipe.execute()[-1]
+        if self._ring is not None and self._ring.members == sorted(members):
+            return False
+        self._ring = HashRing(members)
+        logger.info(f"Simulator shard group: {len(members)} workers, this is {self.worker_id}")
+        return True
+
+    def owns(self, device_id: int) -> bool:
+        return self._ring is not None and self._ring.owner(device_id) == self.worker_id
+
+    def leave(self):
+        try:
+            self._redis.zrem(self._key, self.worker_id)
+        except Exception as e:
+            logger.error(f"Could not leave simulator shard group: {e}")
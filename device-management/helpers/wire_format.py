@@ -0,0 +1,47 @@
+"""
+Compact binary layout (v1) of the simulator metric messages, JSON stays the fallback.
+
+The consumer tells the formats apart by the first byte (0x01 = binary v1, "{" = JSON)
+and picks the layout from the topic, which already carries the device type:
+
+    header          <B I I d    version, device_id, owner_id, timestamp (epoch seconds)
+    device/iot/{temperature,humidity,light,pressure}   <d   value (unit implied by the type)
+    device/iot/{other types}                           <B   0/1 state
+    device/end/{type}                                  <ddd cpu, ram, storage (%)
+
+Must stay in sync with monitoring-service/helpers/wire_format.py.
+"""
+from typing import Dict, List
+import numpy as np
+from entities.device import DeviceCategory, IoTType
+
+WIRE_VERSION = 1
+
+MEASURED_TYPES = {IoTType.TEMPERATURE, IoTType.HUMIDITY, IoTType.LIGHT, IoTType.PRESSURE}
+
+# Packed (unaligned) little-endian records
+_HEADER = [("version", "u1"), ("device_id", "<u4"), ("owner_id", "<u4"), ("timestamp", "<f8")]
+IOT_VALUE = np.dtype(_HEADER + [("value", "<f8")])
+IOT_STATE = np.dtype(_HEADER + [("value", "u1")])
+END_METRICS = np.dtype(_HEADER + [("cpu", "<f8"), ("ram", "<f8"), ("storage", "<f8")])
+
+def record_layout(category: DeviceCategory, device_type: IoTType) -> np.dtype:
+    if category != DeviceCategory.IOT_DEVICE:
+        return END_METRICS
+    return IOT_VALUE if device_type in MEASURED_TYPES else IOT_STATE
+
+def encode_records(layout: np.dtype, device_ids: np.ndarray, owner_ids: np.ndarray, ts: float, values: Dict[str, object]) -> List[bytes]:
+    """
+    Encodes one message per device in a single NumPy pass.
+    `values` maps the layout body fields to an array (one value per device) or a scalar.
+    """
+    records = np.empty(len(device_ids), dtype=layout)
+    records["version"] = WIRE_VERSION
+    records["device_id"] = device_ids
+    records["owner_id"] = owner_ids
+    records["timestamp"] = ts
+    for name, value in values.items():
+        records[name] = value
+    raw = records.tobytes()
+    size = layout.itemsize
+    return [raw[offset:offset + size] for offset in range(0, len(raw), size)]
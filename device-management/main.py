@@ -1,18 +1,38 @@
-import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from controllers.device_controller import router
-from helpers.config import Base, engine, logger
-from helpers.mqtt_sender import start_mqtt_metrics_sender
+from helpers.config import async_engine, logger, SIM_MODE
+from helpers.mqtt_sender import create_simulator
+from helpers.auth_helper import token_verifier
+from helpers.rabbitmq_helper import event_publisher
+from helpers.outbox_relay import outbox_relay
+from helpers.device_cache import device_cache
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup logic
-    logger.info("Starting background MQTT metrics sender...")
-    asyncio.create_task(start_mqtt_metrics_sender())
+    token_verifier.start()
+    device_cache.start()
+    event_publisher.start()
+    outbox_relay.start()
+    # Simulator embedded in the API process; built only in this mode, so importing
+    # helpers.mqtt_sender (e.g. from the generator workers) creates nothing
+    metrics_simulator = None
+    if SIM_MODE == "embedded":
+        logger.info("Starting background MQTT metrics sender...")
+        metrics_simulator = create_simulator()
+        metrics_simulator.start()
     yield
     # Shutdown logic (optional)
     logger.info("Shutting down...")
+    token_verifier.stop()
+    device_cache.stop()
+    if metrics_simulator is not None:
+        metrics_simulator.stop()
+    # Pending device events stay in the outbox for the next relay
+    outbox_relay.stop()
+    event_publisher.stop()
+    await async_engine.dispose()
 
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -24,9 +44,6 @@ app = FastAPI(
 
 Instrumentator().instrument(app).expose(app)
 
-# Create tables on startup
-Base.metadata.create_all(bind=engine)
-
 app.include_router(router)
 
 if __name__ == '__main__':
@@ -0,0 +1,42 @@
+import os
+import sys
+from alembic import context
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers.config import Base, URL_DB  # noqa: E402
+import entities.device  # noqa: E402,F401  (registers the tables on Base.metadata)
+import entities.outbox  # noqa: E402,F401
+
+# Held for the whole upgrade so replicas starting together migrate one at a time
+MIGRATION_LOCK_KEY = 4242000
+
+target_metadata = Base.metadata
+
+
+def run_migrations_offline():
+    context.configure(url=URL_DB, target_metadata=target_metadata, literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    engine = create_engine(URL_DB)
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        connection.commit()
+        try:
+            context.configure(connection=connection, target_metadata=target_metadata)
+            with context.begin_transaction():
+                context.run_migrations()
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            connection.commit()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,63 @@
+"""Initial schema: devices and the device event outbox
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases created earlier by Base.metadata.create_all already have these
+tables: they are left untouched and only stamped at this revision.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table("t_devices"):
+        op.create_table(
+            "t_devices",
+            sa.Column("id", sa.Integer, primary_key=True, autoincrement=True, nullable=False),
+            sa.Column("name", sa.String, nullable=False),
+            sa.Column("category", sa.Enum("END_DEVICE", "IOT_DEVICE", name="devicecategory"), nullable=False),
+            sa.Column("type", sa.Enum(
+                "TEMPERATURE", "HUMIDITY", "LIGHT", "PRESSURE", "SERVER", "WORKSTATION", "GATEWAY", "OTHER",
+                name="iottype"
+            ), nullable=False),
+            sa.Column("status", sa.Enum("ONLINE", "OFFLINE", "MAINTENANCE", name="devicestatus"), nullable=False),
+            sa.Column("configuration", sa.JSON, nullable=True),
+            sa.Column("last_seen", sa.DateTime, server_default=sa.func.now()),
+            sa.Column("owner_id", sa.Integer, nullable=False),
+            sa.Column("created_at", sa.DateTime, server_default=sa.func.now()),
+            sa.Column("updated_at", sa.DateTime, server_default=sa.func.now()),
+        )
+        op.create_index("ix_t_devices_id", "t_devices", ["id"])
+        op.create_index("ix_t_devices_owner_id", "t_devices", ["owner_id"])
+
+    if not inspector.has_table("t_device_outbox"):
+        op.create_table(
+            "t_device_outbox",
+            sa.Column("id", sa.BigInteger, primary_key=True, autoincrement=True),
+            sa.Column("topic", sa.String, nullable=False),
+            sa.Column("payload", sa.JSON, nullable=False),
+            sa.Column("created_at", sa.DateTime, server_default=sa.func.now(), nullable=False),
+            sa.Column("published_at", sa.DateTime, nullable=True),
+            sa.Column("attempts", sa.Integer, nullable=False),
+        )
+        op.create_index("ix_t_device_outbox_created_at", "t_device_outbox", ["created_at"])
+        op.create_index(
+            "ix_device_outbox_pending", "t_device_outbox", ["id"],
+            postgresql_where=sa.text("published_at IS NULL")
+        )
+
+
+def downgrade():
+    op.drop_table("t_device_outbox")
+    op.drop_table("t_devices")
+    for enum_name in ("devicestatus", "iottype", "devicecategory"):
+        sa.Enum(name=enum_name).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,49 @@
+"""Composite and partial indexes for the device queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+- (owner_id, id): owner listings paginated by id (get_user_devices, iter_devices),
+  replaces the single-column owner_id index,
+- (owner_id, created_at): get_devices_by_date,
+- partial (id) WHERE status = 'ONLINE': the simulator registry reload,
+- the extra index on the primary key column is dropped (duplicate of the PK).
+
+Built CONCURRENTLY so a populated table stays writable during the upgrade.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_devices_owner_id_id", "t_devices", ["owner_id", "id"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_devices_owner_id_created_at", "t_devices", ["owner_id", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            "ix_devices_online", "t_devices", ["id"],
+            postgresql_where=sa.text("status = 'ONLINE'"),
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.drop_index("ix_t_devices_owner_id", "t_devices", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_t_devices_id", "t_devices", postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index("ix_t_devices_id", "t_devices", ["id"], postgresql_concurrently=True, if_not_exists=True)
+        op.create_index("ix_t_devices_owner_id", "t_devices", ["owner_id"], postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index("ix_devices_online", "t_devices", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_devices_owner_id_created_at", "t_devices", postgresql_concurrently=True, if_exists=True)
+        op.drop_index("ix_devices_owner_id_id", "t_devices", postgresql_concurrently=True, if_exists=True)
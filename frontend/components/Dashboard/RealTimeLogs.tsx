@@ -16,7 +16,7 @@ interface LogEntry {
 import { useAuth } from '../../context/AuthContext';
 
 const RealTimeLogs: React.FC = () => {
-    const { latestMetric, isConnected } = useSocket();
+    const { latestMetrics, isConnected } = useSocket();
     const { user, isAdmin } = useAuth();
     const [logs, setLogs] = useState<LogEntry[]>([]);
     const scrollRef = useRef<HTMLDivElement>(null);
@@ -25,11 +25,13 @@ const RealTimeLogs: React.FC = () => {
     const MAX_LOGS = 100;
 
     useEffect(() => {
-        if (latestMetric) {
+        // One batch per flush on the server (~250ms)
+        const newLogs: LogEntry[] = [];
+        for (const metric of latestMetrics) {
             // RBAC Filtering: If not admin, only show logs for user's devices
-            // Check if latestMetric belongs to current user or if user is admin
-            if (!isAdmin && user && latestMetric.ownerId !== undefined && latestMetric.ownerId !== Number(user.id)) {
-                return;
+            // Check if metric belongs to current user or if user is admin
+            if (!isAdmin && user && metric.ownerId !== undefined && metric.ownerId !== Number(user.id)) {
+                continue;
             }
 
             const now = new Date();
@@ -37,30 +39,30 @@ const RealTimeLogs: React.FC = () => {
 
             // Determine metric content
             const metrics: string[] = [];
-            if (latestMetric.cpu !== undefined) metrics.push(`CPU:${latestMetric.cpu.toFixed(1)}%`);
-            if (latestMetric.ram !== undefined) metrics.push(`RAM:${latestMetric.ram.toFixed(1)}%`);
-            if (latestMetric.disk !== undefined) metrics.push(`DSK:${latestMetric.disk.toFixed(1)}%`);
+            if (metric.cpu !== undefined) metrics.push(`CPU:${metric.cpu.toFixed(1)}%`);
+            if (metric.ram !== undefined) metrics.push(`RAM:${metric.ram.toFixed(1)}%`);
+            if (metric.disk !== undefined) metrics.push(`DSK:${metric.disk.toFixed(1)}%`);
 
             // Logic for IoT devices (primary value + unit)
             // If no system metrics are present, or if it's explicitly an IoT type
-            if (metrics.length === 0 && latestMetric.value !== undefined) {
-                const valStr = latestMetric.unit ? `${latestMetric.value} ${latestMetric.unit}` : `${latestMetric.value}`;
+            if (metrics.length === 0 && metric.value !== undefined) {
+                const valStr = metric.unit ? `${metric.value} ${metric.unit}` : `${metric.value}`;
                 metrics.push(valStr);
-            } else if (latestMetric.value !== undefined && !metrics.some(m => m.includes('CPU'))) {
+            } else if (metric.value !== undefined && !metrics.some(m => m.includes('CPU'))) {
                 // Fallback if value exists and CPU is missing (unlikely overlap)
-                metrics.push(`VAL:${latestMetric.value}`);
+                metrics.push(`VAL:${metric.value}`);
             }
 
             let displayValue = metrics.join(' | ');
-            let type = latestMetric.dataType ? latestMetric.dataType.toUpperCase() : 'MULTI_METRIC';
+            let type = metric.dataType ? metric.dataType.toUpperCase() : 'MULTI_METRIC';
 
             // Heuristic to determine type label if dataType is missing
             if (metrics.length > 1) {
                 type = 'SYS_METRICS';
-            } else if (metrics.length === 1 && !latestMetric.dataType) {
-                if (latestMetric.cpu !== undefined) type = 'CPU_LOAD';
-                else if (latestMetric.ram !== undefined) type = 'RAM_USAGE';
-                else if (latestMetric.disk !== undefined) type = 'DISK_USAGE';
+            } else if (metrics.length === 1 && !metric.dataType) {
+                if (metric.cpu !== undefined) type = 'CPU_LOAD';
+                else if (metric.ram !== undefined) type = 'RAM_USAGE';
+                else if (metric.disk !== undefined) type = 'DISK_USAGE';
                 else type = 'SENSOR_VAL';
             }
 
@@ -68,19 +70,23 @@ const RealTimeLogs: React.FC = () => {
                 id: Math.random().toString(36).substring(7),
                 timestamp: now.toISOString(),
                 parsedTime: timeString,
-                deviceId: latestMetric.deviceId,
+                deviceId: metric.deviceId,
                 metricType: type,
                 value: displayValue,
-                raw: latestMetric
+                raw: metric
             };
 
+            newLogs.push(newLog);
+        }
+
+        if (newLogs.length) {
             setLogs(prev => {
-                const updated = [...prev, newLog];
+                const updated = [...prev, ...newLogs];
                 if (updated.length > MAX_LOGS) return updated.slice(updated.length - MAX_LOGS);
                 return updated;
             });
         }
-    }, [latestMetric]);
+    }, [latestMetrics]);
 
     // Auto-scroll to bottom
     useEffect(() => {
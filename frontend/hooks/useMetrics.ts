@@ -109,19 +109,20 @@ export const useMetrics = (selectedDeviceId?: string) => {
     fetchHistory();
   }, [fetchHistory]);
 
-  const { latestMetric, isConnected } = useSocket();
+  const { latestMetrics, isConnected } = useSocket();
 
   // Handle Real-time updates
   // Handle Real-time updates with proper sorting to prevent chart jitter
   useEffect(() => {
-    if (latestMetric && latestMetric.deviceId === selectedDeviceId) {
+    const incoming = latestMetrics.filter(m => m.deviceId === selectedDeviceId);
+    if (incoming.length) {
       setMetrics(prev => {
-        const updated = [...prev, latestMetric].sort((a, b) => new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime());
+        const updated = [...prev, ...incoming].sort((a, b) => new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime());
         // Keep the last 50 points to avoid memory bloat
         return updated.length > 50 ? updated.slice(updated.length - 50) : updated;
       });
     }
-  }, [latestMetric, selectedDeviceId]);
+  }, [latestMetrics, selectedDeviceId]);
 
   return {
     metrics,
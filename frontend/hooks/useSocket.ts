@@ -6,9 +6,38 @@ import { MetricData } from '../types';
 const SOCKET_URL = import.meta.env.VITE_API_URL || 'http://172.26.80.134';
 const SOCKET_PATH = import.meta.env.VITE_SOCKET_PATH || '/monitoring/socket.io';
 
+const toMetricData = (metric: any): MetricData => {
+    const data = metric.data;
+    const nestedMetrics = data.metrics || {};
+
+    // Resolve values checking both root level and nested 'metrics' object
+    const resolvedCpu = data.cpu ?? data.cpu_load ?? nestedMetrics.cpu;
+    const resolvedRam = data.ram ?? nestedMetrics.ram;
+    const resolvedDisk = data.disk ?? data.storage ?? nestedMetrics.disk ?? nestedMetrics.storage;
+    const resolvedValue = data.value ?? data.load ?? resolvedCpu ?? 0;
+
+    return {
+        timestamp: metric.timestamp || new Date().toISOString(),
+        value: resolvedValue,
+        // User requested original values ONLY. No simulation.
+        cpu: resolvedCpu,
+        ram: resolvedRam,
+        disk: resolvedDisk,
+        deviceId: metric.device_id.toString(),
+        unit: data.unit,
+        dataType: data.type,
+        ownerId: metric.owner_id
+    };
+};
+
 export const useSocket = () => {
     const [socket, setSocket] = useState<Socket | null>(null);
-    const [latestMetric, setLatestMetric] = useState<MetricData | null>(null);
+    // Last batch received (the server coalesces metrics every ~250ms)
+    const [latestMetrics, setLatestMetrics] = useState<MetricData[]>([]);
+    // Current value of each device, sent once on connect
+    const [snapshot, setSnapshot] = useState<MetricData[]>([]);
+    // Last alert transition (firing/resolved) of a rule on one of the user's devices
+    const [lastAlert, setLastAlert] = useState<any | null>(null);
     const [isConnected, setIsConnected] = useState(false);
 
     useEffect(() => {
@@ -16,6 +45,8 @@ export const useSocket = () => {
             path: '/monitoring/socket.io',
             transports: ['websocket'],
             withCredentials: true,
+            // The server only sends metrics of the authenticated user's devices
+            auth: (cb) => cb({ token: localStorage.getItem('token') }),
             reconnectionAttempts: 5,
             reconnectionDelay: 5000,
         });
@@ -30,31 +61,16 @@ export const useSocket = () => {
             setIsConnected(false);
         });
 
-        s.on('new_metric', (rawData) => {
-            const metric = typeof rawData === 'string' ? JSON.parse(rawData) : rawData;
-            console.log('[SOCKET] New metric received:', metric);
-
-            const data = metric.data;
-            const nestedMetrics = data.metrics || {};
+        s.on('metrics_snapshot', (metrics: any[]) => {
+            setSnapshot(metrics.map(toMetricData));
+        });
 
-            // Resolve values checking both root level and nested 'metrics' object
-            const resolvedCpu = data.cpu ?? data.cpu_load ?? nestedMetrics.cpu;
-            const resolvedRam = data.ram ?? nestedMetrics.ram;
-            const resolvedDisk = data.disk ?? data.storage ?? nestedMetrics.disk ?? nestedMetrics.storage;
-            const resolvedValue = data.value ?? data.load ?? resolvedCpu ?? 0;
+        s.on('alert', (alert: any) => {
+            setLastAlert(alert);
+        });
 
-            setLatestMetric({
-                timestamp: metric.timestamp || new Date().toISOString(),
-                value: resolvedValue,
-                // User requested original values ONLY. No simulation.
-                cpu: resolvedCpu,
-                ram: resolvedRam,
-                disk: resolvedDisk,
-                deviceId: metric.device_id.toString(),
-                unit: data.unit,
-                dataType: data.type,
-                ownerId: metric.owner_id
-            });
+        s.on('metrics_batch', (batch: any[]) => {
+            setLatestMetrics(batch.map(toMetricData));
         });
 
         setSocket(s);
@@ -64,5 +80,6 @@ export const useSocket = () => {
         };
     }, []);
 
-    return { latestMetric, isConnected };
+    const latestMetric = latestMetrics.length ? latestMetrics[latestMetrics.length - 1] : null;
+    return { latestMetric, latestMetrics, snapshot, lastAlert, isConnected, socket };
 };
@@ -31,15 +31,32 @@ const DeviceAnalyticsCard: React.FC<{
   const fetchHistory = useCallback(async () => {
     setLoading(true);
     try {
-      let endpoint = `/monitoring/history/${device.id}`;
       if (dateRange) {
-        endpoint = `/monitoring/filter/${device.id}?start=${dateRange.start}&end=${dateRange.end}`;
+        // Server-side buckets (~200 per range): avg per bucket instead of sampling raw points
+        const span = (new Date(dateRange.end).getTime() - new Date(dateRange.start).getTime()) / 1000;
+        const bucket = Math.max(60, Math.ceil(span / 200 / 60) * 60);
+        const response = await api.get(
+          `/monitoring/stats/${device.id}?start=${dateRange.start}&end=${dateRange.end}&bucket=${bucket}`
+        );
+        setHistory(response.data.buckets.map((b: any) => {
+          const f = b.fields;
+          const resolvedCpu = f.cpu?.avg ?? f.cpu_load?.avg;
+          return {
+            timestamp: b.timestamp,
+            value: f.value?.avg ?? f.load?.avg ?? resolvedCpu ?? 0,
+            cpu: resolvedCpu,
+            ram: f.ram?.avg,
+            disk: f.disk?.avg ?? f.storage?.avg,
+            deviceId: device.id.toString()
+          };
+        }));
+        return;
       }
 
-      const response = await api.get(endpoint);
+      const response = await api.get(`/monitoring/history/${device.id}`);
       const rawData = response.data.history || response.data;
 
-      let parsedData = rawData.map((item: any) => {
+      const parsedData = rawData.map((item: any) => {
         const data = item.data;
         const nestedMetrics = data.metrics || {};
         const resolvedCpu = data.cpu ?? data.cpu_load ?? nestedMetrics.cpu;
@@ -57,12 +74,6 @@ const DeviceAnalyticsCard: React.FC<{
         };
       }).sort((a: any, b: any) => new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime());
 
-      // SAMPLING LOGIC: If we have too many points, sample it down to ~200 points for the preview
-      if (parsedData.length > 200) {
-        const step = Math.ceil(parsedData.length / 200);
-        parsedData = parsedData.filter((_, idx) => idx % step === 0);
-      }
-
       setHistory(parsedData);
     } catch (err) {
       console.error(`Failed to fetch history for device ${device.id}:`, err);
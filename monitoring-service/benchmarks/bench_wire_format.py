@@ -0,0 +1,78 @@
+"""
+Micro-benchmark of the device metric wire formats (helpers/wire_format.py):
+payload size, encode time and decode + validate time per message, JSON vs binary v1.
+
+JSON messages are built the way the simulator does (pre-encoded device prefix +
+readings); decoding goes through decode_metric, the consumer entry point.
+
+    python benchmarks/bench_wire_format.py [--messages 100000] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from helpers.wire_format import decode_metric, encode_metric
+
+IOT_TOPIC = "device/iot/temperature"
+END_TOPIC = "device/end/server"
+
+def sample(count: int):
+    """(topic, device_id, owner_id, ts, values) tuples, 80% IoT readings and 20% end devices."""
+    ts = time.time()
+    rows = []
+    for i in range(count):
+        if i % 5:
+            rows.append((IOT_TOPIC, i + 1, i % 50 + 1, ts, (round(random.uniform(15.0, 35.0), 2),)))
+        else:
+            rows.append((END_TOPIC, i + 1, i % 50 + 1, ts, (12.5, 61.3, 48.0)))
+    return rows
+
+def encode_json(topic: str, device_id: int, owner_id: int, ts: float, values: tuple) -> bytes:
+    prefix = json.dumps({"device_id": device_id, "name": f"device-{device_id}", "owner_id": owner_id})[:-1]
+    if topic == END_TOPIC:
+        metrics = {"cpu": values[0], "ram": values[1], "storage": values[2]}
+        return f'{prefix}, "metrics": {json.dumps(metrics)}, "unit": "%", "timestamp": {ts}}}'.encode()
+    return f'{prefix}, "value": {values[0]}, "unit": "°C", "timestamp": {ts}}}'.encode()
+
+def timed(fn, repeat: int) -> float:
+    """Best of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = sample(args.messages)
+    results = {}
+    for name, encode in (("json", encode_json), ("binary", encode_metric)):
+        payloads = [(row[0], encode(*row)) for row in rows]
+        encode_s = timed(lambda: [encode(*row) for row in rows], args.repeat)
+        decode_s = timed(lambda: [decode_metric(topic, payload) for topic, payload in payloads], args.repeat)
+        size = sum(len(payload) for _, payload in payloads) / len(payloads)
+        results[name] = (size, encode_s, decode_s)
+
+    n = args.messages
+    print(f"{n} messages, best of {args.repeat}")
+    print(f"{'format':<8} {'bytes/msg':>10} {'encode us/msg':>14} {'decode+validate us/msg':>23}")
+    for name, (size, encode_s, decode_s) in results.items():
+        print(f"{name:<8} {size:>10.1f} {encode_s / n * 1e6:>14.2f} {decode_s / n * 1e6:>23.2f}")
+
+    json_size, json_enc, json_dec = results["json"]
+    bin_size, bin_enc, bin_dec = results["binary"]
+    print(f"binary vs json: {json_size / bin_size:.1f}x smaller, "
+          f"encode {json_enc / bin_enc:.1f}x, decode+validate {json_dec / bin_dec:.1f}x faster")
+
+if __name__ == "__main__":
+    main()
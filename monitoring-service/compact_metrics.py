@@ -0,0 +1,70 @@
+"""
+One-shot compaction of the metrics written before the normalized layout.
+
+    python compact_metrics.py [--compact]
+
+1. fills `device_meta` (name, unit, topic, owner_id per device) from the latest
+   legacy reading of each device,
+2. removes the now redundant fields from the stored readings (top-level topic,
+   data.device_id/owner_id/name/unit/timestamp); in-place updates of a
+   time-series collection need MongoDB 7.0+,
+3. --compact runs the `compact` command so the freed space is returned to the OS.
+
+Reads keep working during and after the job: they rebuild the full document
+shape from device_meta and accept both layouts.
+"""
+import argparse
+import asyncio
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+from helpers.mongo_config import db, ensure_indexes
+from dal.monitoring_dao import REDUNDANT_DATA_FIELDS
+
+LEGACY_FILTER = {"$or": [{"topic": {"$exists": True}}, {"data.device_id": {"$exists": True}}]}
+
+async def collect_device_meta() -> int:
+    pipeline = [
+        {"$match": LEGACY_FILTER},
+        {"$sort": {"timestamp": 1}},
+        {"$group": {
+            "_id": "$meta.device_id",
+            "owner_id": {"$last": "$meta.owner_id"},
+            "topic": {"$last": "$topic"},
+            "name": {"$last": "$data.name"},
+            "unit": {"$last": "$data.unit"},
+        }},
+    ]
+    operations = []
+    async for doc in db.metrics.aggregate(pipeline, allowDiskUse=True):
+        device_id = doc.pop("_id")
+        meta = {name: value for name, value in doc.items() if value is not None}
+        # Attributes written by the live ingestion are newer: only fill the gaps
+        operations.append(UpdateOne({"_id": device_id}, {"$setOnInsert": meta}, upsert=True))
+    if operations:
+        await db.device_meta.bulk_write(operations, ordered=False)
+    return len(operations)
+
+async def compact(run_compact: bool):
+    await ensure_indexes()
+
+    devices = await collect_device_meta()
+    print(f"[COMPACTION] device_meta filled for {devices} devices")
+
+    unset = {"topic": ""}
+    unset.update({f"data.{name}": "" for name in REDUNDANT_DATA_FIELDS})
+    try:
+        result = await db.metrics.update_many(LEGACY_FILTER, {"$unset": unset})
+        print(f"[COMPACTION] {result.modified_count} readings compacted")
+    except OperationFailure as e:
+        print(f"[COMPACTION] In-place update refused ({e}); MongoDB 7.0+ is required for time-series updates")
+        return
+
+    if run_compact:
+        await db.command("compact", "metrics")
+        print("[COMPACTION] Storage compacted")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move static device attributes out of the stored metrics")
+    parser.add_argument("--compact", action="store_true", help="run the compact command afterwards")
+    args = parser.parse_args()
+    asyncio.run(compact(args.compact))
@@ -0,0 +1,53 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import APIRouter, Depends, HTTPException
+from typing import List
+from helpers.mongo_config import get_db
+from helpers.auth_helper import get_current_user
+from helpers.rule_engine import rule_engine
+from dal import alert_dao
+from dto.alert_dto import AlertRuleCreate, AlertRuleResponse
+from controllers.monitoring_controller import owner_scope
+
+router = APIRouter(prefix="/monitoring/rules", tags=["alerts"])
+
+def _to_response(doc: dict) -> AlertRuleResponse:
+    return AlertRuleResponse(id=str(doc["_id"]), **{k: v for k, v in doc.items() if k != "_id"})
+
+@router.post("", response_model=AlertRuleResponse, status_code=201)
+async def create_rule(
+    rule: AlertRuleCreate,
+    db = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Creates an alert rule. It only matches the caller's devices (admin rules
+    match every device). Alerts are pushed on Socket.io (`alert` event) and
+    on MQTT (alerts/{owner_id}/{device_id}).
+    """
+    doc = await alert_dao.create_rule(db, {**rule.model_dump(), "owner_id": owner_scope(user)})
+    # This replica applies it right away, the others at their next reload
+    await rule_engine.reload()
+    return _to_response(doc)
+
+@router.get("", response_model=List[AlertRuleResponse])
+async def get_rules(
+    db = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """Rules of the caller (every rule for admins)."""
+    return [_to_response(doc) for doc in await alert_dao.get_rules(db, owner_scope(user))]
+
+@router.delete("/{rule_id}", status_code=204)
+async def delete_rule(
+    rule_id: str,
+    db = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    try:
+        object_id = ObjectId(rule_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    if not await alert_dao.delete_rule(db, object_id, owner_scope(user)):
+        raise HTTPException(status_code=404, detail="Rule not found")
+    await rule_engine.reload()
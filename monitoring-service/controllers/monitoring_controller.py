@@ -1,14 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
+import re
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from helpers.mongo_config import get_db
 from dal import monitoring_dao
-from dto.monitoring_dto import HistoryResponse, MetricResponse
+from dto.monitoring_dto import (
+    HistoryResponse, MetricResponse, DeviceStatsResponse, StatsBucket, FieldStats,
+    HistoryBatchRequest, HistoryBatchResponse
+)
 from datetime import datetime
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from bson import ObjectId
+from bson.errors import InvalidId
 
 from helpers.auth_helper import get_current_user
+from helpers.latest_cache import latest_cache
 
 router = APIRouter(prefix="/monitoring", tags=["monitoring"])
 
+# Statistics endpoints limits
+STATS_MAX_BUCKETS = 2000
+STATS_MAX_DEVICES = 50
+_DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def owner_scope(user: dict) -> Optional[int]:
+    """Owner filter pushed into the Mongo queries; admins read unscoped."""
+    return None if user["is_admin"] else user["user_id"]
+
 @router.get("/weather/current")
 async def get_current_weather(
     db = Depends(get_db),
@@ -22,6 +39,36 @@ async def get_current_weather(
         return {"status": "pending", "message": "Weather data sync in progress"}
     return weather
 
+@router.get("/latest", response_model=List[MetricResponse])
+async def get_latest_metrics(user: dict = Depends(get_current_user)):
+    """
+    Current reading of every device of the user (all devices for admins),
+    served from the latest-value table: no query on the metrics collection.
+    """
+    return [_to_response(metric) for metric in await latest_cache.snapshot(owner_scope(user))]
+
+@router.post("/history/batch", response_model=HistoryBatchResponse)
+async def get_devices_history(
+    request: HistoryBatchRequest,
+    db = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Last `limit` metrics (optionally between `start` and `end`) of several devices
+    in one call, keyed by device id. Devices the caller does not own come back empty.
+    """
+    device_ids = list(dict.fromkeys(request.device_ids))
+    results = await monitoring_dao.get_devices_history(
+        db, device_ids, owner_scope(user), request.limit, request.start, request.end
+    )
+    return HistoryBatchResponse(devices={
+        device_id: HistoryResponse(
+            device_id=device_id,
+            count=len(docs),
+            history=[_to_response(doc) for doc in docs]
+        ) for device_id, docs in results.items()
+    })
+
 @router.get("/history/{device_id}", response_model=HistoryResponse)
 async def get_device_history(
     device_id: int, 
@@ -33,54 +80,102 @@ async def get_device_history(
     Returns the last metrics stored for a device.
     Only owner or admin can access.
     """
-    results = await monitoring_dao.get_device_history(db, device_id, limit)
-    
-    # Filter and format
-    history = []
-    for doc in results:
-        # Check ownership: owner_id must match OR user must be admin
-        if doc.get("owner_id") == user["user_id"] or user["is_admin"]:
-            history.append(MetricResponse(
-                device_id=doc["device_id"],
-                timestamp=doc["timestamp"],
-                owner_id=doc["owner_id"],
-                data=doc["data"]
-            ))
-        
+    results = await monitoring_dao.get_device_history(db, device_id, owner_scope(user), limit)
+
+    history = [MetricResponse(
+        device_id=doc["device_id"],
+        timestamp=doc["timestamp"],
+        owner_id=doc["owner_id"],
+        data=doc["data"]
+    ) for doc in results]
+
     return HistoryResponse(
         device_id=device_id,
         count=len(history),
         history=history
     )
 
+def _to_response(doc: dict) -> MetricResponse:
+    return MetricResponse(
+        device_id=doc["device_id"],
+        timestamp=doc["timestamp"],
+        owner_id=doc["owner_id"],
+        data=doc["data"]
+    )
+
+async def _ndjson(rows: AsyncIterator[dict], chunk_size: int = 500) -> AsyncIterator[str]:
+    """Encodes rows as NDJSON while the cursor is read, in chunks of `chunk_size` lines."""
+    chunk = []
+    async for doc in rows:
+        chunk.append(_to_response(doc).model_dump_json())
+        if len(chunk) >= chunk_size:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+def _parse_cursor(cursor: str) -> Tuple[datetime, Optional[ObjectId]]:
+    """"<iso timestamp>_<row id>" (raw rows) or "<iso timestamp>" -> (before, before_id)."""
+    timestamp, _, row_id = cursor.partition("_")
+    return datetime.fromisoformat(timestamp), ObjectId(row_id) if row_id else None
+
 @router.get("/filter/{device_id}", response_model=List[MetricResponse])
 async def filter_by_date(
     device_id: int,
     start: str,
     end: str,
+    response: Response,
     limit: int = 500,
+    resolution: str = "auto",
+    cursor: Optional[str] = None,
+    stream: bool = False,
     db = Depends(get_db),
     user: dict = Depends(get_current_user)
 ):
     """
-    Filter metrics by ISO date range.
+    Filter metrics by ISO date range, newest first.
+    resolution: auto (default), raw, 1m, 1h or 1d. In auto mode long ranges are
+    served from the rollup collections so at most `limit` buckets are read.
+    Pagination: when a page is full the X-Next-Cursor header holds the cursor
+    to pass as `cursor` for the next (older) page: the timestamp of the last row,
+    followed by `_<id>` for raw rows since several readings can share a timestamp.
+    stream=true returns NDJSON read straight from the Mongo cursor; limit=0
+    then exports the whole range.
     Only owner or admin can access.
     """
+    if resolution != "auto" and resolution != "raw" and resolution not in monitoring_dao.ROLLUP_RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="Invalid resolution (auto, raw, 1m, 1h, 1d)")
+    if limit < 0 or (limit == 0 and not stream):
+        raise HTTPException(status_code=400, detail="limit must be positive (0 is only allowed with stream=true)")
     try:
         start_dt = datetime.fromisoformat(start)
         end_dt = datetime.fromisoformat(end)
-        results = await monitoring_dao.get_metrics_by_date(db, device_id, start_dt, end_dt, limit)
-        
-        # Security check: Filter results where user is owner or admin
-        return [MetricResponse(
-            device_id=doc["device_id"],
-            timestamp=doc["timestamp"],
-            owner_id=doc["owner_id"],
-            data=doc["data"]
-        ) for doc in results if doc.get("owner_id") == user["user_id"] or user["is_admin"]]
-    except ValueError:
+        before, before_id = _parse_cursor(cursor) if cursor else (None, None)
+    except (ValueError, InvalidId):
         raise HTTPException(status_code=400, detail="Invalid date format (ISO required)")
 
+    if resolution == "auto":
+        resolution = monitoring_dao.select_resolution(start_dt, end_dt, limit or 500)
+
+    if stream:
+        rows = monitoring_dao.stream_metrics_by_date(
+            db, device_id, owner_scope(user), start_dt, end_dt, resolution, limit, before, before_id
+        )
+        return StreamingResponse(_ndjson(rows), media_type="application/x-ndjson")
+
+    if resolution == "raw":
+        results = await monitoring_dao.get_metrics_by_date(db, device_id, owner_scope(user), start_dt, end_dt, limit, before, before_id)
+    else:
+        results = await monitoring_dao.get_rollups_by_date(db, device_id, owner_scope(user), start_dt, end_dt, resolution, limit, before)
+
+    if len(results) == limit:
+        last = results[-1]
+        next_cursor = last["timestamp"].isoformat()
+        if "_id" in last:
+            next_cursor += f"_{last['_id']}"
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [_to_response(doc) for doc in results]
+
 @router.get("/user/metrics", response_model=List[MetricResponse])
 async def get_my_metrics(
     limit: int = 50,
@@ -98,3 +193,86 @@ async def get_my_metrics(
         owner_id=doc["owner_id"],
         data=doc["data"]
     ) for doc in results]
+
+def _parse_bucket(bucket: str) -> int:
+    """"90", "30s", "15m", "1h", "1d" -> seconds."""
+    match = re.fullmatch(r"(\d+)([smhd]?)", bucket.strip())
+    if not match or int(match.group(1)) <= 0:
+        raise HTTPException(status_code=400, detail="Invalid bucket (e.g. 30s, 15m, 1h, 1d)")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2) or "s"]
+
+async def _stats(
+    db,
+    device_ids: List[int],
+    user: dict,
+    start: str,
+    end: str,
+    bucket: str,
+    fields: Optional[str]
+) -> List[DeviceStatsResponse]:
+    try:
+        start_dt = datetime.fromisoformat(start)
+        end_dt = datetime.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date format (ISO required)")
+    bucket_seconds = _parse_bucket(bucket)
+    if (end_dt - start_dt).total_seconds() / bucket_seconds > STATS_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Too many buckets (max {STATS_MAX_BUCKETS}), use a larger bucket")
+
+    field_names = [name.strip() for name in fields.split(",") if name.strip()] if fields else None
+    source, rows = await monitoring_dao.get_device_stats(
+        db, device_ids, owner_scope(user), start_dt, end_dt, bucket_seconds, field_names
+    )
+
+    # Rows come sorted by device, bucket and field
+    buckets: Dict[int, Dict[datetime, Dict[str, FieldStats]]] = {device_id: {} for device_id in device_ids}
+    for row in rows:
+        per_bucket = buckets.setdefault(row["device_id"], {}).setdefault(row["timestamp"], {})
+        per_bucket[row["field"]] = FieldStats(
+            count=row["count"], min=row["min"], max=row["max"], avg=row["avg"], stddev=row["stddev"]
+        )
+    return [DeviceStatsResponse(
+        device_id=device_id,
+        source=source,
+        bucket_seconds=bucket_seconds,
+        buckets=[StatsBucket(timestamp=ts, fields=stats) for ts, stats in per_device.items()]
+    ) for device_id, per_device in buckets.items()]
+
+@router.get("/stats", response_model=List[DeviceStatsResponse])
+async def get_devices_stats(
+    start: str,
+    end: str,
+    device_ids: List[int] = Query(...),
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    db = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    Same as /stats/{device_id} for several devices (?device_ids=1&device_ids=2)
+    in a single aggregation. Devices the caller does not own come back empty.
+    """
+    if len(device_ids) > STATS_MAX_DEVICES:
+        raise HTTPException(status_code=400, detail=f"At most {STATS_MAX_DEVICES} devices per request")
+    return await _stats(db, list(dict.fromkeys(device_ids)), user, start, end, bucket, fields)
+
+@router.get("/stats/{device_id}", response_model=DeviceStatsResponse)
+async def get_device_stats(
+    device_id: int,
+    start: str,
+    end: str,
+    bucket: str = "1h",
+    fields: Optional[str] = None,
+    db = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    """
+    count/min/max/avg/stddev of each numeric reading (value, cpu, ram, storage...)
+    per time bucket (epoch-aligned, e.g. 15m, 1h, 1d), computed server side.
+    Served from the 1m/1h/1d rollups when one of them tiles the bucket and still
+    covers `start`, from the raw metrics otherwise. The range is inclusive like
+    /filter, and every bucket intersecting it is returned whole, whatever the source.
+    fields=value,cpu restricts the readings.
+    Only owner or admin can access.
+    """
+    return (await _stats(db, [device_id], user, start, end, bucket, fields))[0]
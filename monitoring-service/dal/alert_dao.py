@@ -0,0 +1,28 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+from datetime import datetime
+from typing import List, Optional
+
+async def create_rule(db: AsyncIOMotorDatabase, rule: dict) -> dict:
+    """Stores an alert rule (enabled) and returns it with its _id."""
+    doc = {**rule, "enabled": True, "created_at": datetime.utcnow()}
+    result = await db.alert_rules.insert_one(doc)
+    doc["_id"] = result.inserted_id
+    return doc
+
+async def get_rules(db: AsyncIOMotorDatabase, owner_id: Optional[int]) -> List[dict]:
+    """Rules of an owner; owner_id=None (admin) returns every rule."""
+    query = {} if owner_id is None else {"owner_id": owner_id}
+    return await db.alert_rules.find(query).sort("created_at", -1).to_list(length=None)
+
+async def delete_rule(db: AsyncIOMotorDatabase, rule_id: ObjectId, owner_id: Optional[int]) -> bool:
+    """Deletes a rule of `owner_id` (any rule for owner_id=None). Returns False if none matched."""
+    query = {"_id": rule_id}
+    if owner_id is not None:
+        query["owner_id"] = owner_id
+    result = await db.alert_rules.delete_one(query)
+    return result.deleted_count > 0
+
+async def get_enabled_rules(db: AsyncIOMotorDatabase) -> List[dict]:
+    """Every enabled rule, loaded into the rule engine index."""
+    return await db.alert_rules.find({"enabled": True}).to_list(length=None)
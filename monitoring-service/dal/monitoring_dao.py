@@ -1,59 +1,542 @@
+import asyncio
+import math
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from bson import ObjectId
+from pymongo import ReplaceOne, UpdateOne
 from entities.metrics import Metric
-from datetime import datetime
-from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set, Tuple
+from helpers.mongo_config import METRICS_RETENTION_DAYS, ROLLUP_RETENTION_DAYS
+
+# Rollup resolutions (collection suffix -> bucket size in seconds)
+ROLLUP_RESOLUTIONS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+# Raw ranges up to this size are served from the metrics collection directly
+RAW_MAX_RANGE = timedelta(minutes=15)
+
+# Rollup documents carrying sum of squares (stddev); older buckets only have min/max/sum/count
+ROLLUP_SCHEMA = 2
+
+# Payload keys that are not readings (legacy documents still carry them in `data`)
+NON_READING_FIELDS = ["device_id", "owner_id", "timestamp", "metrics"]
+
+# Payload keys already stored elsewhere (metaField, top-level timestamp, device_meta)
+REDUNDANT_DATA_FIELDS = ("device_id", "owner_id", "name", "unit", "timestamp")
+
+# Rebuilds the historical document shape from the time-series layout
+METRIC_PROJECTION = {
+    "_id": 0,
+    "device_id": "$meta.device_id",
+    "owner_id": "$meta.owner_id",
+    "timestamp": 1,
+    "data": 1,
+}
+
+def _device_query(device_id: int, owner_id: Optional[int], prefix: str = "meta.") -> dict:
+    """
+    Filter for one device. `owner_id` scopes the query to that owner;
+    None is the unscoped (admin) path.
+    """
+    query = {f"{prefix}device_id": device_id}
+    if owner_id is not None:
+        query[f"{prefix}owner_id"] = owner_id
+    return query
+
+def _to_document(metric: Metric) -> dict:
+    """
+    Normalized time-series layout: device_id/owner_id go to the metaField,
+    `data` only keeps the readings (name/unit/topic live in device_meta).
+    """
+    return {
+        "meta": {"device_id": metric.device_id, "owner_id": metric.owner_id},
+        "data": {name: value for name, value in metric.data.items() if name not in REDUNDANT_DATA_FIELDS},
+        "timestamp": metric.timestamp,
+    }
+
+def device_meta(metric: Metric) -> dict:
+    """Static attributes of the device that sent `metric` (missing ones are left out)."""
+    meta = {"owner_id": metric.owner_id, "topic": metric.topic}
+    for name in ("name", "unit"):
+        if metric.data.get(name) is not None:
+            meta[name] = metric.data[name]
+    return meta
+
+def _rebuild(doc: dict, meta: Optional[dict]) -> dict:
+    """
+    Normalized reading + device metadata -> the historical document shape
+    (`data` holding device_id, name, owner_id, readings, unit and timestamp).
+    Documents written before the compaction already carry everything in `data`.
+    """
+    meta = meta or {}
+    data = {"device_id": doc["device_id"], "owner_id": doc["owner_id"]}
+    if "name" in meta:
+        data["name"] = meta["name"]
+    data.update(doc["data"])
+    if "unit" in meta:
+        data.setdefault("unit", meta["unit"])
+    data.setdefault("timestamp", doc["timestamp"].replace(tzinfo=timezone.utc).timestamp())
+    rebuilt = {**doc, "data": data}
+    if "topic" in meta:
+        rebuilt.setdefault("topic", meta["topic"])
+    return rebuilt
+
+async def upsert_device_meta(db: AsyncIOMotorDatabase, metrics: List[Metric], known: Optional[Dict[int, dict]] = None):
+    """
+    Upserts the static attributes of the devices of a batch (last metric wins).
+    `known` (device_id -> attributes last written, updated in place) skips the
+    devices whose attributes did not change, so steady ingestion writes nothing.
+    """
+    latest = {metric.device_id: device_meta(metric) for metric in metrics}
+    if known is not None:
+        latest = {device_id: meta for device_id, meta in latest.items() if known.get(device_id) != meta}
+    if not latest:
+        return
+    await db.device_meta.bulk_write([
+        UpdateOne({"_id": device_id}, {"$set": meta}, upsert=True) for device_id, meta in latest.items()
+    ], ordered=False)
+    if known is not None:
+        known.update(latest)
+
+async def get_device_meta(db: AsyncIOMotorDatabase, device_ids: Iterable[int]) -> Dict[int, dict]:
+    ids = list(set(device_ids))
+    if not ids:
+        return {}
+    return {doc.pop("_id"): doc async for doc in db.device_meta.find({"_id": {"$in": ids}})}
+
+async def get_owned_device_ids(db: AsyncIOMotorDatabase, device_ids: Iterable[int], owner_id: Optional[int]) -> Set[int]:
+    """
+    Devices of `device_ids` known in device_meta and owned by `owner_id` (None = any owner, admin),
+    in one query. device_meta is written from the creation event, before the first metric.
+    """
+    ids = list(set(device_ids))
+    if not ids:
+        return set()
+    query = {"_id": {"$in": ids}}
+    if owner_id is not None:
+        query["owner_id"] = owner_id
+    return {doc["_id"] async for doc in db.device_meta.find(query, {"_id": 1})}
+
+async def with_device_meta(db: AsyncIOMotorDatabase, docs: List[dict]) -> List[dict]:
+    """Rebuilds the full shape of a page of readings with one device_meta lookup."""
+    metas = await get_device_meta(db, (doc["device_id"] for doc in docs))
+    return [_rebuild(doc, metas.get(doc["device_id"])) for doc in docs]
+
+def numeric_fields(data: dict) -> dict:
+    """
+    Numeric readings of a metric payload: top-level values (value, ...) and
+    the nested end-device `metrics` object (cpu, ram, storage).
+    """
+    fields = {}
+    for source in (data, data.get("metrics")):
+        if not isinstance(source, dict):
+            continue
+        for name, value in source.items():
+            if name in ("device_id", "owner_id", "timestamp"):
+                continue
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                fields[name] = value
+    return fields
+
+def bucket_start(ts: datetime, seconds: int) -> datetime:
+    epoch = datetime(1970, 1, 1, tzinfo=ts.tzinfo)
+    offset = int((ts - epoch).total_seconds()) // seconds * seconds
+    return epoch + timedelta(seconds=offset)
+
+def retains(resolution: str, start_date: datetime) -> bool:
+    """True if the TTL of `resolution` ("raw" or a rollup) still keeps data from `start_date`."""
+    days = METRICS_RETENTION_DAYS if resolution == "raw" else ROLLUP_RETENTION_DAYS[resolution]
+    if days <= 0:
+        return True
+    if start_date.tzinfo is not None:
+        start_date = start_date.astimezone(timezone.utc).replace(tzinfo=None)
+    return start_date >= datetime.utcnow() - timedelta(days=days)
+
+def select_resolution(start_date: datetime, end_date: datetime, max_points: int) -> str:
+    """
+    Picks the finest resolution that returns at most `max_points` buckets
+    for the requested range ("raw" for short ranges) among those whose
+    retention still covers `start_date` (e.g. 1m rollups are gone after 7 days:
+    older ranges go to 1h). The coarsest resolution when none fits.
+    """
+    span = (end_date - start_date).total_seconds()
+    candidates = ["raw"] if span <= RAW_MAX_RANGE.total_seconds() else []
+    candidates += [resolution for resolution, seconds in ROLLUP_RESOLUTIONS.items() if span / seconds <= max_points]
+    for resolution in candidates:
+        if retains(resolution, start_date):
+            return resolution
+    return "1d"
 
 async def insert_metric(db: AsyncIOMotorDatabase, metric: Metric):
     """
     Inserts a single metric into the 'metrics' collection.
     """
-    # Convert Pydantic model to dictionary for MongoDB
-    metric_dict = metric.model_dump()
-    await db.metrics.insert_one(metric_dict)
+    await db.metrics.insert_one(_to_document(metric))
+
+async def insert_metrics(db: AsyncIOMotorDatabase, metrics: List[Metric]):
+    """
+    Inserts a batch of metrics in one round trip.
+    Unordered so a single bad document does not stop the rest of the batch.
+    """
+    if not metrics:
+        return
+    await db.metrics.insert_many([_to_document(metric) for metric in metrics], ordered=False)
+
+def add_to_bucket(acc: dict, fields: dict):
+    """Folds the numeric readings of one metric into a rollup bucket accumulator."""
+    acc["count"] += 1
+    for name, value in fields.items():
+        stats = acc["fields"].get(name)
+        if stats is None:
+            acc["fields"][name] = {"min": value, "max": value, "sum": value, "sumsq": value * value, "count": 1}
+        else:
+            stats["min"] = min(stats["min"], value)
+            stats["max"] = max(stats["max"], value)
+            stats["sum"] += value
+            stats["sumsq"] += value * value
+            stats["count"] += 1
+
+def new_bucket(owner_id: int) -> dict:
+    return {"owner_id": owner_id, "count": 0, "fields": {}}
+
+async def update_rollups(db: AsyncIOMotorDatabase, metrics: List[Metric]):
+    """
+    Folds a batch of metrics into the 1m/1h/1d rollup collections.
+    The batch is pre-aggregated per (device, bucket) so each resolution costs
+    one bulk_write with one upsert per touched bucket.
+    The upserts increment: only pass metrics that were stored, exactly once.
+    """
+    readings = [(metric, numeric_fields(metric.data)) for metric in metrics]
+    readings = [(metric, fields) for metric, fields in readings if fields]
+    if not readings:
+        return
+
+    for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+        buckets = {}
+        for metric, fields in readings:
+            key = (metric.device_id, bucket_start(metric.timestamp, seconds))
+            add_to_bucket(buckets.setdefault(key, new_bucket(metric.owner_id)), fields)
+
+        operations = []
+        for (device_id, bucket), acc in buckets.items():
+            inc = {"count": acc["count"]}
+            mins, maxs = {}, {}
+            for name, stats in acc["fields"].items():
+                inc[f"fields.{name}.sum"] = stats["sum"]
+                inc[f"fields.{name}.sumsq"] = stats["sumsq"]
+                inc[f"fields.{name}.count"] = stats["count"]
+                mins[f"fields.{name}.min"] = stats["min"]
+                maxs[f"fields.{name}.max"] = stats["max"]
+            operations.append(UpdateOne(
+                {"device_id": device_id, "bucket": bucket},
+                {"$setOnInsert": {"owner_id": acc["owner_id"], "schema": ROLLUP_SCHEMA}, "$inc": inc, "$min": mins, "$max": maxs},
+                upsert=True
+            ))
+        await db[f"metrics_{resolution}"].bulk_write(operations, ordered=False)
+
+async def replace_rollups(db: AsyncIOMotorDatabase, resolution: str, buckets: Dict[Tuple[int, datetime], dict]):
+    """
+    Writes complete rollup buckets ((device_id, bucket) -> accumulator built with
+    add_to_bucket), replacing whatever the buckets held: writing them again is a no-op.
+    """
+    if not buckets:
+        return
+    operations = [
+        ReplaceOne(
+            {"device_id": device_id, "bucket": bucket},
+            {"device_id": device_id, "bucket": bucket, "schema": ROLLUP_SCHEMA, **acc},
+            upsert=True
+        )
+        for (device_id, bucket), acc in buckets.items()
+    ]
+    await db[f"metrics_{resolution}"].bulk_write(operations, ordered=False)
 
-async def get_device_history(db: AsyncIOMotorDatabase, device_id: int, limit: int = 100) -> List[dict]:
+def _rollup_to_metric(doc: dict, resolution: str) -> dict:
+    """
+    Rollup bucket -> metric-shaped dict: `data` holds the average of each field
+    (so charts read it like a raw point) plus the full stats.
+    """
+    data = {"resolution": resolution, "count": doc.get("count", 0), "stats": {}}
+    for name, stats in doc.get("fields", {}).items():
+        avg = stats["sum"] / stats["count"] if stats.get("count") else None
+        data[name] = avg
+        data["stats"][name] = {"min": stats.get("min"), "max": stats.get("max"), "avg": avg, "count": stats.get("count", 0)}
+    return {
+        "device_id": doc["device_id"],
+        "owner_id": doc["owner_id"],
+        "timestamp": doc["bucket"],
+        "data": data,
+    }
+
+async def get_device_history(
+    db: AsyncIOMotorDatabase,
+    device_id: int,
+    owner_id: Optional[int],
+    limit: int = 100
+) -> List[dict]:
     """
     Retrieves the last N metrics for a specific device with projection for performance.
+    Pass owner_id=None only for admin reads.
     """
     cursor = db.metrics.find(
-        {"device_id": device_id},
-        {"_id": 0, "device_id": 1, "timestamp": 1, "owner_id": 1, "data": 1}
+        _device_query(device_id, owner_id),
+        METRIC_PROJECTION
     ).sort("timestamp", -1).limit(limit)
-    return await cursor.to_list(length=limit)
+    return await with_device_meta(db, await cursor.to_list(length=limit))
+
+async def get_devices_history(
+    db: AsyncIOMotorDatabase,
+    device_ids: List[int],
+    owner_id: Optional[int],
+    limit: int = 50,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None
+) -> Dict[int, List[dict]]:
+    """
+    Last `limit` metrics of each device (optionally within a date range), newest first.
+    One indexed, limited query per device run concurrently (a single $in would read
+    every point of every device before limiting), then one device_meta lookup for all.
+    Pass owner_id=None only for admin reads.
+    """
+    async def fetch(device_id: int) -> List[dict]:
+        query = _device_query(device_id, owner_id)
+        if start_date is not None or end_date is not None:
+            query["timestamp"] = {}
+            if start_date is not None:
+                query["timestamp"]["$gte"] = start_date
+            if end_date is not None:
+                query["timestamp"]["$lte"] = end_date
+        return await db.metrics.find(query, METRIC_PROJECTION).sort("timestamp", -1).limit(limit).to_list(length=limit)
+
+    pages = await asyncio.gather(*(fetch(device_id) for device_id in device_ids))
+    rebuilt = iter(await with_device_meta(db, [doc for page in pages for doc in page]))
+    return {device_id: [next(rebuilt) for _ in page] for device_id, page in zip(device_ids, pages)}
+
+def _metrics_by_date_cursor(
+    db: AsyncIOMotorDatabase,
+    device_id: int,
+    owner_id: Optional[int],
+    start_date: datetime,
+    end_date: datetime,
+    resolution: str,
+    limit: int,
+    before: Optional[datetime],
+    before_id: Optional[ObjectId] = None
+):
+    """
+    Motor cursor over raw metrics or rollup buckets, newest first.
+    `before` is the keyset cursor (timestamp of the last row of the previous page);
+    raw rows also take `before_id`, the _id of that row, since several readings can
+    share a timestamp (rollups have one bucket per device and timestamp).
+    limit=0 means no limit.
+    """
+    if resolution == "raw":
+        query = _device_query(device_id, owner_id)
+        query["timestamp"] = {"$gte": start_date, "$lte": end_date}
+        if before is not None and before_id is not None:
+            query["$or"] = [{"timestamp": {"$lt": before}}, {"timestamp": before, "_id": {"$lt": before_id}}]
+        elif before is not None:
+            query["timestamp"]["$lt"] = before
+        projection = {**METRIC_PROJECTION, "_id": 1}
+        return db.metrics.find(query, projection).sort([("timestamp", -1), ("_id", -1)]).limit(limit)
+
+    query = _device_query(device_id, owner_id, prefix="")
+    query["bucket"] = {
+        "$gte": bucket_start(start_date, ROLLUP_RESOLUTIONS[resolution]),
+        "$lte": end_date
+    }
+    if before is not None:
+        query["bucket"]["$lt"] = before
+    return db[f"metrics_{resolution}"].find(query, {"_id": 0}).sort("bucket", -1).limit(limit)
 
 async def get_metrics_by_date(
-    db: AsyncIOMotorDatabase, 
-    device_id: int, 
-    start_date: datetime, 
+    db: AsyncIOMotorDatabase,
+    device_id: int,
+    owner_id: Optional[int],
+    start_date: datetime,
     end_date: datetime,
-    limit: int = 500
+    limit: int = 500,
+    before: Optional[datetime] = None,
+    before_id: Optional[ObjectId] = None
 ) -> List[dict]:
     """
     Retrieves metrics for a device between two dates with limit and projection.
+    Pass owner_id=None only for admin reads.
     """
-    query = {
-        "device_id": device_id,
-        "timestamp": {
-            "$gte": start_date,
-            "$lte": end_date
-        }
-    }
     # Sort DESC to get LATEST metrics first, then limit to avoid timeout
-    cursor = db.metrics.find(
-        query,
-        {"_id": 0, "device_id": 1, "timestamp": 1, "owner_id": 1, "data": 1}
-    ).sort("timestamp", -1).limit(limit)
-    return await cursor.to_list(length=limit)
+    cursor = _metrics_by_date_cursor(db, device_id, owner_id, start_date, end_date, "raw", limit, before, before_id)
+    return await with_device_meta(db, await cursor.to_list(length=limit))
+
+async def get_rollups_by_date(
+    db: AsyncIOMotorDatabase,
+    device_id: int,
+    owner_id: Optional[int],
+    start_date: datetime,
+    end_date: datetime,
+    resolution: str,
+    limit: int = 500,
+    before: Optional[datetime] = None
+) -> List[dict]:
+    """
+    Retrieves pre-aggregated buckets for a device between two dates, newest first.
+    Pass owner_id=None only for admin reads.
+    """
+    cursor = _metrics_by_date_cursor(db, device_id, owner_id, start_date, end_date, resolution, limit, before)
+    return [_rollup_to_metric(doc, resolution) for doc in await cursor.to_list(length=limit)]
+
+async def stream_metrics_by_date(
+    db: AsyncIOMotorDatabase,
+    device_id: int,
+    owner_id: Optional[int],
+    start_date: datetime,
+    end_date: datetime,
+    resolution: str = "raw",
+    limit: int = 0,
+    before: Optional[datetime] = None,
+    before_id: Optional[ObjectId] = None,
+    batch_size: int = 1000
+) -> AsyncIterator[dict]:
+    """
+    Same rows as get_metrics_by_date/get_rollups_by_date, yielded as the
+    cursor batches arrive instead of being collected in a list.
+    """
+    meta = (await get_device_meta(db, [device_id])).get(device_id) if resolution == "raw" else None
+    cursor = _metrics_by_date_cursor(db, device_id, owner_id, start_date, end_date, resolution, limit, before, before_id)
+    async for doc in cursor.batch_size(batch_size):
+        yield _rebuild(doc, meta) if resolution == "raw" else _rollup_to_metric(doc, resolution)
 
 async def get_user_metrics(db: AsyncIOMotorDatabase, owner_id: int, limit: int = 100) -> List[dict]:
     """
     Retrieves latest metrics for all devices of a user with projection.
     """
     cursor = db.metrics.find(
-        {"owner_id": owner_id},
-        {"_id": 0, "device_id": 1, "timestamp": 1, "owner_id": 1, "data": 1}
+        {"meta.owner_id": owner_id},
+        METRIC_PROJECTION
     ).sort("timestamp", -1).limit(limit)
-    return await cursor.to_list(length=limit)
+    return await with_device_meta(db, await cursor.to_list(length=limit))
+
+async def get_latest_metrics(db: AsyncIOMotorDatabase, since: datetime) -> List[dict]:
+    """
+    Latest metric of every device that reported since `since` (latest-value
+    cache warm-up). Bounded by `since` so only the recent buckets are read.
+    """
+    pipeline = [
+        {"$match": {"timestamp": {"$gte": since}}},
+        {"$sort": {"timestamp": 1}},
+        {"$group": {"_id": "$meta.device_id", "doc": {"$last": "$$ROOT"}}},
+        {"$replaceRoot": {"newRoot": "$doc"}},
+        {"$project": {**METRIC_PROJECTION, "topic": 1}},
+    ]
+    return await with_device_meta(db, await db.metrics.aggregate(pipeline, allowDiskUse=True).to_list(length=None))
+
+def stats_source(bucket_seconds: int, start_date: datetime) -> str:
+    """
+    Coarsest rollup resolution whose buckets tile `bucket_seconds` exactly and
+    whose retention still covers `start_date` ("raw" when none does, e.g.
+    sub-minute buckets, or 15m buckets older than the 1m rollups).
+    """
+    for resolution, seconds in reversed(ROLLUP_RESOLUTIONS.items()):
+        if bucket_seconds % seconds == 0 and retains(resolution, start_date):
+            return resolution
+    return "raw"
+
+def _bucket_expr(field: str, bucket_seconds: int) -> dict:
+    """Epoch-aligned start of the `bucket_seconds` bucket holding `field` (same as bucket_start)."""
+    millis = {"$toLong": field}
+    size = bucket_seconds * 1000
+    return {"$toDate": {"$subtract": [millis, {"$mod": [millis, size]}]}}
+
+async def get_device_stats(
+    db: AsyncIOMotorDatabase,
+    device_ids: List[int],
+    owner_id: Optional[int],
+    start_date: datetime,
+    end_date: datetime,
+    bucket_seconds: int,
+    fields: Optional[List[str]] = None
+) -> Tuple[str, List[dict]]:
+    """
+    count/min/max/avg/stddev of each numeric reading per device and time bucket,
+    computed in one aggregation. Served from the rollups when a retained resolution
+    tiles the bucket size, from the raw metrics otherwise.
+    Both sources return the whole buckets intersecting [start_date, end_date]
+    (inclusive, like /filter): the first bucket may start before start_date.
+    Returns (source, rows) with rows {"device_id", "timestamp", "field", "count",
+    "min", "max", "avg", "stddev"} sorted by device and bucket.
+    Pass owner_id=None only for admin reads.
+    """
+    first = bucket_start(start_date, bucket_seconds)
+    stop = bucket_start(end_date, bucket_seconds) + timedelta(seconds=bucket_seconds)
+    source = stats_source(bucket_seconds, first)
+    field_filter = {"f.k": {"$in": fields}} if fields else {}
+
+    if source == "raw":
+        match = {"meta.device_id": {"$in": device_ids}, "timestamp": {"$gte": first, "$lt": stop}}
+        if owner_id is not None:
+            match["meta.owner_id"] = owner_id
+        pipeline = [
+            {"$match": match},
+            # Top-level readings (value, ...) and the end-device metrics object as one k/v list
+            {"$project": {
+                "device_id": "$meta.device_id",
+                "t": _bucket_expr("$timestamp", bucket_seconds),
+                "f": {"$objectToArray": {"$mergeObjects": ["$data", {"$ifNull": ["$data.metrics", {}]}]}},
+            }},
+            {"$unwind": "$f"},
+            {"$match": {"f.k": {"$nin": NON_READING_FIELDS}, "f.v": {"$type": "number"}, **field_filter}},
+            {"$group": {
+                "_id": {"device_id": "$device_id", "t": "$t", "field": "$f.k"},
+                "count": {"$sum": 1},
+                "min": {"$min": "$f.v"},
+                "max": {"$max": "$f.v"},
+                "avg": {"$avg": "$f.v"},
+                "stddev": {"$stdDevPop": "$f.v"},
+            }},
+        ]
+        collection = db.metrics
+    else:
+        match = {
+            "device_id": {"$in": device_ids},
+            "bucket": {"$gte": first, "$lt": stop},
+        }
+        if owner_id is not None:
+            match["owner_id"] = owner_id
+        pipeline = [
+            {"$match": match},
+            {"$project": {
+                "device_id": 1,
+                "t": _bucket_expr("$bucket", bucket_seconds),
+                "complete": {"$eq": ["$schema", ROLLUP_SCHEMA]},
+                "f": {"$objectToArray": "$fields"},
+            }},
+            {"$unwind": "$f"},
+            *([{"$match": field_filter}] if field_filter else []),
+            {"$group": {
+                "_id": {"device_id": "$device_id", "t": "$t", "field": "$f.k"},
+                "count": {"$sum": "$f.v.count"},
+                "sum": {"$sum": "$f.v.sum"},
+                "sumsq": {"$sum": "$f.v.sumsq"},
+                "min": {"$min": "$f.v.min"},
+                "max": {"$max": "$f.v.max"},
+                "complete": {"$min": "$complete"},
+            }},
+        ]
+        collection = db[f"metrics_{source}"]
+
+    pipeline.append({"$sort": {"_id.device_id": 1, "_id.t": 1, "_id.field": 1}})
+    rows = []
+    async for doc in collection.aggregate(pipeline, allowDiskUse=True):
+        key = doc["_id"]
+        row = {"device_id": key["device_id"], "timestamp": key["t"], "field": key["field"],
+               "count": doc["count"], "min": doc["min"], "max": doc["max"]}
+        if source == "raw":
+            row["avg"], row["stddev"] = doc["avg"], doc["stddev"]
+        else:
+            count = doc["count"] or 0
+            row["avg"] = doc["sum"] / count if count else None
+            # Population stddev from the sum of squares (buckets older than ROLLUP_SCHEMA have none)
+            row["stddev"] = math.sqrt(max(0.0, doc["sumsq"] / count - row["avg"] ** 2)) if count and doc["complete"] else None
+        rows.append(row)
+    return source, rows
 
 async def insert_weather(db: AsyncIOMotorDatabase, weather_data: dict):
     """Stores weather snapshot in the weather_logs collection."""
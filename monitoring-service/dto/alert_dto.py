@@ -0,0 +1,30 @@
+from pydantic import BaseModel, Field, model_validator
+from datetime import datetime
+from typing import Literal, Optional
+
+class AlertRuleCreate(BaseModel):
+    """
+    `field` `stat` `op` `threshold` sustained for `for_seconds`, on one device
+    (device_id) or on every device of a type (device_type, e.g. "temperature").
+    stat: value (raw point), ewma, min/max (rolling window) or zscore (spike).
+    """
+    name: str
+    device_id: Optional[int] = None
+    device_type: Optional[str] = None
+    field: str = "value"
+    stat: Literal["value", "ewma", "min", "max", "zscore"] = "value"
+    op: Literal[">", ">=", "<", "<="] = ">"
+    threshold: float
+    for_seconds: float = Field(0, ge=0)
+
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.device_id is None) == (self.device_type is None):
+            raise ValueError("Exactly one of device_id or device_type is required")
+        return self
+
+class AlertRuleResponse(AlertRuleCreate):
+    id: str
+    owner_id: Optional[int]     # None: admin rule, applies to every owner
+    enabled: bool
+    created_at: datetime
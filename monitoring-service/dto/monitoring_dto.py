@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 
@@ -12,3 +12,29 @@ class HistoryResponse(BaseModel):
     device_id: int
     count: int
     history: List[MetricResponse]
+
+class HistoryBatchRequest(BaseModel):
+    device_ids: List[int] = Field(..., min_length=1, max_length=100)
+    limit: int = Field(50, ge=1, le=1000)      # per device
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+
+class HistoryBatchResponse(BaseModel):
+    devices: Dict[int, HistoryResponse]
+
+class FieldStats(BaseModel):
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: Optional[float] = None
+    stddev: Optional[float] = None
+
+class StatsBucket(BaseModel):
+    timestamp: datetime
+    fields: Dict[str, FieldStats]
+
+class DeviceStatsResponse(BaseModel):
+    device_id: int
+    source: str          # raw, 1m, 1h or 1d
+    bucket_seconds: int
+    buckets: List[StatsBucket]
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from prometheus_client import Counter, Histogram
+
+from helpers.token_verifier import TokenVerifier, token_hash
+
+logger = logging.getLogger(__name__)
+
+# Exposed on the existing /metrics endpoint (default Prometheus registry)
+AUTH_CACHE_HITS = Counter("auth_client_cache_hits_total", "Remote token verifications served from the TTL cache")
+AUTH_CACHE_MISSES = Counter("auth_client_cache_misses_total", "Remote token verifications not found in the TTL cache")
+AUTH_COALESCED = Counter("auth_client_coalesced_total", "Verifications that joined an in-flight request for the same token")
+AUTH_LATENCY = Histogram("auth_client_request_seconds", "Latency of /users/verify-token calls to the auth service")
+
+# Answers of /users/verify-token that reject the token (invalid / blacklisted);
+# any other non-200 status is an auth service failure
+REJECTED_STATUSES = {401, 403, 404}
+
+
+class AsyncAuthClient:
+    """
+    Non-blocking client for the auth service /users/verify-token endpoint.
+
+    - one pooled keep-alive httpx.AsyncClient for the whole process,
+    - concurrent verifications of the same token share a single request (singleflight),
+    - successful verifications are cached by token hash for `cache_ttl` seconds
+      (never beyond the token exp), bounded to `cache_size` entries.
+
+    Revocations: while the `revocations` mirror is in sync, a hit on a token
+    revoked since is dropped. While it is stale (the usual reason this
+    fallback runs in AUTH_MODE=local) revocations cannot be seen locally, so
+    a hit is only served if the entry is at most `stale_ttl` seconds old:
+    that bounds how long a logged-out token keeps working.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        revocations: TokenVerifier,
+        cache_size: int = 10000,
+        cache_ttl: float = 30,
+        stale_ttl: float = 5,
+        timeout: float = 5,
+        max_connections: int = 100,
+    ):
+        self._base_url = base_url
+        self._revocations = revocations
+        self._cache_size = cache_size
+        self._cache_ttl = cache_ttl
+        self._stale_ttl = min(stale_ttl, cache_ttl)
+        self._timeout = timeout
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+        # token hash -> (claims, expires at, cached at), monotonic times
+        self._cache: "OrderedDict[str, tuple[dict, float, float]]" = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self._base_url, timeout=self._timeout, limits=self._limits)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def verify(self, token: str) -> Optional[dict]:
+        """
+        Returns the token claims, or None if the auth service rejects the token.
+        Raises httpx.HTTPError when the auth service cannot be reached or fails.
+        """
+        key = token_hash(token)
+        cached = self._cached(key)
+        if cached is not None:
+            AUTH_CACHE_HITS.inc()
+            return cached
+        AUTH_CACHE_MISSES.inc()
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch(key, token))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            AUTH_COALESCED.inc()
+        # shield: a cancelled caller must not cancel the request other callers wait on
+        return await asyncio.shield(task)
+
+    def _cached(self, key: str) -> Optional[dict]:
+        cached = self._cache.get(key)
+        if cached is None:
+            return None
+        payload, expires_at, cached_at = cached
+        now = time.monotonic()
+        if self._revocations.is_fresh():
+            usable = expires_at > now and not self._revocations.is_revoked(key)
+        else:
+            usable = expires_at > now and now - cached_at <= self._stale_ttl
+        if not usable:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return payload
+
+    async def _fetch(self, key: str, token: str) -> Optional[dict]:
+        await self.start()
+        with AUTH_LATENCY.time():
+            response = await self._client.post("/users/verify-token", json={"token": token})
+        if response.status_code in REJECTED_STATUSES:
+            return None
+        # 5xx, 429...: surfaced as an auth service error, not as a rejected token
+        response.raise_for_status()
+
+        payload = response.json().get("payload", {})
+        ttl = self._cache_ttl
+        exp = payload.get("exp")
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+        if ttl > 0:
+            now = time.monotonic()
+            self._cache[key] = (payload, now + ttl, now)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return payload
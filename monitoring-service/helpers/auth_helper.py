@@ -1,8 +1,10 @@
-import requests
 import os
+import httpx
 from fastapi import Security, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import logging
+from helpers.token_verifier import TokenVerifier
+from helpers.auth_client import AsyncAuthClient
 
 logger = logging.getLogger(__name__)
 http_bearer = HTTPBearer()
@@ -10,33 +12,71 @@ http_bearer = HTTPBearer()
 # Auth service URL from environment
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://host.docker.internal:8000")
 
-def get_current_user(token: HTTPAuthorizationCredentials = Security(http_bearer)) -> dict:
-    credentials = token.credentials
-    
+# Local JWT verification (must match the auth service SECRET_KEY; no default)
+SECRET_KEY = os.getenv("SECRET_KEY", "")
+AUTH_MODE = os.getenv("AUTH_MODE", "local")  # "local" or "remote"
+# Fail at startup rather than verify tokens against a guessed key
+if AUTH_MODE == "local" and not SECRET_KEY:
+    raise RuntimeError("SECRET_KEY is not set: AUTH_MODE=local needs the auth service signing key")
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+
+# Singleton verifier, started/stopped by the app lifespan
+token_verifier = TokenVerifier(
+    SECRET_KEY,
+    REDIS_HOST,
+    REDIS_PORT,
+    cache_size=int(os.getenv("TOKEN_CACHE_SIZE", 10000)),
+    sync_interval=float(os.getenv("REVOCATION_SYNC_INTERVAL", 30)),
+    max_staleness=float(os.getenv("REVOCATION_MAX_STALENESS", 120)),
+)
+
+# Pooled async client for the remote fallback, closed by the app lifespan.
+# Its cache follows the local revocation mirror (short entries while it is stale)
+auth_client = AsyncAuthClient(
+    AUTH_SERVICE_URL,
+    token_verifier,
+    cache_size=int(os.getenv("AUTH_CLIENT_CACHE_SIZE", 10000)),
+    cache_ttl=float(os.getenv("AUTH_CLIENT_CACHE_TTL", 30)),
+    # Max revocation lag of cached verifications while the revocation mirror is stale
+    stale_ttl=float(os.getenv("AUTH_CLIENT_STALE_TTL", 5)),
+    max_connections=int(os.getenv("AUTH_CLIENT_MAX_CONNECTIONS", 100)),
+)
+
+def _to_user(payload: dict) -> dict:
+    user_id = payload.get("user_id")
+    is_admin = payload.get("role", False)
+
+    if user_id is None:
+        user_id = payload.get("sub")
+
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token response")
+
+    return {"user_id": user_id, "is_admin": is_admin}
+
+async def _verify_remote(credentials: str) -> dict:
     try:
-        response = requests.post(
-            f"{AUTH_SERVICE_URL}/users/verify-token", 
-            json={"token": credentials},
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            payload = data.get("payload", {})
-            
-            user_id = payload.get("user_id")
-            is_admin = payload.get("role", False)
-            
-            if user_id is None:
-                user_id = payload.get("sub")
-                
-            if user_id is None:
-                raise HTTPException(status_code=401, detail="Invalid token response")
-                
-            return {"user_id": user_id, "is_admin": is_admin}
-        else:
-            raise HTTPException(status_code=401, detail="Unauthorized")
-            
-    except Exception as e:
+        payload = await auth_client.verify(credentials)
+    except httpx.HTTPError as e:
         logger.error(f"Auth error in Monitoring: {str(e)}")
         raise HTTPException(status_code=503, detail="Auth Service Error")
+
+    if payload is None:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return _to_user(payload)
+
+async def authenticate(credentials: str) -> dict:
+    """Resolves a raw JWT to the user dict (HTTP routes and Socket.IO connections)."""
+    # Local verification while the revocation set is in sync,
+    # otherwise fall back to the auth service
+    if AUTH_MODE == "local" and token_verifier.is_fresh():
+        payload = token_verifier.verify(credentials)
+        if payload is None:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        return _to_user(payload)
+
+    return await _verify_remote(credentials)
+
+async def get_current_user(token: HTTPAuthorizationCredentials = Security(http_bearer)) -> dict:
+    return await authenticate(token.credentials)
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Callable, List, Optional
+
+from prometheus_client import Counter, Gauge, Histogram
+
+INGEST_QUEUE_DEPTH = Gauge("ingest_queue_depth", "MQTT messages waiting to be written to MongoDB")
+INGEST_BATCH_SIZE = Histogram(
+    "ingest_batch_size", "Messages per MongoDB flush",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+INGEST_FLUSH_SECONDS = Histogram("ingest_flush_seconds", "Time spent flushing one batch")
+INGEST_DROPPED = Counter("ingest_dropped_total", "MQTT messages dropped because the ingestion queue stayed full")
+INGEST_BLOCKED_SECONDS = Counter("ingest_backpressure_seconds_total", "Time the MQTT thread spent blocked on the high-water mark")
+
+# Queued by stop(): the writer flushes the batch it holds and returns
+_STOP = object()
+
+
+class BatchIngestor:
+    """
+    Bounded queue between the paho network thread and the event loop.
+
+    Messages are accumulated by a single writer task and handed to `flush_handler`
+    as one list whenever `batch_size` messages are queued or `flush_interval`
+    seconds have passed since the first one of the batch.
+
+    Backpressure: once the queue reaches `high_water` the producer thread blocks
+    (up to `put_timeout` seconds, then the message is dropped) until the writer
+    has drained it back down to `low_water`.
+    """
+
+    def __init__(
+        self,
+        flush_handler: Callable[[List[Any]], Awaitable[None]],
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        high_water: int = 10000,
+        low_water: int = 5000,
+        put_timeout: float = 5,
+    ):
+        self._flush_handler = flush_handler
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._high_water = high_water
+        self._low_water = min(low_water, high_water)
+        self._put_timeout = put_timeout
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._accepting = threading.Event()
+        self._accepting.set()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._writer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Queues the stop sentinel behind the pending messages, waits for the writer
+        to flush its current batch and return, then flushes whatever is still queued.
+        """
+        if self._writer is not None:
+            self._queue.put_nowait(_STOP)
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+        while not self._queue.empty():
+            await self._flush(self._drain(self._batch_size))
+
+    def submit_threadsafe(self, item: Any) -> bool:
+        """
+        Called from a foreign thread (paho callback). Blocks while the queue is
+        above the high-water mark; returns False if the item had to be dropped.
+        """
+        if not self._accepting.is_set():
+            started = time.monotonic()
+            accepted = self._accepting.wait(timeout=self._put_timeout)
+            INGEST_BLOCKED_SECONDS.inc(time.monotonic() - started)
+            if not accepted:
+                INGEST_DROPPED.inc()
+                return False
+        self._loop.call_soon_threadsafe(self._enqueue, item)
+        return True
+
+    def _enqueue(self, item: Any):
+        self._queue.put_nowait(item)
+        depth = self._queue.qsize()
+        INGEST_QUEUE_DEPTH.set(depth)
+        if depth >= self._high_water:
+            self._accepting.clear()
+
+    def _drain(self, limit: int) -> List[Any]:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                batch.append(item)
+        return batch
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch = []
+            deadline = None
+            while len(batch) < self._batch_size:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                elif deadline is None:
+                    item = await self._queue.get()
+                else:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+                if deadline is None:
+                    deadline = self._loop.time() + self._flush_interval
+            # Also on stop: the batch in hand is flushed, never dropped
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Any]):
+        depth = self._queue.qsize()
+        INGEST_QUEUE_DEPTH.set(depth)
+        if depth <= self._low_water:
+            self._accepting.set()
+        if not batch:
+            return
+
+        INGEST_BATCH_SIZE.observe(len(batch))
+        started = time.perf_counter()
+        try:
+            await self._flush_handler(batch)
+        except Exception as e:
+            print(f" [!] Error flushing batch of {len(batch)} messages: {e}")
+        finally:
+            INGEST_FLUSH_SECONDS.observe(time.perf_counter() - started)
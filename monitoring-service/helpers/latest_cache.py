@@ -0,0 +1,192 @@
+import json
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+import redis.asyncio as aioredis
+from prometheus_client import Gauge
+
+# Shared latest-value table in Redis (empty = in-memory per replica)
+LATEST_CACHE_REDIS_URL = os.getenv("LATEST_CACHE_REDIS_URL", "")
+# In-memory mode: minutes of metrics read at startup to fill the table
+LATEST_WARMUP_MINUTES = int(os.getenv("LATEST_WARMUP_MINUTES", 10))
+# Devices silent for longer are dropped (deleted devices whose event was missed)
+LATEST_TTL_SECONDS = int(os.getenv("LATEST_TTL_SECONDS", 86400))
+
+LATEST_DEVICES = Gauge("latest_cache_devices", "Devices with a value in the in-memory latest-value table")
+
+# KEYS: owner hashes; ARGV: ttl, then per key a count followed by that many
+# (device_id, timestamp, metric JSON) triples. A value is only written if it is
+# not older than the stored one, so a replica with late data cannot roll it back.
+_STORE_NEWEST = """
+local ttl = tonumber(ARGV[1])
+local arg = 2
+local written = 0
+for k = 1, #KEYS do
+    local count = tonumber(ARGV[arg])
+    arg = arg + 1
+    for _ = 1, count do
+        local current = redis.call('HGET', KEYS[k], ARGV[arg])
+        if not current or cjson.decode(current)['timestamp'] <= ARGV[arg + 1] then
+            redis.call('HSET', KEYS[k], ARGV[arg], ARGV[arg + 2])
+            written = written + 1
+        end
+        arg = arg + 3
+    end
+    if ttl > 0 then
+        redis.call('EXPIRE', KEYS[k], ttl)
+    end
+end
+return written
+"""
+
+
+class LatestValueCache:
+    """
+    Latest metric of every device, so "current value" reads are a lookup
+    instead of a sort of the metrics collection.
+
+    Entries are the JSON-ready metric dicts of the ingestion path
+    (device_id, owner_id, topic, data, timestamp as ISO string: same naive UTC
+    format everywhere, so they compare chronologically).
+
+    - memory (default): a dict per process, fed with every metric the replica
+      fans out (its own ingestion and the metric bus) and warmed up from Mongo
+      at startup,
+    - redis (`redis_url`): one hash per owner (`<prefix><owner_id>`: device_id
+      -> metric JSON) written by the ingesting replica and shared by all; writes
+      never replace a newer value and refresh the hash TTL.
+
+    Devices are evicted on their `device/delete` event (evict) and, in both
+    modes, once their latest metric is older than `ttl_seconds`: that covers
+    the delete events a replica does not consume (shared subscription).
+    """
+
+    def __init__(self, redis_url: str = "", key_prefix: str = "latest:owner:", ttl_seconds: int = 86400):
+        self._latest: Dict[int, dict] = {}
+        self._by_owner: Dict[int, Set[int]] = defaultdict(set)
+        self._redis_url = redis_url
+        self._key_prefix = key_prefix
+        self._ttl = ttl_seconds
+        self._redis: Optional[aioredis.Redis] = None
+        self._store_newest = None
+
+    @property
+    def shared(self) -> bool:
+        return bool(self._redis_url)
+
+    async def start(self):
+        if self._redis_url and self._redis is None:
+            self._redis = aioredis.from_url(self._redis_url, decode_responses=True)
+            self._store_newest = self._redis.register_script(_STORE_NEWEST)
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def update(self, metric: dict):
+        """Memory mode: keeps `metric` if it is the newest of its device."""
+        if self.shared:
+            return
+        device_id = metric["device_id"]
+        current = self._latest.get(device_id)
+        if current is not None and current["timestamp"] > metric["timestamp"]:
+            return
+        if current is not None and current["owner_id"] != metric["owner_id"]:
+            self._by_owner[current["owner_id"]].discard(device_id)
+        self._latest[device_id] = metric
+        self._by_owner[metric["owner_id"]].add(device_id)
+        LATEST_DEVICES.set(len(self._latest))
+
+    async def store(self, metrics: List[dict]):
+        """Redis mode: one script call writing the newest metric of each device of the batch."""
+        if not self.shared or not metrics:
+            return
+        newest: Dict[int, dict] = {}
+        for metric in metrics:
+            current = newest.get(metric["device_id"])
+            if current is None or metric["timestamp"] >= current["timestamp"]:
+                newest[metric["device_id"]] = metric
+        by_owner: Dict[int, List[dict]] = defaultdict(list)
+        for metric in newest.values():
+            by_owner[metric["owner_id"]].append(metric)
+        keys, args = [], [self._ttl]
+        for owner_id, owner_metrics in by_owner.items():
+            keys.append(f"{self._key_prefix}{owner_id}")
+            args.append(len(owner_metrics))
+            for metric in owner_metrics:
+                args.extend((metric["device_id"], metric["timestamp"], json.dumps(metric)))
+        await self._store_newest(keys=keys, args=args)
+
+    async def evict(self, device_ids: Iterable[int]):
+        """Drops deleted devices (the delete event carries no owner: Redis mode scans the owner hashes)."""
+        device_ids = list(device_ids)
+        if not device_ids:
+            return
+        if not self.shared:
+            for device_id in device_ids:
+                self._drop(device_id)
+            LATEST_DEVICES.set(len(self._latest))
+            return
+        pipe = self._redis.pipeline(transaction=False)
+        async for key in self._redis.scan_iter(match=f"{self._key_prefix}*", count=1000):
+            pipe.hdel(key, *device_ids)
+        await pipe.execute()
+
+    async def snapshot(self, owner_id: Optional[int]) -> List[dict]:
+        """Latest metric of each device of `owner_id` (None = every device, admin)."""
+        cutoff = self._cutoff()
+        if not self.shared:
+            device_ids = self._latest.keys() if owner_id is None else self._by_owner.get(owner_id, ())
+            metrics = [self._latest[device_id] for device_id in device_ids]
+            expired = [metric["device_id"] for metric in metrics if metric["timestamp"] < cutoff]
+            if expired:
+                for device_id in expired:
+                    self._drop(device_id)
+                LATEST_DEVICES.set(len(self._latest))
+            return [metric for metric in metrics if metric["timestamp"] >= cutoff]
+
+        if owner_id is not None:
+            keys = [f"{self._key_prefix}{owner_id}"]
+        else:
+            keys = [key async for key in self._redis.scan_iter(match=f"{self._key_prefix}*", count=1000)]
+        pipe = self._redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hvals(key)
+        snapshot, expired = [], defaultdict(list)
+        for key, values in zip(keys, await pipe.execute()):
+            for value in values:
+                metric = json.loads(value)
+                if metric["timestamp"] >= cutoff:
+                    snapshot.append(metric)
+                else:
+                    expired[key].append(metric["device_id"])
+        if expired:
+            # Devices of an owner whose other devices keep the hash alive
+            pipe = self._redis.pipeline(transaction=False)
+            for key, device_ids in expired.items():
+                pipe.hdel(key, *device_ids)
+            await pipe.execute()
+        return snapshot
+
+    def _drop(self, device_id: int):
+        current = self._latest.pop(device_id, None)
+        if current is not None:
+            self._by_owner[current["owner_id"]].discard(device_id)
+
+    def _cutoff(self) -> str:
+        """ISO timestamp below which an entry has expired ("" when entries never expire)."""
+        if self._ttl <= 0:
+            return ""
+        return (datetime.utcnow() - timedelta(seconds=self._ttl)).isoformat()
+
+    def load(self, metrics: List[dict]):
+        """Memory mode warm-up (e.g. from the last minutes of the metrics collection)."""
+        for metric in metrics:
+            self.update(metric)
+
+
+# Singleton table, started/closed by the app lifespan
+latest_cache = LatestValueCache(LATEST_CACHE_REDIS_URL, ttl_seconds=LATEST_TTL_SECONDS)
@@ -0,0 +1,73 @@
+import asyncio
+import json
+from typing import Callable, List, Optional
+
+import redis.asyncio as aioredis
+from prometheus_client import Counter
+
+BUS_PUBLISHED = Counter("metric_bus_published_total", "Metrics published on the cross-replica bus")
+BUS_RECEIVED = Counter("metric_bus_received_total", "Metrics received from the cross-replica bus")
+
+
+class MetricBus:
+    """
+    Cross-replica fan-out of ingested metrics over a Redis pub/sub channel.
+
+    With an MQTT shared subscription each replica only consumes its share of
+    the messages; every replica publishes its share here and delivers what it
+    receives (its own share included) to its local `deliver` callback, so each
+    replica's Socket.io clients still see every metric of their rooms.
+    If Redis is unreachable, metrics are delivered locally only.
+    """
+
+    def __init__(self, url: str, channel: str, deliver: Callable[[dict], None]):
+        self._url = url
+        self._channel = channel
+        self._deliver = deliver
+        self._redis: Optional[aioredis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._redis = aioredis.from_url(self._url)
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def publish(self, metrics: List[dict]):
+        """Publishes one JSON message for the whole ingestion batch."""
+        try:
+            await self._redis.publish(self._channel, json.dumps(metrics))
+            BUS_PUBLISHED.inc(len(metrics))
+        except Exception as e:
+            print(f"[METRIC BUS] Publish failed, delivering locally only: {e}")
+            for metric in metrics:
+                self._deliver(metric)
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub()
+            try:
+                await pubsub.subscribe(self._channel)
+                print(f"[METRIC BUS] Subscribed to {self._channel}")
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    metrics = json.loads(message["data"])
+                    BUS_RECEIVED.inc(len(metrics))
+                    for metric in metrics:
+                        self._deliver(metric)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[METRIC BUS] Subscription lost, retrying in 1s: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
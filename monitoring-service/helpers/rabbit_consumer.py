@@ -2,89 +2,211 @@ import json
 import paho.mqtt.client as mqtt
 import os
 import asyncio
+from typing import Dict, List, Optional, Tuple
+from pymongo.errors import BulkWriteError
 from helpers.mongo_config import get_db
-from helpers.socket_helper import sio
-from dal.monitoring_dao import insert_metric
+from helpers.socket_helper import deliver_metric, metric_bus
+from helpers.latest_cache import latest_cache
+from helpers.ingestion import BatchIngestor
+from helpers.wire_format import decode_metric
+from dal.monitoring_dao import insert_metrics, update_rollups, upsert_device_meta
 from entities.metrics import Metric
 
 # MQTT Configuration
 MQTT_HOST = os.getenv("MQTT_HOST", "rabbitmq_broker") # Note: we use the MQTT port
 MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+MQTT_TOPIC = "device/#"
+# Shared subscription group ($share/<group>/device/#): each message is consumed by a
+# single replica of the group. Needs a broker supporting them (e.g. Mosquitto 2, EMQX);
+# empty = every replica consumes (and stores) every message.
+MQTT_SHARED_GROUP = os.getenv("MQTT_SHARED_GROUP", "")
+MQTT_SUBSCRIPTION = f"$share/{MQTT_SHARED_GROUP}/{MQTT_TOPIC}" if MQTT_SHARED_GROUP else MQTT_TOPIC
+# Device lifecycle event published by device-management on deletion
+DEVICE_DELETE_PREFIX = "device/delete/"
 
-async def process_mqtt_message(topic, payload):
+# Ingestion pipeline configuration
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", 0.5))
+INGEST_HIGH_WATER = int(os.getenv("INGEST_HIGH_WATER", 10000))
+INGEST_LOW_WATER = int(os.getenv("INGEST_LOW_WATER", 5000))
+INGEST_PUT_TIMEOUT = float(os.getenv("INGEST_PUT_TIMEOUT", 5))
+
+# Alerts are published on alerts/{owner_id}/{device_id}
+ALERT_TOPIC_PREFIX = os.getenv("ALERT_TOPIC_PREFIX", "alerts")
+ALERT_QOS = int(os.getenv("ALERT_QOS", 1))
+
+# Connected consumer client, also used to publish the alerts
+mqtt_client: Optional[mqtt.Client] = None
+
+# Static device attributes last written to device_meta (device_id -> attributes)
+known_device_meta: Dict[int, dict] = {}
+
+def parse_mqtt_message(topic: str, payload: bytes) -> Optional[Metric]:
+    """
+    Builds a Metric from a raw MQTT message (binary v1 or JSON, see
+    helpers/wire_format.py), or None if it cannot be parsed.
+    """
+    try:
+        return decode_metric(topic, payload)
+    except Exception as e:
+        print(f" [!] Error parsing MQTT message on {topic}: {e}")
+        return None
+
+def deleted_device_id(topic: str) -> Optional[int]:
+    """Device id of a device/delete/{device_id} event, None for any other topic."""
+    if not topic.startswith(DEVICE_DELETE_PREFIX):
+        return None
+    try:
+        return int(topic[len(DEVICE_DELETE_PREFIX):])
+    except ValueError:
+        return None
+
+def to_fan_out(metric: Metric) -> dict:
+    """JSON-ready dict for the latest-value table and Socket.io, built without a model_dump."""
+    return {
+        "device_id": metric.device_id,
+        "owner_id": metric.owner_id,
+        "topic": metric.topic,
+        "data": metric.data,
+        "timestamp": metric.timestamp.isoformat(),
+    }
+
+async def process_mqtt_batch(messages: List[Tuple[str, bytes]]):
     """
-    Asynchronous processing of the MQTT message.
+    Asynchronous processing of a batch of MQTT messages. Device deletion events
+    are not metrics: they only evict the device from the latest-value table.
     """
+    deleted = []
+    metrics = []
+    for topic, payload in messages:
+        device_id = deleted_device_id(topic)
+        if device_id is not None:
+            deleted.append(device_id)
+            continue
+        metric = parse_mqtt_message(topic, payload)
+        if metric is not None:
+            metrics.append(metric)
+    if metrics:
+        await store_and_deliver(metrics)
+
+    # After the fan-out, so a last metric of the batch cannot bring the device back
+    if deleted:
+        try:
+            await latest_cache.evict(deleted)
+        except Exception as e:
+            print(f" [!] Error evicting deleted devices from the latest values: {e}")
+
+async def store_and_deliver(metrics: List[Metric]):
+    """One insert_many for the whole batch, the rollup upserts, then the Socket.io fan-out."""
+    # 1. Save to MongoDB
     db = await get_db()
+    stored = metrics
+    try:
+        await insert_metrics(db, metrics)
+    except BulkWriteError as e:
+        rejected = {error["index"] for error in e.details.get("writeErrors", [])}
+        stored = [metric for i, metric in enumerate(metrics) if i not in rejected]
+        print(f" [!] {len(rejected)} metrics rejected in batch of {len(metrics)}")
+
+    # Static attributes (name, unit, topic) are stored once per device, only when they change
     try:
-        data = json.loads(payload.decode())
-        
-        # 1. Create Metric object
-        metric_data = Metric(
-            device_id=data.get("device_id"),
-            owner_id=data.get("owner_id"),
-            topic=topic,
-            data=data
-        )
-        
-        # 2. Save to MongoDB
-        await insert_metric(db, metric_data)
-        
-        # 3. Emit via Socket.io
-        await sio.emit('new_metric', metric_data.model_dump_json())
-        print(f" [MQTT] Data saved and emitted for device {metric_data.device_id}")
-        
+        await upsert_device_meta(db, metrics, known_device_meta)
     except Exception as e:
-        print(f" [!] Error processing MQTT message: {e}")
+        print(f" [!] Error updating device metadata: {e}")
+
+    # 2. Keep the 1m/1h/1d rollups up to date (with the stored metrics only, so
+    # they stay equal to what the history holds)
+    try:
+        await update_rollups(db, stored)
+    except Exception as e:
+        print(f" [!] Error updating rollups: {e}")
+
+    # 3. Shared latest-value table (Redis mode; the in-memory one is fed by deliver_metric)
+    payload = [to_fan_out(metric_data) for metric_data in metrics]
+    try:
+        await latest_cache.store(payload)
+    except Exception as e:
+        print(f" [!] Error updating latest values: {e}")
+
+    # 4. Queue for the per-room Socket.io batches (serialized once per metric).
+    # With a shared subscription this replica only got its share: go through the bus
+    if MQTT_SHARED_GROUP and metric_bus is not None:
+        await metric_bus.publish(payload)
+    else:
+        for metric in payload:
+            deliver_metric(metric)
+
+ingestor = BatchIngestor(
+    process_mqtt_batch,
+    batch_size=INGEST_BATCH_SIZE,
+    flush_interval=INGEST_FLUSH_INTERVAL,
+    high_water=INGEST_HIGH_WATER,
+    low_water=INGEST_LOW_WATER,
+    put_timeout=INGEST_PUT_TIMEOUT,
+)
+
+async def publish_alert(alert: dict):
+    """Alert sink: MQTT publish (called on a single replica per alert)."""
+    if mqtt_client is None:
+        return
+    topic = f"{ALERT_TOPIC_PREFIX}/{alert['owner_id']}/{alert['device_id']}"
+    mqtt_client.publish(topic, json.dumps(alert), qos=ALERT_QOS)
 
 def on_connect(client, userdata, flags, rc):
     if rc == 0:
         print(" [MQTT] Monitoring Consumer successfully connected to Broker")
-        client.subscribe("device/#")
+        client.subscribe(MQTT_SUBSCRIPTION)
+        print(f" [MQTT] Subscribed to {MQTT_SUBSCRIPTION}")
     else:
         print(f" [MQTT] Connection failed with code {rc}")
 
 def on_message(client, userdata, message):
-    print(f" [MQTT] Received message on topic: {message.topic}")
     """
-    Paho Synchronous Callback. 
-    We bridge it to the async event loop.
+    Paho Synchronous Callback.
+    We hand the message to the ingestion queue; this blocks the paho thread
+    (and so the broker socket) while the queue is above its high-water mark.
     """
-    loop = userdata['loop']
-    # Schedule the async processing in the running event loop
-    asyncio.run_coroutine_threadsafe(
-        process_mqtt_message(message.topic, message.payload), 
-        loop
-    )
+    ingestor.submit_threadsafe((message.topic, message.payload))
 
 async def consume_messages():
     """
     Starts the Paho MQTT Client.
     """
+    global mqtt_client
     print(f" [*] Monitoring MQTT Consumer starting (Host: {MQTT_HOST})...")
-    
-    # Get current event loop reference
-    loop = asyncio.get_running_loop()
-    
+    if MQTT_SHARED_GROUP and metric_bus is None:
+        print(" [!] MQTT_SHARED_GROUP without SOCKET_REDIS_URL: clients only see the metrics consumed by their replica")
+
+    # Start the batch writer on the current event loop
+    ingestor.start()
+
     # Setup Paho Client
-    client = mqtt.Client(userdata={'loop': loop})
+    client = mqtt.Client()
     client.username_pw_set("guest", "guest")
     client.on_connect = on_connect
     client.on_message = on_message
-    
-    # Simple retry logic
-    connected = False
-    while not connected:
-        try:
-            client.connect(MQTT_HOST, MQTT_PORT, 60)
-            connected = True
-        except Exception as e:
-            print(f" [!] MQTT Connection failed, retrying in 5s : {e}")
-            await asyncio.sleep(5)
-    
-    # Start the non-blocking MQTT loop
-    client.loop_start()
-    
-    # Keep the task alive
-    while True:
-        await asyncio.sleep(1)
+
+    try:
+        # Simple retry logic
+        connected = False
+        while not connected:
+            try:
+                client.connect(MQTT_HOST, MQTT_PORT, 60)
+                connected = True
+            except Exception as e:
+                print(f" [!] MQTT Connection failed, retrying in 5s : {e}")
+                await asyncio.sleep(5)
+
+        # Start the non-blocking MQTT loop
+        client.loop_start()
+        mqtt_client = client
+
+        # Keep the task alive
+        while True:
+            await asyncio.sleep(1)
+    finally:
+        # Stop receiving, then flush what is still queued
+        mqtt_client = None
+        client.loop_stop()
+        client.disconnect()
+        await ingestor.stop()
@@ -0,0 +1,330 @@
+import asyncio
+import math
+import operator
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from prometheus_client import Counter
+from dal.alert_dao import get_enabled_rules
+from dal.monitoring_dao import numeric_fields
+from helpers.mongo_config import get_db
+
+# Rolling statistics of the rule engine
+RULE_EWMA_ALPHA = float(os.getenv("RULE_EWMA_ALPHA", 0.1))
+RULE_WINDOW_SECONDS = float(os.getenv("RULE_WINDOW_SECONDS", 60))
+RULE_ZSCORE_MIN_SAMPLES = int(os.getenv("RULE_ZSCORE_MIN_SAMPLES", 20))
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", 30))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", 10000))
+# Redis used so that a single replica publishes each alert on MQTT (empty = no dedup)
+ALERT_DEDUP_REDIS_URL = os.getenv("ALERT_DEDUP_REDIS_URL", os.getenv("SOCKET_REDIS_URL", ""))
+ALERT_DEDUP_TTL = int(os.getenv("ALERT_DEDUP_TTL", 600))
+
+RULE_EVALUATIONS = Counter("rule_evaluations_total", "Rule evaluations on ingested metrics")
+ALERTS = Counter("alerts_total", "Alert transitions", ["state"])
+ALERTS_DROPPED = Counter("alerts_dropped_total", "Alerts dropped because the alert queue was full")
+
+OPERATORS = {">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+AlertSink = Callable[[dict], Awaitable[None]]
+
+
+class Rule:
+    """
+    `field` `stat` `op` `threshold` sustained for `for_seconds`, e.g.
+    value > 30 for 60s, or zscore > 3 (spike against the EWMA baseline).
+    Applies to one device or to every device of a type; owner_id None
+    (admin rules) matches every owner.
+    """
+    __slots__ = ("id", "name", "owner_id", "device_id", "device_type", "field", "stat", "op", "threshold", "for_seconds")
+
+    def __init__(self, doc: dict):
+        self.id = str(doc["_id"])
+        self.name = doc.get("name", "")
+        self.owner_id = doc.get("owner_id")
+        self.device_id = doc.get("device_id")
+        self.device_type = doc.get("device_type")
+        self.field = doc.get("field", "value")
+        self.stat = doc.get("stat", "value")
+        self.op = OPERATORS[doc.get("op", ">")]
+        self.threshold = float(doc["threshold"])
+        self.for_seconds = float(doc.get("for_seconds", 0))
+
+
+class FieldWindow:
+    """
+    Rolling statistics of one reading of one device, O(1) amortized per point:
+    EWMA mean/variance (z-score of the new point against the previous baseline)
+    and min/max over the last `window` seconds (monotonic deques).
+    """
+    __slots__ = ("mean", "var", "count", "z", "mins", "maxs")
+
+    def __init__(self):
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.z = 0.0
+        self.mins: deque = deque()
+        self.maxs: deque = deque()
+
+    def update(self, t: float, x: float, alpha: float, window: float):
+        if self.count:
+            std = math.sqrt(self.var)
+            self.z = (x - self.mean) / std if std > 0 else 0.0
+            diff = x - self.mean
+            incr = alpha * diff
+            self.mean += incr
+            self.var = (1 - alpha) * (self.var + diff * incr)
+        else:
+            self.mean = x
+        self.count += 1
+
+        while self.mins and self.mins[-1][1] >= x:
+            self.mins.pop()
+        self.mins.append((t, x))
+        while self.maxs and self.maxs[-1][1] <= x:
+            self.maxs.pop()
+        self.maxs.append((t, x))
+        horizon = t - window
+        while self.mins[0][0] < horizon:
+            self.mins.popleft()
+        while self.maxs[0][0] < horizon:
+            self.maxs.popleft()
+
+    def stat(self, name: str, x: float, min_samples: int) -> Optional[float]:
+        if name == "value":
+            return x
+        if name == "ewma":
+            return self.mean
+        if name == "min":
+            return self.mins[0][1]
+        if name == "max":
+            return self.maxs[0][1]
+        # zscore: only once the baseline has seen enough points
+        return abs(self.z) if self.count > min_samples else None
+
+
+class RuleState:
+    """Sustained-condition tracking of one (rule, device)."""
+    __slots__ = ("breach_since", "firing")
+
+    def __init__(self):
+        self.breach_since: Optional[float] = None
+        self.firing = False
+
+
+class RuleEngine:
+    """
+    Evaluates the alert rules stored in Mongo (`alert_rules`) on every metric
+    delivered to this replica.
+
+    Rules are indexed in memory by device id and by (owner, device type), so a
+    point only runs the rules that can match it, and per-device state is kept
+    only for the readings some rule looks at. observe() never awaits: alerts
+    go through a bounded queue to a sender task, so storage and the Socket.io
+    fan-out are not slowed down.
+
+    Every replica sees every metric (own ingestion or the metric bus) and runs
+    the same rules on the same points, so:
+    - `local_sinks` (Socket.io) are called on every replica for its own clients,
+    - `exclusive_sinks` (MQTT) are called once across replicas, deduplicated
+      in Redis on the alert id when `dedup_url` is set.
+    """
+
+    def __init__(
+        self,
+        alpha: float,
+        window_seconds: float,
+        zscore_min_samples: int,
+        reload_interval: float,
+        queue_size: int,
+        dedup_url: str = "",
+        dedup_ttl: int = 600,
+    ):
+        self._alpha = alpha
+        self._window_seconds = window_seconds
+        self._zscore_min_samples = zscore_min_samples
+        self._reload_interval = reload_interval
+        self._queue_size = queue_size
+        self._dedup_url = dedup_url
+        self._dedup_ttl = dedup_ttl
+
+        self._by_device: Dict[int, List[Rule]] = {}
+        self._by_type: Dict[Tuple[Optional[int], str], List[Rule]] = {}
+        self._windows: Dict[Tuple[int, str], FieldWindow] = {}
+        self._states: Dict[Tuple[str, int], RuleState] = {}
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._local_sinks: List[AlertSink] = []
+        self._exclusive_sinks: List[AlertSink] = []
+        self._redis: Optional[aioredis.Redis] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def load(self, docs: List[dict]):
+        """Rebuilds the rule index; state of deleted rules is dropped."""
+        by_device: Dict[int, List[Rule]] = {}
+        by_type: Dict[Tuple[Optional[int], str], List[Rule]] = {}
+        for doc in docs:
+            try:
+                rule = Rule(doc)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"[RULES] Skipping invalid rule {doc.get('_id')}: {e}")
+                continue
+            if rule.device_id is not None:
+                by_device.setdefault(rule.device_id, []).append(rule)
+            elif rule.device_type:
+                by_type.setdefault((rule.owner_id, rule.device_type), []).append(rule)
+        self._by_device, self._by_type = by_device, by_type
+
+        rule_ids = {str(doc["_id"]) for doc in docs}
+        self._states = {key: state for key, state in self._states.items() if key[0] in rule_ids}
+
+    async def reload(self):
+        self.load(await get_enabled_rules(await get_db()))
+
+    def _rules_for(self, device_id: int, owner_id: int, device_type: str) -> List[Rule]:
+        rules = [rule for rule in self._by_device.get(device_id, ()) if rule.owner_id is None or rule.owner_id == owner_id]
+        rules.extend(self._by_type.get((owner_id, device_type), ()))
+        rules.extend(self._by_type.get((None, device_type), ()))
+        return rules
+
+    def observe(self, metric: dict):
+        """Evaluates the rules of this device on a JSON-ready metric (device_id, owner_id, topic, data)."""
+        if not self._by_device and not self._by_type:
+            return
+        device_id, owner_id = metric["device_id"], metric["owner_id"]
+        rules = self._rules_for(device_id, owner_id, (metric.get("topic") or "").rsplit("/", 1)[-1])
+        if not rules:
+            return
+
+        data = metric["data"]
+        readings = numeric_fields(data)
+        # Source timestamp of the point: identical on every replica, unlike the ingestion time
+        t = data.get("timestamp")
+        if not isinstance(t, (int, float)):
+            t = time.time()
+
+        updated: Dict[str, FieldWindow] = {}
+        for rule in rules:
+            x = readings.get(rule.field)
+            if x is None:
+                continue
+            window = updated.get(rule.field)
+            if window is None:
+                window = self._windows.get((device_id, rule.field))
+                if window is None:
+                    window = self._windows[(device_id, rule.field)] = FieldWindow()
+                window.update(t, x, self._alpha, self._window_seconds)
+                updated[rule.field] = window
+
+            RULE_EVALUATIONS.inc()
+            value = window.stat(rule.stat, x, self._zscore_min_samples)
+            breached = value is not None and rule.op(value, rule.threshold)
+
+            state = self._states.get((rule.id, device_id))
+            if state is None:
+                if not breached:
+                    continue
+                state = self._states[(rule.id, device_id)] = RuleState()
+            if breached:
+                if state.breach_since is None:
+                    state.breach_since = t
+                if not state.firing and t - state.breach_since >= rule.for_seconds:
+                    state.firing = True
+                    self._emit(rule, metric, value, t, "firing")
+            else:
+                state.breach_since = None
+                if state.firing:
+                    state.firing = False
+                    self._emit(rule, metric, value, t, "resolved")
+
+    def _emit(self, rule: Rule, metric: dict, value: Optional[float], t: float, state: str):
+        ALERTS.labels(state=state).inc()
+        alert = {
+            "id": f"{rule.id}:{metric['device_id']}:{state}:{t}",
+            "rule_id": rule.id,
+            "rule_name": rule.name,
+            "rule_owner_id": rule.owner_id,
+            "device_id": metric["device_id"],
+            "owner_id": metric["owner_id"],
+            "field": rule.field,
+            "stat": rule.stat,
+            "threshold": rule.threshold,
+            "value": value,
+            "state": state,
+            "timestamp": t,
+        }
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            ALERTS_DROPPED.inc()
+
+    async def _claim(self, alert: dict) -> bool:
+        """True if this replica is the first to handle the alert (always without Redis)."""
+        if self._redis is None:
+            return True
+        try:
+            return bool(await self._redis.set(f"alert:{alert['id']}", 1, nx=True, ex=self._dedup_ttl))
+        except Exception as e:
+            print(f"[RULES] Alert dedup unavailable, publishing anyway: {e}")
+            return True
+
+    async def _send(self):
+        while True:
+            alert = await self._queue.get()
+            for sink in self._local_sinks:
+                try:
+                    await sink(alert)
+                except Exception as e:
+                    print(f"[RULES] Error delivering alert: {e}")
+            if self._exclusive_sinks and await self._claim(alert):
+                for sink in self._exclusive_sinks:
+                    try:
+                        await sink(alert)
+                    except Exception as e:
+                        print(f"[RULES] Error publishing alert: {e}")
+
+    async def _reload_loop(self):
+        while True:
+            await asyncio.sleep(self._reload_interval)
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"[RULES] Error reloading rules: {e}")
+
+    async def start(self, local_sinks: List[AlertSink], exclusive_sinks: List[AlertSink]):
+        self._local_sinks = local_sinks
+        self._exclusive_sinks = exclusive_sinks
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        if self._dedup_url:
+            self._redis = aioredis.from_url(self._dedup_url)
+        try:
+            await self.reload()
+        except Exception as e:
+            print(f"[RULES] Initial rule load failed: {e}")
+        self._tasks = [asyncio.create_task(self._send()), asyncio.create_task(self._reload_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+# Singleton engine, fed by socket_helper.deliver_metric and started/stopped by the app lifespan
+rule_engine = RuleEngine(
+    alpha=RULE_EWMA_ALPHA,
+    window_seconds=RULE_WINDOW_SECONDS,
+    zscore_min_samples=RULE_ZSCORE_MIN_SAMPLES,
+    reload_interval=RULES_RELOAD_INTERVAL,
+    queue_size=ALERT_QUEUE_SIZE,
+    dedup_url=ALERT_DEDUP_REDIS_URL,
+    dedup_ttl=ALERT_DEDUP_TTL,
+)
@@ -1,17 +1,279 @@
+import os
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Set
+from urllib.parse import parse_qs
 import socketio
+from fastapi import HTTPException
+from prometheus_client import Counter, Gauge
+from helpers.auth_helper import authenticate
+from helpers.mongo_config import get_db
+from dal.monitoring_dao import get_owned_device_ids
+from helpers.metric_bus import MetricBus
+from helpers.latest_cache import latest_cache
+from helpers.rule_engine import rule_engine
+
+# Realtime fan-out configuration
+SOCKET_FLUSH_INTERVAL = float(os.getenv("SOCKET_FLUSH_INTERVAL", 0.25))
+SOCKET_MAX_BATCH = int(os.getenv("SOCKET_MAX_BATCH", 1000))
+# engine.io packets queued for a client before it is considered slow (conflated),
+# and how long it may stay slow before being disconnected
+SOCKET_SLOW_BACKLOG = int(os.getenv("SOCKET_SLOW_BACKLOG", 20))
+SOCKET_DROP_AFTER = float(os.getenv("SOCKET_DROP_AFTER", 30))
+SOCKET_MAX_DEVICE_SUBSCRIPTIONS = int(os.getenv("SOCKET_MAX_DEVICE_SUBSCRIPTIONS", 100))
+# Latest values sent to a client right after it connects (admins see every device)
+SOCKET_SNAPSHOT_MAX = int(os.getenv("SOCKET_SNAPSHOT_MAX", 5000))
+
+# Multi-replica mode: a Redis client manager so emits reach the clients of every
+# replica, and a metric bus for ingestion shared between replicas (empty = single process)
+SOCKET_REDIS_URL = os.getenv("SOCKET_REDIS_URL", "")
+SOCKET_REDIS_CHANNEL = os.getenv("SOCKET_REDIS_CHANNEL", "socketio")
+SOCKET_METRIC_CHANNEL = os.getenv("SOCKET_METRIC_CHANNEL", "monitoring:metrics")
+
+ADMIN_ROOM = "admins"
+
+SOCKET_CLIENTS = Gauge("socketio_clients", "Connected Socket.IO clients")
+SOCKET_BATCHES = Counter("socketio_batches_emitted_total", "metrics_batch emits (one per room and flush)")
+SOCKET_CONFLATED = Counter("socketio_conflated_total", "Metrics routed to the conflation buffer of a slow client")
+SOCKET_BATCH_SUPERSEDED = Counter("socketio_batch_superseded_total", "Metrics replaced by a newer one of their device in a room batch above max_batch")
+SOCKET_DROPPED_CLIENTS = Counter("socketio_dropped_clients_total", "Clients disconnected for staying slow")
 
 # Create an Async Server for Socket.io
-sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins=[
-    'http://localhost:3000', 
-    'http://localhost:5173', 
+client_manager = socketio.AsyncRedisManager(SOCKET_REDIS_URL, channel=SOCKET_REDIS_CHANNEL) if SOCKET_REDIS_URL else None
+sio = socketio.AsyncServer(async_mode='asgi', client_manager=client_manager, cors_allowed_origins=[
+    'http://localhost:3000',
+    'http://localhost:5173',
     'http://127.0.0.1:5500'
 ])
 
-# Simple event for debugging
+def owner_room(owner_id) -> str:
+    return f"owner:{owner_id}"
+
+def device_room(device_id) -> str:
+    return f"device:{device_id}"
+
+
+class RoomBatcher:
+    """
+    Coalesces metrics into one `metrics_batch` emit per room every
+    `flush_interval` seconds instead of one emit per metric to every client.
+
+    Each metric is routed to its owner room, its device room and the admin
+    room; a client sits either in its owner/admin room (all its devices) or
+    in the device rooms it subscribed to, never both, so it never receives
+    a metric twice.
+
+    Slow clients (engine.io backlog above `slow_backlog`) are skipped by the
+    room emits and get a conflated batch instead (latest metric per device)
+    once they catch up; a client slow for more than `drop_after` seconds is
+    disconnected.
+
+    A room batch holds at most `max_batch` metrics: above that it is conflated
+    to the latest metric per device, then split into several emits if needed,
+    so no device is ever left out.
+
+    Emits bypass the client manager queue (`ignore_queue`): with several
+    replicas every batcher is fed every metric (see MetricBus) and only serves
+    the clients connected to its own process.
+    """
+
+    def __init__(self, server: socketio.AsyncServer, flush_interval: float, max_batch: int, slow_backlog: int, drop_after: float):
+        self._sio = server
+        self._flush_interval = flush_interval
+        self._max_batch = max_batch
+        self._slow_backlog = slow_backlog
+        self._drop_after = drop_after
+        self._pending: Dict[str, List[dict]] = defaultdict(list)
+        # sid -> {device_id: latest metric} for clients that are behind
+        self._conflated: Dict[str, Dict[int, dict]] = {}
+        self._slow_since: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def publish(self, metric: dict):
+        """`metric` is already JSON-ready (serialized once, shared by every room)."""
+        for room in (owner_room(metric["owner_id"]), device_room(metric["device_id"]), ADMIN_ROOM):
+            self._pending[room].append(metric)
+
+    def forget(self, sid: str):
+        self._conflated.pop(sid, None)
+        self._slow_since.pop(sid, None)
+
+    def _chunks(self, metrics: List[dict]) -> List[List[dict]]:
+        if len(metrics) > self._max_batch:
+            latest: Dict[int, dict] = {}
+            for metric in metrics:
+                latest[metric["device_id"]] = metric
+            SOCKET_BATCH_SUPERSEDED.inc(len(metrics) - len(latest))
+            metrics = list(latest.values())
+        return [metrics[i:i + self._max_batch] for i in range(0, len(metrics), self._max_batch)]
+
+    def _backlog(self, eio_sid: str) -> int:
+        # Packets waiting in the engine.io send queue of this client
+        try:
+            return self._sio.eio.sockets[eio_sid].queue.qsize()
+        except (AttributeError, KeyError):
+            return 0
+
+    async def flush(self):
+        pending, self._pending = self._pending, defaultdict(list)
+        now = time.monotonic()
+        for room, metrics in pending.items():
+            slow: List[str] = []
+            listeners = 0
+            for sid, eio_sid in self._sio.manager.get_participants("/", room):
+                listeners += 1
+                if sid in self._conflated or self._backlog(eio_sid) > self._slow_backlog:
+                    slow.append(sid)
+            if not listeners:
+                continue
+            for sid in slow:
+                latest = self._conflated.setdefault(sid, {})
+                self._slow_since.setdefault(sid, now)
+                SOCKET_CONFLATED.inc(len(metrics))
+                for metric in metrics:
+                    latest[metric["device_id"]] = metric
+            if listeners > len(slow):
+                for chunk in self._chunks(metrics):
+                    await self._sio.emit('metrics_batch', chunk, room=room, skip_sid=slow or None, ignore_queue=True)
+                    SOCKET_BATCHES.inc()
+        await self._drain_slow(now)
+
+    async def _drain_slow(self, now: float):
+        for sid in list(self._conflated):
+            eio_sid = self._sio.manager.eio_sid_from_sid(sid, "/")
+            if eio_sid is None:
+                self.forget(sid)
+            elif self._backlog(eio_sid) <= self._slow_backlog:
+                latest = self._conflated.pop(sid)
+                self._slow_since.pop(sid, None)
+                for chunk in self._chunks(list(latest.values())):
+                    await self._sio.emit('metrics_batch', chunk, to=sid, ignore_queue=True)
+            elif now - self._slow_since.get(sid, now) > self._drop_after:
+                print(f"[SOCKET.IO] Dropping slow client {sid}")
+                SOCKET_DROPPED_CLIENTS.inc()
+                self.forget(sid)
+                await self._sio.disconnect(sid, ignore_queue=True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self._flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[SOCKET.IO] Error flushing metric batches: {e}")
+
+
+# Singleton batcher, started/stopped by the app lifespan
+batcher = RoomBatcher(
+    sio,
+    flush_interval=SOCKET_FLUSH_INTERVAL,
+    max_batch=SOCKET_MAX_BATCH,
+    slow_backlog=SOCKET_SLOW_BACKLOG,
+    drop_after=SOCKET_DROP_AFTER,
+)
+
+def deliver_metric(metric: dict):
+    """Local delivery of an ingested metric: latest-value table, room batches, alert rules."""
+    latest_cache.update(metric)
+    batcher.publish(metric)
+    rule_engine.observe(metric)
+
+async def emit_alert(alert: dict):
+    """Alert sink: to the clients of this replica following the device (every replica runs it)."""
+    rooms = [owner_room(alert["owner_id"]), device_room(alert["device_id"])]
+    if alert["rule_owner_id"] is None:
+        rooms.append(ADMIN_ROOM)
+    await sio.emit('alert', alert, room=rooms, ignore_queue=True)
+
+# Cross-replica metric bus (None in single process mode), started/stopped by the app lifespan
+metric_bus = MetricBus(SOCKET_REDIS_URL, SOCKET_METRIC_CHANNEL, deliver_metric) if SOCKET_REDIS_URL else None
+
+def _token_from(environ: dict, auth: Optional[dict]) -> Optional[str]:
+    # socket.io v4 `auth` payload, else ?token= or an Authorization header
+    if auth and auth.get("token"):
+        return auth["token"]
+    token = parse_qs(environ.get("QUERY_STRING", "")).get("token")
+    if token:
+        return token[0]
+    header = environ.get("HTTP_AUTHORIZATION", "")
+    if header.lower().startswith("bearer "):
+        return header[7:]
+    return None
+
+def _default_room(user: dict) -> str:
+    return ADMIN_ROOM if user["is_admin"] else owner_room(user["user_id"])
+
+async def _send_snapshot(sid: str, user: dict):
+    """Current value of the user's devices, so the dashboard fills without a history query."""
+    try:
+        metrics = await latest_cache.snapshot(None if user["is_admin"] else user["user_id"])
+        await sio.emit('metrics_snapshot', metrics[:SOCKET_SNAPSHOT_MAX], to=sid, ignore_queue=True)
+    except Exception as e:
+        print(f"[SOCKET.IO] Error sending snapshot to {sid}: {e}")
+
 @sio.event
-async def connect(sid, environ):
-    print(f"[SOCKET.IO] Client connected: {sid}")
+async def connect(sid, environ, auth=None):
+    token = _token_from(environ, auth)
+    if not token:
+        raise socketio.exceptions.ConnectionRefusedError("unauthorized")
+    try:
+        user = await authenticate(token)
+    except HTTPException:
+        raise socketio.exceptions.ConnectionRefusedError("unauthorized")
+    await sio.save_session(sid, {"user": user, "devices": set()})
+    await sio.enter_room(sid, _default_room(user))
+    # Sent once the connection is acknowledged
+    sio.start_background_task(_send_snapshot, sid, user)
+    SOCKET_CLIENTS.inc()
+    print(f"[SOCKET.IO] Client connected: {sid} (user {user['user_id']})")
+
+@sio.event
+async def subscribe(sid, data):
+    """
+    {"device_ids": [1, 2]}: only receive these devices (ownership checked).
+    An empty list goes back to every device of the user.
+    """
+    session = await sio.get_session(sid)
+    user, devices = session["user"], session["devices"]
+    requested: Set[int] = set()
+    for device_id in (data or {}).get("device_ids", [])[:SOCKET_MAX_DEVICE_SUBSCRIPTIONS]:
+        try:
+            requested.add(int(device_id))
+        except (TypeError, ValueError):
+            continue
+
+    allowed: Set[int] = set()
+    if requested:
+        # One device_meta lookup for the whole request
+        db = await get_db()
+        allowed = await get_owned_device_ids(db, requested, None if user["is_admin"] else user["user_id"])
+
+    for device_id in devices - allowed:
+        await sio.leave_room(sid, device_room(device_id))
+    for device_id in allowed - devices:
+        await sio.enter_room(sid, device_room(device_id))
+    if allowed:
+        await sio.leave_room(sid, _default_room(user))
+    else:
+        await sio.enter_room(sid, _default_room(user))
+    session["devices"] = allowed
+    await sio.save_session(sid, session)
+    return {"device_ids": sorted(allowed)}
 
 @sio.event
 async def disconnect(sid):
+    batcher.forget(sid)
+    SOCKET_CLIENTS.dec()
     print(f"[SOCKET.IO] Client disconnected: {sid}")
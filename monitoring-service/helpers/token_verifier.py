@@ -0,0 +1,154 @@
+# Same module in device-management and monitoring-service (each image is built
+# from its own service directory): keep the two copies identical.
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import redis
+from jose import jwt, JWTError
+
+logger = logging.getLogger(__name__)
+
+
+def token_hash(token: str) -> str:
+    """SHA-256 of the raw JWT, the key used by the auth service revocation set."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenVerifier:
+    """
+    Verifies JWTs issued by the auth service locally (HS256 signature + exp)
+    instead of calling /users/verify-token on every request.
+
+    Revoked tokens are mirrored from the auth service Redis:
+    - a full sync of the `revoked_tokens` sorted set (hash -> exp) on (re)connect
+      and every `sync_interval` seconds,
+    - incremental updates from the `revoked_tokens` pub/sub channel in between.
+    Recently verified tokens are kept in a bounded LRU so a hit costs one hash
+    and one dict lookup.
+    """
+
+    def __init__(
+        self,
+        secret_key: str,
+        redis_host: str,
+        redis_port: int,
+        revoked_key: str = "revoked_tokens",
+        revoked_channel: str = "revoked_tokens",
+        cache_size: int = 10000,
+        sync_interval: float = 30,
+        max_staleness: float = 120,
+    ):
+        self._secret_key = secret_key
+        self._redis = redis.Redis(host=redis_host, port=redis_port, decode_responses=True, socket_timeout=5)
+        self._revoked_key = revoked_key
+        self._revoked_channel = revoked_channel
+        self._cache_size = cache_size
+        self._sync_interval = sync_interval
+        self._max_staleness = max_staleness
+
+        self._cache: "OrderedDict[str, tuple[dict, float]]" = OrderedDict()
+        self._revoked: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._last_sync: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Starts the background revocation sync thread."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-revocation-sync", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def is_fresh(self) -> bool:
+        """True while the local revocation set is recent enough to be trusted."""
+        return self._last_sync is not None and time.monotonic() - self._last_sync <= self._max_staleness
+
+    def is_revoked(self, key: str) -> bool:
+        """`key` is the token hash (token_hash)."""
+        with self._lock:
+            return key in self._revoked
+
+    def verify(self, token: str) -> Optional[dict]:
+        """
+        Returns the token claims, or None if the token is invalid, expired or revoked.
+        """
+        key = token_hash(token)
+        now = time.time()
+        with self._lock:
+            if key in self._revoked:
+                return None
+            cached = self._cache.get(key)
+            if cached is not None:
+                if cached[1] > now:
+                    self._cache.move_to_end(key)
+                    return cached[0]
+                del self._cache[key]
+
+        try:
+            payload = jwt.decode(token, self._secret_key, algorithms=['HS256'])
+        except JWTError:
+            return None
+        if not payload:
+            return None
+
+        exp = float(payload.get("exp", now))
+        with self._lock:
+            self._cache[key] = (payload, exp)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return payload
+
+    def _revoke(self, key: str, exp: float):
+        with self._lock:
+            self._revoked[key] = exp
+            self._cache.pop(key, None)
+
+    def _sync(self):
+        now = time.time()
+        entries = self._redis.zrangebyscore(self._revoked_key, now, "+inf", withscores=True)
+        revoked = {key: exp for key, exp in entries}
+        with self._lock:
+            self._revoked = revoked
+            for key in revoked:
+                self._cache.pop(key, None)
+        self._last_sync = time.monotonic()
+
+    def _run(self):
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self._revoked_channel)
+                # Subscribe first, then sync, so no revocation falls in between
+                self._sync()
+                logger.info(f"Revocation set synced ({len(self._revoked)} tokens)")
+                next_sync = time.monotonic() + self._sync_interval
+
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        key, _, exp = message["data"].partition(":")
+                        self._revoke(key, float(exp or 0))
+                    if time.monotonic() >= next_sync:
+                        self._sync()
+                        next_sync = time.monotonic() + self._sync_interval
+            except Exception as e:
+                logger.error(f"Revocation sync error, retrying in 5s: {e}")
+                self._stop.wait(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
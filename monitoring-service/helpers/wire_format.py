@@ -0,0 +1,95 @@
+"""
+Device metric wire formats, selected per message:
+
+- JSON (fallback): any payload starting with "{".
+- Binary v1: first byte 0x01, then a fixed little-endian layout chosen by the topic
+  (the topic already carries the device type, so nothing else is sent):
+
+    header          <B I I d    version, device_id, owner_id, timestamp (epoch seconds)
+    device/iot/{temperature,humidity,light,pressure}   <d   value (unit implied by the type)
+    device/iot/{other types}                           <B   0/1 state
+    device/end/{type}                                  <ddd cpu, ram, storage (%)
+
+The device name is not sent in binary messages.
+Must stay in sync with device-management/helpers/wire_format.py.
+"""
+import json
+import struct
+from datetime import datetime
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from entities.metrics import Metric
+
+WIRE_VERSION = 1
+BINARY_MARKER = bytes([WIRE_VERSION])
+HEADER = "<BIId"
+
+# Measured IoT types and their unit; the other IoT types send a binary state
+IOT_UNITS = {"temperature": "°C", "humidity": "%", "light": "lux", "pressure": "hPa"}
+
+Layout = Tuple[struct.Struct, Callable[[int, int, float, tuple], dict]]
+_layouts: Dict[str, Optional[Layout]] = {}
+
+def _iot_data(unit: str):
+    def build(device_id: int, owner_id: int, ts: float, values: tuple) -> dict:
+        return {"device_id": device_id, "owner_id": owner_id, "value": values[0], "unit": unit, "timestamp": ts}
+    return build
+
+def _end_data(device_id: int, owner_id: int, ts: float, values: tuple) -> dict:
+    return {
+        "device_id": device_id,
+        "owner_id": owner_id,
+        "metrics": {"cpu": values[0], "ram": values[1], "storage": values[2]},
+        "unit": "%",
+        "timestamp": ts,
+    }
+
+def layout(topic: str) -> Optional[Layout]:
+    """Binary layout of a topic (memoized), None if the topic has no binary format."""
+    if topic not in _layouts:
+        parts = topic.split("/")
+        found = None
+        if len(parts) == 3 and parts[0] == "device":
+            if parts[1] == "end":
+                found = (struct.Struct(HEADER + "ddd"), _end_data)
+            elif parts[1] == "iot" and parts[2] in IOT_UNITS:
+                found = (struct.Struct(HEADER + "d"), _iot_data(IOT_UNITS[parts[2]]))
+            elif parts[1] == "iot":
+                found = (struct.Struct(HEADER + "B"), _iot_data("binary"))
+        _layouts[topic] = found
+    return _layouts[topic]
+
+def encode_metric(topic: str, device_id: int, owner_id: int, ts: float, values: Sequence[float]) -> bytes:
+    """Binary v1 message (tools and benchmarks; the simulator encodes whole groups with NumPy)."""
+    found = layout(topic)
+    if found is None:
+        raise ValueError(f"No binary layout for topic {topic}")
+    return found[0].pack(WIRE_VERSION, device_id, owner_id, ts, *values)
+
+def decode_metric(topic: str, payload: bytes) -> Metric:
+    """
+    Builds a Metric from a raw MQTT payload in either format.
+    Binary messages are unpacked in one call straight into the Metric (their
+    field types are fixed by the layout, so pydantic validation is skipped).
+    Raises ValueError/struct.error on malformed payloads.
+    """
+    if payload[:1] == BINARY_MARKER:
+        found = layout(topic)
+        if found is None:
+            raise ValueError(f"No binary layout for topic {topic}")
+        unpacker, build = found
+        _, device_id, owner_id, ts, *values = unpacker.unpack(payload)
+        return Metric.model_construct(
+            device_id=device_id,
+            owner_id=owner_id,
+            topic=topic,
+            data=build(device_id, owner_id, ts, values),
+            timestamp=datetime.utcnow()
+        )
+
+    data = json.loads(payload)
+    return Metric(
+        device_id=data.get("device_id"),
+        owner_id=data.get("owner_id"),
+        topic=topic,
+        data=data
+    )
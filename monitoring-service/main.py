@@ -1,13 +1,18 @@
 import asyncio
 import socketio
+from datetime import datetime, timedelta
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from helpers.rabbit_consumer import consume_messages
-from helpers.socket_helper import sio
+from helpers.rabbit_consumer import consume_messages, publish_alert
+from helpers.socket_helper import sio, batcher, metric_bus, emit_alert
+from helpers.rule_engine import rule_engine
 from controllers.monitoring_controller import router as monitoring_router
+from controllers.alert_controller import router as alert_router
 from helpers.mongo_config import ensure_indexes, get_db
 from helpers.weather_helper import weather_service
-from dal.monitoring_dao import insert_weather
+from dal.monitoring_dao import insert_weather, get_latest_metrics
+from helpers.latest_cache import latest_cache, LATEST_WARMUP_MINUTES
+from helpers.auth_helper import token_verifier, auth_client
 
 # Define Lifespan for background tasks
 async def weather_updater():
@@ -19,16 +24,40 @@ async def weather_updater():
             # Get DB instance (this is a bit manual in lifespan as no request context)
             db = await get_db()
             await insert_weather(db, weather_data)
-            # Broadcast to UI
-            await sio.emit("weather_update", weather_data)
+            # Broadcast to UI (every replica runs this task: local clients only)
+            await sio.emit("weather_update", weather_data, ignore_queue=True)
         await asyncio.sleep(1800) # 30 minutes
 
+async def warm_up_latest_cache():
+    """Fills the in-memory latest-value table from the last minutes of metrics."""
+    if latest_cache.shared or LATEST_WARMUP_MINUTES <= 0:
+        return
+    try:
+        db = await get_db()
+        docs = await get_latest_metrics(db, datetime.utcnow() - timedelta(minutes=LATEST_WARMUP_MINUTES))
+        latest_cache.load([{**doc, "timestamp": doc["timestamp"].isoformat()} for doc in docs])
+        print(f"[LATEST] Warmed up with {len(docs)} devices")
+    except Exception as e:
+        print(f"[LATEST] Warm-up failed: {e}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # STARTUP
     print("[LOG] Starting Monitoring Service...")
     # Initialize MongoDB Indexes
     await ensure_indexes()
+    # Start local JWT revocation sync
+    token_verifier.start()
+    await auth_client.start()
+    # Latest value of each device
+    await latest_cache.start()
+    await warm_up_latest_cache()
+    # Alert rules evaluated on every delivered metric
+    await rule_engine.start(local_sinks=[emit_alert], exclusive_sinks=[publish_alert])
+    # Per-room Socket.io batching, fed by the other replicas through the metric bus
+    batcher.start()
+    if metric_bus is not None:
+        metric_bus.start()
     # Launch RabbitMQ consumer
     consumer_task = asyncio.create_task(consume_messages())
     # Launch Weather updater
@@ -38,6 +67,15 @@ async def lifespan(app: FastAPI):
     print("[LOG] Stopping Monitoring Service...")
     consumer_task.cancel()
     weather_task.cancel()
+    # Let the consumer flush its ingestion queue before exiting
+    await asyncio.gather(consumer_task, return_exceptions=True)
+    if metric_bus is not None:
+        await metric_bus.stop()
+    await batcher.stop()
+    await rule_engine.stop()
+    token_verifier.stop()
+    await auth_client.close()
+    await latest_cache.close()
 
 from prometheus_fastapi_instrumentator import Instrumentator
 
@@ -62,6 +100,7 @@ sio_app = socketio.ASGIApp(sio, other_asgi_app=app, socketio_path='/monitoring/s
 
 # Include Routers
 app.include_router(monitoring_router)
+app.include_router(alert_router)
 
 @app.get("/")
 async def root():
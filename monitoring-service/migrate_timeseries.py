@@ -0,0 +1,98 @@
+"""
+One-shot migration of a plain `metrics` collection to the time-series layout.
+
+    python migrate_timeseries.py [--batch-size 5000] [--drop-legacy]
+
+1. renames the plain `metrics` collection to `metrics_legacy`,
+2. creates the time-series `metrics` collection, its indexes and the rollup collections,
+3. copies legacy documents in batches (normalized layout + device_meta) and rebuilds
+   the 1m/1h/1d rollup buckets they cover.
+
+Run it with the consumers stopped. It can be re-run (e.g. after an interruption):
+the documents a previous run copied are removed first and the rollup buckets are
+replaced, never incremented, so nothing is counted twice.
+"""
+import argparse
+import asyncio
+from helpers.mongo_config import db, ensure_indexes
+from dal.monitoring_dao import (
+    ROLLUP_RESOLUTIONS, add_to_bucket, bucket_start, insert_metrics, new_bucket,
+    numeric_fields, replace_rollups, upsert_device_meta
+)
+from entities.metrics import Metric
+
+async def migrate(batch_size: int, drop_legacy: bool):
+    existing = await db.list_collections(filter={"name": "metrics"}).to_list(length=1)
+    if existing and existing[0].get("type") != "timeseries":
+        await db.metrics.rename("metrics_legacy")
+        print("[MIGRATION] Renamed plain 'metrics' collection to 'metrics_legacy'")
+
+    await ensure_indexes()
+
+    legacy = await db.list_collections(filter={"name": "metrics_legacy"}).to_list(length=1)
+    newest = await db.metrics_legacy.find_one({}, {"timestamp": 1}, sort=[("timestamp", -1)]) if legacy else None
+    if newest is None:
+        print("[MIGRATION] Nothing to migrate")
+        return
+
+    # Copies left by a previous run (every legacy document is older than the rename)
+    removed = await db.metrics.delete_many({"timestamp": {"$lte": newest["timestamp"]}})
+    if removed.deleted_count:
+        print(f"[MIGRATION] Removed {removed.deleted_count} metrics copied by a previous run")
+
+    # Per device and in time order (the legacy (device_id, timestamp) index read
+    # backwards, so device_meta keeps the latest attributes): each resolution has a
+    # single open bucket, complete once a reading falls in another one
+    open_buckets = {resolution: (None, None) for resolution in ROLLUP_RESOLUTIONS}
+    complete = {resolution: {} for resolution in ROLLUP_RESOLUTIONS}
+
+    async def flush(batch):
+        await insert_metrics(db, batch)
+        await upsert_device_meta(db, batch)
+        for resolution, buckets in complete.items():
+            await replace_rollups(db, resolution, buckets)
+            buckets.clear()
+
+    copied = 0
+    batch = []
+    async for doc in db.metrics_legacy.find({}, {"_id": 0}).sort([("device_id", -1), ("timestamp", 1)]):
+        try:
+            metric = Metric(**doc)
+        except Exception as e:
+            print(f"[MIGRATION] Skipping invalid document: {e}")
+            continue
+        batch.append(metric)
+        fields = numeric_fields(metric.data)
+        if fields:
+            for resolution, seconds in ROLLUP_RESOLUTIONS.items():
+                key = (metric.device_id, bucket_start(metric.timestamp, seconds))
+                open_key, acc = open_buckets[resolution]
+                if open_key != key:
+                    if open_key is not None:
+                        complete[resolution][open_key] = acc
+                    open_key, acc = key, new_bucket(metric.owner_id)
+                    open_buckets[resolution] = (open_key, acc)
+                add_to_bucket(acc, fields)
+        if len(batch) >= batch_size:
+            await flush(batch)
+            copied += len(batch)
+            batch = []
+            print(f"[MIGRATION] {copied} metrics copied...")
+
+    for resolution, (open_key, acc) in open_buckets.items():
+        if open_key is not None:
+            complete[resolution][open_key] = acc
+    await flush(batch)
+    copied += len(batch)
+    print(f"[MIGRATION] Done, {copied} metrics copied")
+
+    if drop_legacy:
+        await db.metrics_legacy.drop()
+        print("[MIGRATION] Dropped 'metrics_legacy'")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the metrics collection to a time-series collection")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--drop-legacy", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(migrate(args.batch_size, args.drop_legacy))